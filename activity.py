@@ -0,0 +1,171 @@
+"""activity.py
+
+Append-only activity log behind the Dashboard.
+
+Every search, generation, regeneration and send is recorded as one event
+(timestamp, kind, sector, tone, target, ...) appended to
+``<data_dir>/activity.jsonl``. Next to the log we keep counters that are updated
+as events come in, so the Dashboard reads precomputed numbers instead of
+walking the history on every render:
+
+    - one `ActivityAggregates` per user key (sessions this week, most
+      contacted sector, most used tone, last login), folded from the log file
+      once per process and then kept up to date;
+    - one `SessionActivity` per session (in `st.session_state.activity`) with
+      the last sends shown under "Recent Interactions".
+
+When a session learns its user's email, `ActivityLog.rekey` moves what it
+recorded under its session key to the email (one ``rekey`` line in the log).
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from settings import data_dir
+
+KINDS = ["session_start", "search", "generation", "regeneration", "send"]
+REKEY = "rekey"  # Log line moving a user's events to another key (see `ActivityLog.rekey`)
+RECENT_SENDS = 20  # Sends kept per session for "Recent Interactions"
+
+
+class ActivityAggregates:
+    """Counters maintained incrementally from the event stream."""
+
+    def __init__(self):
+        self.kind_counts = Counter()
+        self.sessions_per_day = Counter()  # ISO date -> sessions started that day
+        self.sector_counts = Counter()  # Sends per target sector
+        self.tone_counts = Counter()  # Generations (incl. regenerations) per tone
+        self.top_sector = None
+        self.top_tone = None
+        self.last_session_start = None
+        self.previous_session_start = None
+
+    def apply(self, event: dict):
+        kind = event["kind"]
+        self.kind_counts[kind] += 1
+        if kind == "session_start":
+            self.sessions_per_day[_day(event["ts"])] += 1
+            self.previous_session_start, self.last_session_start = self.last_session_start, event["ts"]
+        elif kind == "send" and event.get("sector"):
+            self.top_sector = _bump(self.sector_counts, event["sector"], self.top_sector)
+        elif kind in ["generation", "regeneration"]:
+            for tone in (event.get("tone") or "").split(", "):
+                if tone:
+                    self.top_tone = _bump(self.tone_counts, tone, self.top_tone)
+
+    def absorb(self, other: "ActivityAggregates"):
+        """Fold the counters of `other` (the same user under another key) into these."""
+        self.kind_counts += other.kind_counts
+        self.sessions_per_day += other.sessions_per_day
+        self.sector_counts += other.sector_counts
+        self.tone_counts += other.tone_counts
+        self.top_sector = max(self.sector_counts, key=self.sector_counts.get, default=None)
+        self.top_tone = max(self.tone_counts, key=self.tone_counts.get, default=None)
+        starts = sorted(ts for ts in [self.last_session_start, self.previous_session_start,
+                                      other.last_session_start, other.previous_session_start] if ts is not None)
+        self.previous_session_start, self.last_session_start = ([None, None] + starts)[-2:]
+
+    def sessions_this_week(self) -> int:
+        """Sessions started in the last 7 days (7 dictionary lookups)."""
+        today = datetime.date.today()
+        return sum(self.sessions_per_day[(today - datetime.timedelta(days=d)).isoformat()] for d in range(7))
+
+
+class SessionActivity:
+    """What one session did, kept in `st.session_state.activity`."""
+
+    def __init__(self):
+        self.recent_sends = {"freelancer": deque(maxlen=RECENT_SENDS), "company": deque(maxlen=RECENT_SENDS)}
+
+    def apply(self, event: dict):
+        if event["kind"] == "send":
+            self.recent_sends[event.get("user_type", "freelancer")].appendleft(event)
+
+
+def _day(ts: float) -> str:
+    return datetime.date.fromtimestamp(ts).isoformat()
+
+
+def _bump(counter: Counter, key: str, current_top):
+    """Increment `counter[key]` and return the (possibly new) most common key."""
+    counter[key] += 1
+    if current_top is None or counter[key] > counter[current_top]:
+        return key
+    return current_top
+
+
+class ActivityLog:
+    """The process-wide log file and the aggregates of each user."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._aggregates = {}  # user key -> ActivityAggregates
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                        if event["kind"] == REKEY:
+                            self._rekey(event["user"], event["to"])
+                        else:
+                            self._user(event.get("user", "")).apply(event)
+                    except (ValueError, KeyError, AttributeError):
+                        continue  # Torn last line after a crash
+
+    def _user(self, user: str) -> ActivityAggregates:
+        aggregates = self._aggregates.get(user)
+        if aggregates is None:
+            aggregates = self._aggregates[user] = ActivityAggregates()
+        return aggregates
+
+    def _rekey(self, old: str, new: str):
+        aggregates = self._aggregates.pop(old, None)
+        if aggregates is not None and old != new:
+            self._user(new).absorb(aggregates)
+
+    def rekey(self, old: str, new: str):
+        """Move the activity of user `old` (e.g. a session key) to `new`, its session starts included."""
+        line = json.dumps({"ts": time.time(), "kind": REKEY, "user": old, "to": new}, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._rekey(old, new)
+
+    def aggregates(self, user: str) -> ActivityAggregates:
+        """The aggregates of `user` (empty if they have no activity yet)."""
+        with self._lock:
+            return self._user(user)
+
+    def record(self, kind: str, session: SessionActivity = None, user: str = "", **fields) -> dict:
+        """Append one event of `user` to the log and fold it into their aggregates."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown activity kind: {kind}")
+        event = {"ts": time.time(), "kind": kind, "user": user, **fields}
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._user(user).apply(event)
+        if session is not None:
+            session.apply(event)
+        return event
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log() -> ActivityLog:
+    """The activity log of this process, loaded on first use."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = ActivityLog(os.path.join(data_dir(), "activity.jsonl"))
+    return _log
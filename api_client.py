@@ -0,0 +1,452 @@
+"""api_client.py
+
+HTTP client for the LeadCraftr back-end (matching and email generation).
+
+Every call runs against a latency budget (a `Deadline`). The budget covers the
+whole call, retries included, and whatever is left of it is forwarded to the
+back-end in the ``X-Request-Deadline-Ms`` header so it can give up early too.
+When the budget runs out, `DeadlineExceeded` is raised instead of leaving the
+Streamlit script thread hanging on a socket.
+
+Payloads are encoded/decoded with orjson (or msgspec) when one of them is
+installed, and with the standard `json` module otherwise. Responses may come
+back gzip/deflate (or brotli, if the `brotli` package is installed) compressed;
+large request bodies are gzipped when the ``gzip_request_bodies`` setting is on.
+
+Every attempt waits for a slot from the fair scheduler of its endpoint group
+(scheduler.py), so one session or a bulk job can't starve the others. The
+number of generation slots is an adaptive concurrency limit shared by all
+sessions of the process (concurrency.py): when the back-end slows down or
+answers 429/5xx, fewer generations are sent to it at once.
+
+Generation payloads only carry the fields the back-end reads
+(`PAYLOAD_FIELDS`): whatever else the profile dicts hold (phone, e-mail,
+income targets, ...) stays on the front-end. Request body sizes are reported
+per endpoint by metrics.py.
+
+A first draft close enough to one generated before (semantic_cache.py) is
+reused instead of calling the back-end again.
+
+First drafts requested at the same moment by different sessions are sent as
+one ``/generate_mail_batch`` call (micro_batch.py): requests arriving within
+``generate_batch_window_ms`` (15 ms) are grouped, up to ``generate_batch_max``
+(16) per call. Batch body: ``{"requests": [{"endpoint": ..., "payload": ...}]}``;
+answer: ``{"results": [{"status": 200, "body": {"email": ...}}, ...]}``, in
+order. A back-end without the batch endpoint (404/405/501) turns batching off
+for the process; a failed batch, or a result with a retryable status, is sent
+again as a single call.
+
+Regenerations send only a draft handle and the changed fields when the
+back-end issued a handle with the previous draft (see draft_handles.py).
+
+Traffic can be recorded to a cassette and replayed from it, with the original
+or scaled latencies, by setting ``api_cassette_mode`` (see cassette.py).
+
+The daily rates of the freelancers ``/match_prospect`` returns feed the market
+rate sketches of the daily-rate page (rate_sketch.py).
+
+When a match endpoint times out, can't be reached or answers 5xx, `get_matches`
+falls back to the offline matcher (local_matcher.py), whose results carry
+``"offline_match": True``.
+
+Per-endpoint budgets default to 3 s for matching and 20 s for generation and can
+be changed with the ``match_deadline_s`` / ``generate_deadline_s`` settings (see
+settings.py).
+"""
+
+import gzip
+import json
+import threading
+import time
+from typing import Optional
+
+import requests
+
+import cassette
+import concurrency
+import draft_handles
+import local_matcher
+import metrics
+import micro_batch
+import rate_sketch
+import scheduler
+import semantic_cache
+import telemetry
+from settings import get_bool, get_float, get_int, get_setting
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up, see requirements.txt
+    orjson = None
+try:
+    import msgspec
+except ImportError:  # Optional speed-up, see requirements.txt
+    msgspec = None
+try:
+    import brotli  # noqa: F401 (urllib3 decodes "br" responses when it is importable)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+BASE_URL = get_setting("api_url", "https://leadcraftr-api-cloud-623673804405.europe-west1.run.app").rstrip("/")
+
+MATCH_ENDPOINTS = {
+    "freelancer": "/match_freelance",  # Freelancers look for companies
+    "company": "/match_prospect",      # Companies look for freelancers (prospects)
+}
+GENERATE_ENDPOINTS = {
+    "freelancer": "/generate_mail_freelance",
+    "company": "/generate_mail_prospect",
+}
+
+# Fields of the freelance / prospect dicts the generation endpoints read (those
+# sanitization.py fills in); everything else is dropped from the payload
+FREELANCE_FIELDS = ("name", "title", "main_sector", "top3_skills", "daily_rate", "city", "remote",
+                    "mission_statement", "preferred_tone", "preferred_style")
+PROSPECT_FIELDS = ("company", "sector", "main_contact", "contact_role", "city", "mission_statement",
+                   "company_size", "funding_stage", "ticket_size_class", "remote", "target_tone", "email")
+PAYLOAD_FIELDS = {
+    endpoint: {"freelance": FREELANCE_FIELDS, "prospect": PROSPECT_FIELDS}
+    for endpoint in GENERATE_ENDPOINTS.values()
+}
+GENERATE_BATCH_ENDPOINT = "/generate_mail_batch"
+GENERATE_BATCH_WINDOW_S = get_float("generate_batch_window_ms", 15) / 1000
+GENERATE_BATCH_MAX = get_int("generate_batch_max", 16)
+UNSUPPORTED_STATUS = [404, 405, 501]
+
+# Latency budgets, in seconds
+MATCH_DEADLINE_S = get_float("match_deadline_s", 3.0)
+GENERATE_DEADLINE_S = get_float("generate_deadline_s", 20.0)
+
+CONNECT_TIMEOUT_S = 2.0
+MAX_RETRIES = get_int("api_max_retries", 2)
+RETRY_BACKOFF_S = 0.2
+RETRYABLE_STATUS = [429, 502, 503, 504]
+MIN_ATTEMPT_BUDGET_S = 0.05  # Not worth opening a request with less than this left
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Request bodies above this size are gzipped (only if the back-end accepts it)
+GZIP_REQUEST_BODIES = get_bool("gzip_request_bodies", False)
+GZIP_MIN_BYTES = 1024
+_gzip_accepted = True  # Flipped off for the process if the back-end answers 415 to a gzipped body
+
+# One pooled session per process: keeps TCP/TLS connections to the API alive across reruns
+_http = requests.Session()
+_http.headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+
+def json_dumps(obj) -> bytes:
+    """Encode `obj` to compact UTF-8 JSON with the fastest encoder available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data: bytes):
+    """Decode JSON bytes with the fastest decoder available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def encode_body(payload) -> tuple:
+    """Return `(body, headers)` for a JSON request, gzipped if it is worth it."""
+    body = json_dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if GZIP_REQUEST_BODIES and _gzip_accepted and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an API call runs out of its latency budget."""
+
+
+class Deadline:
+    """A point in time after which a call (or a group of calls) must give up."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def within(cls, parent: Optional["Deadline"], seconds: float) -> "Deadline":
+        """A deadline of `seconds`, cut short if `parent` expires first."""
+        if parent is not None:
+            seconds = min(seconds, parent.remaining())
+        return cls(seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def _request(method: str, endpoint: str, deadline: Deadline, **kwargs) -> requests.Response:
+    """Send a request, retrying transient failures while `deadline` allows it."""
+    with metrics.track(endpoint) as call:
+        call.body_bytes = len(kwargs.get("data") or b"")
+        response = _request_with_retries(method, endpoint, deadline, **kwargs)
+        call.status_code = response.status_code
+        return response
+
+
+def _request_with_retries(method: str, endpoint: str, deadline: Deadline, **kwargs) -> requests.Response:
+    headers = kwargs.pop("headers", {})
+    last_error = last_response = None
+    for attempt in range(MAX_RETRIES + 1):
+        backoff = RETRY_BACKOFF_S * 2 ** (attempt - 1) if attempt else 0.0
+        if deadline.remaining() - backoff < MIN_ATTEMPT_BUDGET_S:
+            break
+        time.sleep(backoff)
+        try:
+            response = _send(method, endpoint, deadline, attempt, headers, **kwargs)
+        except requests.ConnectTimeout as e:
+            last_error, last_response = e, None  # Nothing was sent: another attempt may still fit in the deadline
+        except requests.Timeout:
+            raise DeadlineExceeded(f"{endpoint} did not answer within {deadline.seconds:.0f} s")
+        except requests.ConnectionError as e:
+            last_error, last_response = e, None
+        else:
+            if response.status_code not in RETRYABLE_STATUS:
+                return response
+            last_error, last_response = None, response
+
+    if last_response is not None:
+        return last_response  # Still busy when the retries or the budget ran out: callers handle the status
+    if last_error is not None and not deadline.expired:
+        raise last_error
+    raise DeadlineExceeded(f"{endpoint} did not answer within {deadline.seconds:.0f} s (last error: {last_error})")
+
+
+def _send(method: str, endpoint: str, deadline: Deadline, attempt: int, headers: dict, **kwargs) -> requests.Response:
+    """One attempt, holding a scheduler slot; generation outcomes steer the adaptive concurrency limit."""
+    generation = endpoint in GENERATE_ENDPOINTS.values() or endpoint == GENERATE_BATCH_ENDPOINT
+    slots = scheduler.generate_scheduler if generation else scheduler.match_scheduler
+    if not slots.acquire(timeout=deadline.remaining()):
+        raise DeadlineExceeded(f"No free slot for {endpoint} within {deadline.seconds:.0f} s")
+    remaining = deadline.remaining()
+    headers[DEADLINE_HEADER] = str(int(remaining * 1000))
+    started = time.monotonic()
+    outcome = concurrency.IGNORED
+    try:
+        with telemetry.span("http.request", endpoint=endpoint, attempt=attempt) as http_span:
+            if cassette.MODE:
+                response = _send_with_cassette(method, endpoint, deadline, headers, **kwargs)
+            else:
+                response = _fetch(method, endpoint, deadline, headers, **kwargs)
+            http_span.set(status_code=response.status_code, response_bytes=len(response.content))
+        if response.status_code == 429 or response.status_code >= 500:
+            outcome = concurrency.DROPPED
+        elif response.status_code < 400:
+            outcome = concurrency.OK
+        return response
+    except (requests.Timeout, DeadlineExceeded):
+        outcome = concurrency.DROPPED
+        raise
+    finally:
+        if generation:
+            concurrency.generate_limiter.record(time.monotonic() - started, outcome, slots.in_flight)
+        slots.release()
+
+
+def _fetch(method: str, endpoint: str, deadline: Deadline, headers: dict, **kwargs) -> requests.Response:
+    """Send one request and read its whole body before `deadline`.
+
+    The read timeout only bounds each socket read, so a server trickling out its
+    answer could hold the call long past the deadline: the body is streamed, and
+    the connection closed if the deadline passes before it is complete."""
+    remaining = deadline.remaining()
+    response = _http.request(method, f"{BASE_URL}{endpoint}", headers=headers,
+                             timeout=(min(CONNECT_TIMEOUT_S, remaining), remaining), stream=True, **kwargs)
+    expired = threading.Event()
+
+    def cut_off():
+        expired.set()
+        try:
+            response.raw.shutdown()  # Wakes up the blocked read (urllib3 >= 2.3)
+        except (AttributeError, ValueError, RuntimeError):
+            response.close()
+
+    guard = threading.Timer(deadline.remaining(), cut_off)
+    guard.daemon = True
+    guard.start()
+    try:
+        response.content  # Reads the body
+    except Exception:
+        if not expired.is_set():
+            raise
+    finally:
+        guard.cancel()
+    if expired.is_set():
+        raise DeadlineExceeded(f"{endpoint} did not answer within {deadline.seconds:.0f} s")
+    return response
+
+
+def _send_with_cassette(method: str, endpoint: str, deadline: Deadline, headers: dict, **kwargs) -> requests.Response:
+    """Replays the attempt from the cassette, or sends it and records the response."""
+    key = cassette.request_hash(method, endpoint, kwargs.get("params"), kwargs.get("data"), headers)
+    if cassette.MODE == "replay":
+        return cassette.get_cassette().replay(key, endpoint, deadline.remaining(), cassette.REPLAY_SPEED, cassette.LENIENT)
+    started = time.monotonic()
+    response = _fetch(method, endpoint, deadline, headers, **kwargs)
+    cassette.get_cassette().record(key, endpoint, response, time.monotonic() - started)
+    return response
+
+
+def _post_json(endpoint: str, payload, deadline: Deadline) -> requests.Response:
+    """POST `payload` as JSON, falling back to a plain body if gzip is refused."""
+    global _gzip_accepted
+    body, headers = encode_body(payload)
+    response = _request("POST", endpoint, deadline, data=body, headers=headers)
+    if response.status_code == 415 and "Content-Encoding" in headers:
+        _gzip_accepted = False
+        body, headers = encode_body(payload)
+        response = _request("POST", endpoint, deadline, data=body, headers=headers)
+    return response
+
+
+def _flush_generations(items: list, timeout: float) -> Optional[list]:
+    """Send `(endpoint, payload)` generations as one batch call: a response per request, or None to send them singly."""
+    batch = [{"endpoint": endpoint, "payload": payload} for endpoint, payload in items]
+    response = _post_json(GENERATE_BATCH_ENDPOINT, {"requests": batch}, Deadline(timeout))
+    if response.status_code != 200:
+        if response.status_code in UNSUPPORTED_STATUS:
+            _generate_batcher.enabled = False  # The back-end has no batch endpoint: stop holding requests back
+        return None
+    results = json_loads(response.content).get("results")
+    if not isinstance(results, list):
+        _generate_batcher.enabled = False  # Not an answer to a batch (e.g. a catch-all route)
+        return None
+    return [_batched_response(result) for result in results]
+
+
+def _batched_response(result: dict) -> Optional[requests.Response]:
+    """The response of one request of a batch, as if it had been sent on its own (None to resend it so)."""
+    status_code = int(result.get("status", 200))
+    if status_code in RETRYABLE_STATUS:
+        return None
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json_dumps(result.get("body", {}))
+    return response
+
+
+_generate_batcher = micro_batch.MicroBatcher("generate", _flush_generations, GENERATE_BATCH_WINDOW_S, GENERATE_BATCH_MAX)
+
+
+@telemetry.traced("api.get_matches")
+def get_matches(statement_content: str, user_type: str, deadline: Optional[Deadline] = None):
+    """
+    Fetches the matches for a mission/personal statement.
+    :param statement_content: The statement to match against.
+    :param user_type: 'freelancer' (looking for companies) or 'company' (looking for freelancers).
+    :param deadline: Optional overall deadline; the matching budget is cut short to fit in it.
+    """
+    params = {"mission_statement": statement_content} # Only the content as param
+    endpoint = MATCH_ENDPOINTS.get(user_type)
+    if endpoint is None:
+        raise ValueError("Invalid user_type for get_matches.")
+
+    try:
+        response = _request("GET", endpoint, Deadline.within(deadline, MATCH_DEADLINE_S), params=params)
+    except (DeadlineExceeded, requests.ConnectionError):
+        offline_matches = _offline_matches(statement_content, user_type)
+        if offline_matches:
+            return offline_matches
+        raise
+    if response.status_code == 200:
+        matches = json_loads(response.content)
+        try:
+            local_matcher.get_matcher().remember(user_type, matches)
+        except OSError:
+            pass  # The offline corpus is a nice-to-have
+        if user_type == "company" and isinstance(matches, list):
+            rate_sketch.get_sketches().observe(matches)  # Market rates for the daily-rate page
+        return matches
+    if response.status_code >= 500:
+        offline_matches = _offline_matches(statement_content, user_type)
+        if offline_matches:
+            return offline_matches
+    raise Exception(f"Matching error: {response.text}")
+
+
+def _offline_matches(statement_content: str, user_type: str) -> list:
+    """Degraded matches from the local index, or [] if it has nothing to offer."""
+    with telemetry.span("local_matcher.search", user_type=user_type):
+        try:
+            return local_matcher.get_matcher().search(statement_content, user_type)
+        except Exception:
+            return []
+
+
+def project(data: dict, fields: tuple) -> dict:
+    """The entries of `data` listed in `fields`."""
+    return {field: data[field] for field in fields if field in data}
+
+
+@telemetry.traced("api.generate_mail")
+def generate_mail(freelance: dict, prospect: dict, sender_type: str, previous_mail_content: str = "",
+                  deadline: Optional[Deadline] = None, card: str = ""):
+    """
+    Generates an email via the API, including the sender_type.
+    :param freelance: Dictionary representing the freelancer's data.
+    :param prospect: Dictionary representing the prospect's (company) data.
+    :param sender_type: A string indicating who is sending the email ('freelancer' or 'company').
+    :param previous_mail_content: Optional, previous email content for regeneration.
+    :param deadline: Optional overall deadline; the generation budget is cut short to fit in it.
+    :param card: Optional, the card of the page the email is for (draft handles are kept per card).
+    """
+    endpoint = GENERATE_ENDPOINTS.get(sender_type)
+    if endpoint is None:
+        raise ValueError("Invalid sender_type for generate_mail.")
+
+    freelance = project(freelance, PAYLOAD_FIELDS[endpoint]["freelance"])
+    prospect = project(prospect, PAYLOAD_FIELDS[endpoint]["prospect"])
+    payload = {
+        "freelance": freelance,
+        "prospect": prospect,
+        "sender_type": sender_type,
+        "previous_mail_content": previous_mail_content
+    }
+
+    if semantic_cache.ENABLED and not previous_mail_content:
+        hit = semantic_cache.get_cache().lookup(sender_type, freelance, prospect)
+        if hit is not None and hit.quality in semantic_cache.REUSABLE:
+            metrics.cache_hit("semantic_generation")
+            metrics.increment(f"semantic_cache_{hit.quality}")
+            return hit.email
+        metrics.cache_miss("semantic_generation")
+
+    budget = Deadline.within(deadline, GENERATE_DEADLINE_S)
+    response = None
+    compact = draft_handles.compact_payload(card, sender_type, freelance, prospect, previous_mail_content)
+    if compact is not None:
+        response = _post_json(endpoint, compact, budget)
+        if response.status_code in draft_handles.EXPIRED_STATUS:
+            draft_handles.forget(card, previous_mail_content)
+            response = None  # The server dropped the context: start over with everything
+    if response is None:
+        # Batched with requests of the same traffic class only; None: send it on its own
+        traffic_class = scheduler.current_traffic_class()
+        with _generate_batcher.in_flight(traffic_class):
+            response = _generate_batcher.submit((endpoint, payload), budget.remaining(), key=traffic_class)
+            if response is None:
+                response = _post_json(endpoint, payload, budget)
+    if response.status_code == 200:
+        result = json_loads(response.content)
+        email = result.get("email", "")
+        draft_handles.remember(card, email, result.get("draft_handle"), sender_type, freelance, prospect,
+                               result.get("draft_handle_ttl_s"))
+        if semantic_cache.ENABLED and email:
+            semantic_cache.get_cache().store(sender_type, freelance, prospect, email)
+        return email
+    else:
+        raise Exception(f"Email generation error: {response.text}")
@@ -4,127 +4,53 @@
 
 # ====== IMPORTS & API | CONFIG | FUNCTIONS ======
 import streamlit as st
-import random
-import requests
+import hashlib
 import time
+import telemetry
+import profiling
+import activity
+import budget_fit
+import history_store
+import session_snapshot
+from sanitization import sanitize_freelancer_data, sanitize_prospect_data
 from daily_rate_page_NEW import display_tjm_calculator
-
-BASE_URL = "https://leadcraftr-api-cloud-623673804405.europe-west1.run.app"
-
-def get_matches(statement_content: str, user_type: str):
-    params = {"mission_statement": statement_content} # Only the content as param
-    endpoint = ""
-    if user_type == "freelancer":
-        endpoint = "/match_freelance" # Correct endpoint for freelancers
-    elif user_type == "company":
-        endpoint = "/match_prospect" # Correct endpoint for companies (prospects)
-    else:
-        raise ValueError("Invalid user_type for get_matches.")
-
-    response = requests.get(f"{BASE_URL}{endpoint}", params=params)
-    if response.status_code == 200:
-        return response.json()
+from bulk_outreach_page import display_bulk_outreach
+from api_client import get_matches, generate_mail, DeadlineExceeded
+from local_draft import draft_email
+import job_queue
+import outbox
+import semantic_cache
+import speculative
+
+
+def current_user_key() -> str:
+    """Key under which this user's history is persisted: their email, else their resume token (see session_snapshot.py).
+
+    Never a name: two people called Marie would share one history. When an email turns up (profile created or
+    edited), what was recorded under the session key moves over to it."""
+    profile = st.session_state.user_profile_data
+    email = str(profile.get("email") or profile.get("contact_email") or "").strip().lower()
+    if email:
+        key = email
     else:
-        raise Exception(f"Matching error: {response.text}")
-
-def generate_mail(freelance: dict, prospect: dict, sender_type: str, previous_mail_content: str = ""):
-    """
-    Generates an email via the API, including the sender_type.
-    :param freelance: Dictionary representing the freelancer's data.
-    :param prospect: Dictionary representing the prospect's (company) data.
-    :param sender_type: A string indicating who is sending the email ('freelancer' or 'company').
-    :param previous_mail_content: Optional, previous email content for regeneration.
-    """
-    payload = {
-        "freelance": freelance,
-        "prospect": prospect,
-        "sender_type": sender_type,
-        "previous_mail_content": previous_mail_content
-    }
-
-    endpoint = ""
-    if sender_type == "freelancer":
-        endpoint = "/generate_mail_freelance"
-    elif sender_type == "company":
-        endpoint = "/generate_mail_prospect"
-    else:
-        raise ValueError("Invalid sender_type for generate_mail.")
-
-    response = requests.post(f"{BASE_URL}{endpoint}", json=payload)
-    if response.status_code == 200:
-        return response.json().get("email", "")
-    else:
-        raise Exception(f"Email generation error: {response.text}")
-
-
-# --- FONCTIONS DE SANITISATION MISES À JOUR AVEC LES DERNIERS CHAMPS ET VÉRIFICATIONS DE TYPE ---
-def sanitize_freelancer_data(freelancer_dict: dict) -> dict:
-    """Ensures a freelancer dictionary has all necessary fields with default values."""
-    sanitized_data = freelancer_dict.copy()
-    sanitized_data['name'] = sanitized_data.get('name') or "A Professional Freelancer"
-    sanitized_data['title'] = sanitized_data.get('title') or "Freelancer"
-    sanitized_data['main_sector'] = sanitized_data.get('main_sector') or "General Tech"
-
-    top3_skills = sanitized_data.get('top3_skills')
-    if isinstance(top3_skills, list):
-        sanitized_data['top3_skills'] = ", ".join(top3_skills)
-    elif not isinstance(top3_skills, str) or not top3_skills:
-        sanitized_data['top3_skills'] = "Software Development, Data Analysis, Project Management"
-
-    # Ensure daily_rate is a number
-    daily_rate_val = sanitized_data.get('daily_rate')
-    if isinstance(daily_rate_val, list):
-        sanitized_data['daily_rate'] = daily_rate_val[0] if daily_rate_val else 500
-    elif not isinstance(daily_rate_val, (int, float)):
-        sanitized_data['daily_rate'] = 500
-
-    sanitized_data['city'] = sanitized_data.get('city') or "Remote"
-
-    original_remote = sanitized_data.get('remote')
-    if isinstance(original_remote, bool):
-        sanitized_data['remote'] = "Yes" if original_remote else "No"
-    elif isinstance(original_remote, str):
-        sanitized_data['remote'] = "Yes" if original_remote.lower() in ['yes', 'true', 'remote'] else "No"
-    else:
-        sanitized_data['remote'] = "No"
-
-    sanitized_data['mission_statement'] = sanitized_data.get('mission_statement') or "Experienced professional ready to contribute to innovative projects."
-    sanitized_data['preferred_tone'] = sanitized_data.get('preferred_tone') or "Professional"
-    sanitized_data['preferred_style'] = sanitized_data.get('preferred_style') or "Storytelling"
-    return sanitized_data
-
-def sanitize_prospect_data(prospect_dict: dict) -> dict:
-    """Ensures a prospect (company) dictionary has all necessary fields with default values."""
-    sanitized_data = prospect_dict.copy()
-    sanitized_data['company'] = sanitized_data.get('company') or "A Leading Company"
-    sanitized_data['sector'] = sanitized_data.get('sector') or "Tech / SaaS"
-    sanitized_data['main_contact'] = sanitized_data.get('main_contact') or "Valued Partner"
-    sanitized_data['contact_role'] = sanitized_data.get('contact_role') or "Hiring Manager"
-    sanitized_data['city'] = sanitized_data.get('city') or "Remote"
-    sanitized_data['mission_statement'] = sanitized_data.get('mission_statement') or "Driving innovation and delivering value to clients."
-    sanitized_data['company_size'] = sanitized_data.get('company_size') or "Mid-size"
-
-    sanitized_data['funding_stage'] = sanitized_data.get('funding_stage') or "Undisclosed"
-    sanitized_data['ticket_size_class'] = sanitized_data.get('ticket_size_class') or "Medium"
-
-    sanitized_data['target_tone'] = sanitized_data.get('target_tone') or \
-                                   sanitized_data.get('preferred_tone') or \
-                                   "Professional"
-
-    if 'preferred_tone' in sanitized_data: # Remove if it was a misnamed 'target_tone'
-        del sanitized_data['preferred_tone']
-
-    original_remote = sanitized_data.get('remote')
-    if isinstance(original_remote, bool):
-        sanitized_data['remote'] = original_remote
-    elif isinstance(original_remote, str):
-        sanitized_data['remote'] = original_remote.lower() in ['yes', 'true', 'remote']
-    else:
-        sanitized_data['remote'] = False
-
-    sanitized_data['email'] = sanitized_data.get('email') or "info@example.com"
-
-    return sanitized_data
+        token = st.session_state.get(session_snapshot.TOKEN_KEY) or telemetry.current_session_id()
+        key = "session:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]  # The token itself is a credential
+    previous = st.session_state.get("user_key")
+    if previous != key:
+        if previous and previous.startswith("session:") and email:
+            activity.get_log().rekey(previous, key) # This session's start counts for "Last login" and the week's sessions
+            history_store.get_store().rekey(previous, key)
+            if outbox.ENABLED:
+                outbox.get_outbox().rekey(previous, key)
+        st.session_state.user_key = key
+    return key
+
+def record_activity(kind: str, **fields):
+    """Appends an event for this session to the activity log behind the Dashboard (see activity.py)
+    and queues it for the persistent history (see history_store.py)."""
+    user = current_user_key()
+    event = activity.get_log().record(kind, st.session_state.activity, user=user, user_type=st.session_state.user_type, **fields)
+    history_store.get_store().enqueue(user, event)
 
 # ====== PAGE CONFIG ======
 st.set_page_config(
@@ -133,6 +59,18 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# ====== DEBUG PROFILING ======
+# Guarded by the debug_profiling setting, then armed with ?profile=1 (see profiling.py)
+profiling.start_run()
+
+# ====== TRACING ======
+# One span per rerun, split in sections (see telemetry.py). Traces go to .leadcraftr/traces.jsonl
+telemetry.begin_run()
+telemetry.section("session_init")
+
+# ====== SESSION RESUME ======
+# A reload keeps ?resume=<token> in the URL: restore the profile, matches and drafts saved under it (see session_snapshot.py)
+session_snapshot.resume()
 
 # ====== SESSION INITIALISATION ======
 if "page" not in st.session_state:
@@ -171,6 +109,11 @@ if "freelancer_email_sent_states" not in st.session_state:
 if "company_email_sent_states" not in st.session_state:
     st.session_state.company_email_sent_states = {}
 
+# Per-session view of the activity log (recent sends); per-user counters live in activity.get_log()
+if "activity" not in st.session_state:
+    st.session_state.activity = activity.SessionActivity()
+    record_activity("session_start")
+
 # --- Custom CSS for the new "Time Saved" and "Money Saved" box ---
 # Removed the fixed position info-box CSS as it should only appear after landing
 
@@ -181,6 +124,7 @@ if "company_email_sent_states" not in st.session_state:
 
 
 # ===== SIDEBAR CONTENT (Navigation and Profile Type) MOVED TO TOP =====
+telemetry.section("sidebar")
 st.sidebar.markdown("### 👥 Profile Type")
 selected_profile_type = st.sidebar.radio("I am a ...", ["Freelancer", "Company"], key="profile_type_sidebar", index=0 if st.session_state.user_type == "freelancer" else 1)
 st.session_state.user_type = selected_profile_type.lower() # Update session state from sidebar
@@ -199,13 +143,17 @@ elif st.session_state.page == "👤 My Profile" and not st.session_state.profile
 
 st.session_state.page = st.sidebar.radio(
     "Find your matches",
-    ["🏠 Home", profile_page_label, "📊 Dashboard", "🧮 Calculate your daily rate"], # New sidebar option
+    ["🏠 Home", profile_page_label, "📊 Dashboard", "🧮 Calculate your daily rate", "📦 Bulk outreach"], # New sidebar option
     key="navigation_menu",
-    index=["🏠 Home", profile_page_label, "📊 Dashboard", "🧮 Calculate your daily rate"].index(st.session_state.page)
+    index=["🏠 Home", profile_page_label, "📊 Dashboard", "🧮 Calculate your daily rate", "📦 Bulk outreach"].index(st.session_state.page)
 )
+telemetry.set_context(page=st.session_state.page)
+semantic_cache.set_scope(current_user_key()) # Emails generated for this user are only reused for them
+semantic_cache.warm() # Loads in the background: no script run waits for it
 
 
 # ====== GLOBAL CSS FOR HIDING CHROME & BUTTON STYLING ======
+telemetry.section("global_css")
 st.markdown("""
     <style>
     /* Hide Streamlit Chrome for initial splash */
@@ -348,6 +296,7 @@ st.markdown("""
 
 
 # ====== PAGE CONTENT RENDERING ======
+telemetry.section("page_body")
 if st.session_state.page == "🏠 Home":
     # Display welcome message only once per session if profile created
     if st.session_state.profile_created and not st.session_state.welcome_message_shown:
@@ -443,6 +392,7 @@ if st.session_state.page == "🏠 Home":
             else:
                 statement_error_placeholder.empty()
                 st.session_state.freelancer_form_submitted = True
+                job_queue.cancel_session() # Drafts queued for the previous results are no longer needed
 
                 # Update profile data in session state for consistency
                 st.session_state.user_profile_data.update({
@@ -473,10 +423,16 @@ if st.session_state.page == "🏠 Home":
                         progress_text_placeholder.text(f"Finding companies... {i}/10")
                         time.sleep(0.05)
 
+                    record_activity("search", sector=sector, results=len(st.session_state.freelancer_matches))
                     st.toast("🎉 Companies found!", icon="✅")
                     progress_text_placeholder.text(f"Finding companies... 10/10 - Done!")
                     st.success(f"{len(st.session_state.freelancer_matches)} companies found ✔︎")
 
+                except DeadlineExceeded:
+                    st.error("⏱️ The matching service is taking too long to answer. Please try again in a moment.")
+                    st.session_state.freelancer_form_submitted = False
+                    progress_bar_placeholder.empty()
+                    progress_text_placeholder.empty()
                 except Exception as e:
                     st.error(f"❌ API error: {e}")
                     st.session_state.freelancer_form_submitted = False
@@ -484,12 +440,15 @@ if st.session_state.page == "🏠 Home":
                     progress_text_placeholder.empty()
 
         if st.session_state.freelancer_form_submitted and st.session_state.freelancer_matches:
-            for m in st.session_state.freelancer_matches:
+            if st.session_state.freelancer_matches[0].get("offline_match"):
+                st.warning("⚠️ The matching service is unavailable right now: these are offline matches from companies seen before.")
+            waiting_jobs = [] # Background generations this render shows as in progress (see job_queue.py)
+            for position, m in enumerate(st.session_state.freelancer_matches):
                 company_id = m['company']
 
                 if company_id not in st.session_state.freelancer_email_sent_states:
                     st.session_state.freelancer_email_sent_states[company_id] = {
-                        "content": "", "count": 0, "show_modal": False, "sent": False, "show_success_message": False
+                        "content": "", "count": 0, "show_modal": False, "sent": False, "show_success_message": False, "regenerating": False
                     }
 
                 expander_key = f"expander_{company_id}"
@@ -498,10 +457,12 @@ if st.session_state.page == "🏠 Home":
 
                 expander_header_prefix = "✅ " if st.session_state.freelancer_email_sent_states[company_id]["sent"] else "🧩 "
 
-                with st.expander(
+                # A stateful expander (on_change="rerun") tells which cards are open, so their drafts go first
+                card = st.expander(
                     f"{expander_header_prefix}{m['company']} — {m['mission_statement']}",
-                    expanded=st.session_state[expander_key]
-                ):
+                    expanded=st.session_state[expander_key], key=f"card_{company_id}", on_change="rerun"
+                )
+                with card:
                     selected_tone = st.multiselect(
                         "🎙️ Choose a tone",
                         ["Warm", "Professional", "Creative", "Direct", "Empathetic"],
@@ -509,64 +470,112 @@ if st.session_state.page == "🏠 Home":
                         key=f"tone_{company_id}",
                         max_selections=2
                     )
-                    st.session_state[expander_key] = True
-
-                    if not st.session_state.freelancer_email_sent_states[company_id]["content"] and \
-                       st.session_state.freelancer_email_sent_states[company_id]["count"] == 0:
-                        try:
-                            # Use profile data for sender, override statement with form's current value
-                            freelance_data_sender = sanitize_freelancer_data({
-                                **st.session_state.user_profile_data, # Use profile as base
-                                "name": name, # Override with current form input
-                                "title": job,
-                                "main_sector": sector,
-                                "top3_skills": skills,
-                                "daily_rate": rate,
-                                "remote": mode == "Remote",
-                                "mission_statement": statement, # Use the statement from the current form
-                                "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"]),
-                                "preferred_style": selected_style
-                            })
-                            prospect_data_initial = sanitize_prospect_data(m)
-
-                            initial_email = generate_mail(freelance_data_sender, prospect_data_initial, sender_type="freelancer", previous_mail_content="")
-                            st.session_state.freelancer_email_sent_states[company_id]["content"] = initial_email
+                    st.session_state[expander_key] = bool(card.open) # Reopens it after a visit to another page
+
+                    # Use profile data for sender, override statement with form's current value
+                    freelance_data_sender = sanitize_freelancer_data({
+                        **st.session_state.user_profile_data, # Use profile as base
+                        "name": name, # Override with current form input
+                        "title": job,
+                        "main_sector": sector,
+                        "top3_skills": skills,
+                        "daily_rate": rate,
+                        "remote": mode == "Remote",
+                        "mission_statement": statement, # Use the statement from the current form
+                        "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"]),
+                        "preferred_style": selected_style
+                    })
+                    prospect_data = sanitize_prospect_data(m)
+
+                    # Drafts are generated by the background job queue: a rerun picks up the job already queued for this card.
+                    # Opened cards are drafted first, then the top of the list, then the rest (see job_queue.draft_priority)
+                    draft_priority = job_queue.draft_priority(position, card.open)
+                    if draft_priority is not None and not st.session_state.freelancer_email_sent_states[company_id]["content"] and \
+                       st.session_state.freelancer_email_sent_states[company_id]["count"] == 0 and \
+                       not st.session_state.freelancer_email_sent_states[company_id].get("regenerating") and not st.session_state.freelancer_email_sent_states[company_id].get("draft_failed"):
+                        initial_job = job_queue.submit(("initial", company_id), speculative.fingerprint(freelance_data_sender, prospect_data), generate_mail, freelance_data_sender, prospect_data, sender_type="freelancer", previous_mail_content="", card=company_id, priority=draft_priority)
+                        if not initial_job.done():
+                            if card.open: # Closed cards collect their draft on a later rerun, e.g. when opened
+                                waiting_jobs.append(("initial", company_id))
+                            if not st.session_state.get(f"textarea_{company_id}"): # A quick local draft is shown until the generated one arrives
+                                st.session_state[f"textarea_{company_id}"] = st.session_state.freelancer_email_sent_states[company_id]["placeholder"] = draft_email(freelance_data_sender, prospect_data, "freelancer")
+                            st.info("⏳ Drafting your email... Here is a quick draft in the meantime.")
+                        elif initial_job.status == "done":
+                            job_queue.pop(("initial", company_id))
+                            shown = st.session_state.get(f"textarea_{company_id}")
+                            if shown and shown != st.session_state.freelancer_email_sent_states[company_id].get("placeholder"): # The user started editing the quick draft: keep their text
+                                st.session_state.freelancer_email_sent_states[company_id]["content"] = shown
+                                st.info("✏️ Your edits to the quick draft were kept. Click 🔄 Regenerate for a generated email.")
+                            else:
+                                st.session_state.freelancer_email_sent_states[company_id]["content"] = initial_job.result
+                                st.session_state[f"textarea_{company_id}"] = initial_job.result # The text area shows its widget state, not "content"
                             st.session_state.freelancer_email_sent_states[company_id]["count"] = 1
-                        except Exception as e:
-                            st.warning(f"⚠️ Initial email generation error for {company_id}: {e}")
+                            record_activity("generation", target=company_id, sector=prospect_data["sector"], tone=freelance_data_sender["preferred_tone"])
+                        else: # The quick draft stays a placeholder: it can only be sent once regenerated or edited
+                            job_queue.pop(("initial", company_id))
+                            st.session_state.freelancer_email_sent_states[company_id]["draft_failed"] = True # Not queued again on every rerun: 🔄 Regenerate retries
+                            if not st.session_state.get(f"textarea_{company_id}"):
+                                st.session_state[f"textarea_{company_id}"] = st.session_state.freelancer_email_sent_states[company_id]["placeholder"] = draft_email(freelance_data_sender, prospect_data, "freelancer")
+                            if isinstance(initial_job.error, DeadlineExceeded):
+                                st.warning("⏱️ Your email took too long to generate. Click 🔄 Regenerate to try again, or edit the quick draft before sending it.")
+                            else:
+                                st.warning(f"⚠️ Initial email generation error for {company_id}: {initial_job.error}. Click 🔄 Regenerate to try again, or edit the quick draft before sending it.")
+
+                    current_textarea_content = st.session_state.freelancer_email_sent_states[company_id]["content"]
+                    next_variant = speculative.fingerprint(freelance_data_sender, prospect_data, current_textarea_content)
+                    if st.session_state.freelancer_email_sent_states[company_id].get("regenerating"):
+                        regen_job = speculative.claimed(company_id, next_variant) or \
+                            speculative.claim(company_id, next_variant, generate_mail, freelance_data_sender, prospect_data, sender_type="freelancer", previous_mail_content=current_textarea_content, card=company_id)
+                        if not regen_job.done():
+                            waiting_jobs.append(speculative.job_key(company_id))
+                            st.info("⏳ Regenerating your email...")
+                        else:
+                            speculative.discard(company_id)
+                            st.session_state.freelancer_email_sent_states[company_id]["regenerating"] = False
+                            if regen_job.status == "done":
+                                st.session_state.freelancer_email_sent_states[company_id]["content"] = regen_job.result
+                                st.session_state.freelancer_email_sent_states[company_id]["draft_failed"] = False
+                                st.session_state[f"textarea_{company_id}"] = regen_job.result # The text area shows its widget state, not "content"
+                                st.session_state.freelancer_email_sent_states[company_id]["count"] += 1
+                                record_activity("regeneration", target=company_id, sector=prospect_data["sector"], tone=freelance_data_sender["preferred_tone"])
+                                st.session_state.freelancer_email_sent_states[company_id]["sent"] = False
+                            elif isinstance(regen_job.error, DeadlineExceeded):
+                                st.warning("⏱️ The new draft took too long. Your current draft is kept, please try again.")
+                            else:
+                                st.warning(f"⚠️ Error: {regen_job.error}")
 
                     st.caption("✉️ Tone-matched email")
-                    st.text_area("tone_matched_email", value=st.session_state.freelancer_email_sent_states[company_id]["content"], height=180, key=f"textarea_{company_id}")
+                    if f"textarea_{company_id}" not in st.session_state: # Widget state is dropped when another page is shown
+                        st.session_state[f"textarea_{company_id}"] = st.session_state.freelancer_email_sent_states[company_id]["content"] or st.session_state.freelancer_email_sent_states[company_id].get("placeholder", "")
+                    st.text_area("tone_matched_email", height=180, key=f"textarea_{company_id}")
+                    # The quick draft (a template, or an email written for a similar request) is never sent as is
+                    shown = st.session_state[f"textarea_{company_id}"]
+                    placeholder_only = not st.session_state.freelancer_email_sent_states[company_id]["content"] and (not shown or shown == st.session_state.freelancer_email_sent_states[company_id].get("placeholder"))
+                    if placeholder_only and st.session_state.freelancer_email_sent_states[company_id].get("draft_failed"):
+                        st.caption("📝 This is a quick draft, not a generated email: click 🔄 Regenerate, or edit it, before sending.")
+
+                    # Draft the next variant in the background so "Regenerate" is instant (see speculative.py).
+                    # Only for open cards: prefetching every card would double the generations of a search
+                    current_textarea_content = st.session_state.freelancer_email_sent_states[company_id]["content"]
+                    next_variant = speculative.fingerprint(freelance_data_sender, prospect_data, current_textarea_content)
+                    if card.open and current_textarea_content and st.session_state.freelancer_email_sent_states[company_id]["count"] < 3 and \
+                       not st.session_state.freelancer_email_sent_states[company_id]["sent"]:
+                        speculative.prefetch(company_id, next_variant, generate_mail, freelance_data_sender, prospect_data, sender_type="freelancer", previous_mail_content=current_textarea_content, card=company_id)
 
                     regen_col, validate_col = st.columns([1, 1])
                     with regen_col:
                         if st.button(f"🔄 Regenerate", key=f"regen_{company_id}"):
                             st.session_state[expander_key] = True
                             st.session_state.freelancer_email_sent_states[company_id]["show_success_message"] = False
-                            if st.session_state.freelancer_email_sent_states[company_id]["count"] < 3:
-                                try:
-                                    # Use profile data for sender, override statement with form's current value
-                                    freelance_data_sender = sanitize_freelancer_data({
-                                        **st.session_state.user_profile_data, # Use profile as base
-                                        "name": name, # Override with current form input
-                                        "title": job,
-                                        "main_sector": sector,
-                                        "top3_skills": skills,
-                                        "daily_rate": rate,
-                                        "remote": mode == "Remote",
-                                        "mission_statement": statement, # Use the statement from the current form
-                                        "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"]),
-                                        "preferred_style": selected_style
-                                    })
-                                    prospect_data = sanitize_prospect_data(m)
-
-                                    current_textarea_content = st.session_state.freelancer_email_sent_states[company_id]["content"]
-                                    email = generate_mail(freelance_data_sender, prospect_data, sender_type="freelancer", previous_mail_content=current_textarea_content)
-                                    st.session_state.freelancer_email_sent_states[company_id]["content"] = email
-                                    st.session_state.freelancer_email_sent_states[company_id]["count"] += 1
-                                    st.session_state.freelancer_email_sent_states[company_id]["sent"] = False
-                                except Exception as e:
-                                    st.warning(f"⚠️ Error: {e}")
+                            if st.session_state.freelancer_email_sent_states[company_id].get("regenerating"):
+                                pass # Already on its way: a second click must not start a second generation
+                            elif st.session_state.freelancer_email_sent_states[company_id]["count"] < 3:
+                                # Usually picks up the prefetched variant; the card collects it on the rerun
+                                if semantic_cache.loaded() is not None:
+                                    semantic_cache.loaded().reject(current_textarea_content) # A reused draft the user didn't keep
+                                speculative.claim(company_id, next_variant, generate_mail, freelance_data_sender, prospect_data, sender_type="freelancer", previous_mail_content=current_textarea_content, card=company_id)
+                                st.session_state.freelancer_email_sent_states[company_id]["regenerating"] = True
+                                st.rerun()
                             else:
                                 st.warning("⚠️ You’ve reached the limit of email generations. Upgrade to LeadCraftr Pro.")
                     with validate_col:
@@ -576,8 +585,10 @@ if st.session_state.page == "🏠 Home":
                                 unsafe_allow_html=True
                             )
                         else:
-                            if st.button(f"✅ Validate this email", key=f"validate_{company_id}"):
+                            if st.button(f"✅ Validate this email", key=f"validate_{company_id}", disabled=placeholder_only):
                                 st.session_state[expander_key] = True
+                                if not st.session_state.freelancer_email_sent_states[company_id]["content"]: # The user's own edit of the quick draft
+                                    st.session_state.freelancer_email_sent_states[company_id]["content"] = shown
                                 st.session_state.freelancer_email_sent_states[company_id]["show_modal"] = True
                                 st.session_state.freelancer_email_sent_states[company_id]["show_success_message"] = False
 
@@ -589,16 +600,31 @@ if st.session_state.page == "🏠 Home":
                             st.session_state.freelancer_email_sent_states[company_id]["show_modal"] = False
                             st.session_state.freelancer_email_sent_states[company_id]["sent"] = True
                             st.session_state.freelancer_email_sent_states[company_id]["show_success_message"] = True
+                            speculative.discard(company_id) # No more regenerations for this card
 
                             # Incrémenter le temps et l'argent économisés (Freelancer)
                             st.session_state.total_time_saved += 5 # Based on research: ~5 mins saved per personalized email drafting
                             st.session_state.total_money_saved += 20 # Based on research: value of personalized copywriting
+                            record_activity("send", target=company_id, sector=sanitize_prospect_data(m)["sector"])
+                            to_addr = outbox.recipient(m.get("email")) # Not the sanitized one: that falls back to a placeholder
+                            if outbox.ENABLED and to_addr: # Delivered in the background (see outbox.py): the rerun doesn't wait for SMTP
+                                subject, body = outbox.split_subject(st.session_state.freelancer_email_sent_states[company_id]["content"], f"{freelance_data_sender['name']} · {prospect_data['company']}")
+                                st.session_state.freelancer_email_sent_states[company_id]["outbox_id"] = outbox.get_outbox().enqueue(
+                                    to_addr, subject, body, user=current_user_key(), reply_to=st.session_state.user_profile_data.get("email", ""))
 
                             st.toast("Email sent! 🎉", icon="✅")
                             st.rerun()
 
                     if st.session_state.freelancer_email_sent_states[company_id]["sent"] and st.session_state.freelancer_email_sent_states[company_id]["show_success_message"]:
                         st.success("Your message has been sent successfully!")
+                    if st.session_state.freelancer_email_sent_states[company_id]["sent"]:
+                        if st.session_state.freelancer_email_sent_states[company_id].get("outbox_id"):
+                            st.caption(outbox.describe(outbox.get_outbox().status(st.session_state.freelancer_email_sent_states[company_id]["outbox_id"])))
+                        elif outbox.ENABLED:
+                            st.caption("✉️ No email address for this company: copy the email above to send it yourself.")
+
+            if waiting_jobs:
+                job_queue.rerun_when_done(waiting_jobs) # Shows the drafts as soon as they are ready
 
     # --- COMPANY | SEARCH FORM ---
     elif st.session_state.user_type == "company":
@@ -628,6 +654,7 @@ if st.session_state.page == "🏠 Home":
             else:
                 statement_error_placeholder.empty()
                 st.session_state.company_form_submitted = True
+                job_queue.cancel_session() # Drafts queued for the previous results are no longer needed
                 # Update profile data in session state for consistency
                 st.session_state.user_profile_data.update({
                     "company_name": comp,
@@ -646,7 +673,8 @@ if st.session_state.page == "🏠 Home":
                 progress_text_placeholder.text("Finding freelancers... 0/10")
                 try:
                     results = get_matches(mission, user_type="company")
-                    st.session_state.company_matches = results[:10]
+                    # Best budget fits first, from the listed or estimated daily rates (see budget_fit.py)
+                    st.session_state.company_matches = budget_fit.rank(results, budget)[:10]
 
                     for i in range(1, 11):
                         progress = i / 10
@@ -654,10 +682,16 @@ if st.session_state.page == "🏠 Home":
                         progress_text_placeholder.text(f"Finding freelancers... {i}/10")
                         time.sleep(0.05)
 
+                    record_activity("search", sector=sector, results=len(st.session_state.company_matches))
                     st.toast("🎉 Freelancers found!", icon="✅")
                     progress_text_placeholder.text(f"Finding freelancers... 10/10 - Done!")
                     st.success(f"{len(st.session_state.company_matches)} freelancers found ✔︎")
 
+                except DeadlineExceeded:
+                    st.error("⏱️ The matching service is taking too long to answer. Please try again in a moment.")
+                    st.session_state.company_form_submitted = False
+                    progress_bar_placeholder.empty()
+                    progress_text_placeholder.empty()
                 except Exception as e:
                     st.error(f"❌ API error: {e}")
                     st.session_state.company_form_submitted = False
@@ -665,11 +699,14 @@ if st.session_state.page == "🏠 Home":
                     progress_text_placeholder.empty()
 
         if st.session_state.company_form_submitted and st.session_state.company_matches:
+            if st.session_state.company_matches[0].get("offline_match"):
+                st.warning("⚠️ The matching service is unavailable right now: these are offline matches from freelancers seen before.")
+            waiting_jobs = [] # Background generations this render shows as in progress (see job_queue.py)
             for i, f in enumerate(st.session_state.company_matches):
                 freelancer_id = f.get("name", f"freelancer_{i}")
                 if freelancer_id not in st.session_state.company_email_sent_states:
                     st.session_state.company_email_sent_states[freelancer_id] = {
-                        "content": "", "count": 0, "show_modal": False, "sent": False, "show_success_message": False
+                        "content": "", "count": 0, "show_modal": False, "sent": False, "show_success_message": False, "regenerating": False
                     }
 
                 expander_key = f"expander_{freelancer_id}"
@@ -681,10 +718,15 @@ if st.session_state.page == "🏠 Home":
                 if not display_freelancer_name:
                     display_freelancer_name = "Freelancer (Name not provided)"
 
-                with st.expander(
-                    f"{expander_header_prefix}{display_freelancer_name} — {f.get('main_sector', '')} — {f.get('city', '')}",
-                    expanded=st.session_state[expander_key]
-                ):
+                budget_label = budget_fit.describe(f, st.session_state.user_profile_data.get("budget_per_day"))
+
+                # A stateful expander (on_change="rerun") tells which cards are open, so their drafts go first
+                card = st.expander(
+                    f"{expander_header_prefix}{display_freelancer_name} — {f.get('main_sector', '')} — {f.get('city', '')}"
+                    + (f" — {budget_label}" if budget_label else ""),
+                    expanded=st.session_state[expander_key], key=f"card_{freelancer_id}", on_change="rerun"
+                )
+                with card:
                     selected_tone = st.multiselect(
                         "🎙️ Choose a tone",
                         ["Warm", "Professional", "Creative", "Direct", "Empathetic"],
@@ -692,60 +734,111 @@ if st.session_state.page == "🏠 Home":
                         key=f"tone_{freelancer_id}",
                         max_selections=2
                     )
-                    st.session_state[expander_key] = True
-
-                    if not st.session_state.company_email_sent_states[freelancer_id]["content"] and \
-                       st.session_state.company_email_sent_states[freelancer_id]["count"] == 0:
-                        try:
-                            sanitized_freelance_data = sanitize_freelancer_data(f)
-                            # Use profile data for sender, override statement with form's current value
-                            sanitized_prospect_data_sender = sanitize_prospect_data({
-                                **st.session_state.user_profile_data, # Use profile as base
-                                "company": comp,
-                                "company_size": csize,
-                                "city": loc,
-                                "sector": sector,
-                                "mission_statement": mission, # Use the statement from the current form
-                                "remote": mode == "Remote",
-                                "contact_role": title,
-                                "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"])
-                            })
-                            initial_mail = generate_mail(sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content="")
-                            st.session_state.company_email_sent_states[freelancer_id]["content"] = initial_mail
+                    st.session_state[expander_key] = bool(card.open) # Reopens it after a visit to another page
+
+                    sanitized_freelance_data = sanitize_freelancer_data(f)
+                    # Use profile data for sender, override statement with form's current value
+                    sanitized_prospect_data_sender = sanitize_prospect_data({
+                        **st.session_state.user_profile_data, # Use profile as base
+                        "company": comp,
+                        "company_size": csize,
+                        "city": loc,
+                        "sector": sector,
+                        "mission_statement": mission, # Use the statement from the current form
+                        "remote": mode == "Remote",
+                        "contact_role": title,
+                        "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"])
+                    })
+
+                    # Drafts are generated by the background job queue: a rerun picks up the job already queued for this card.
+                    # Opened cards are drafted first, then the top of the list, then the rest (see job_queue.draft_priority)
+                    draft_priority = job_queue.draft_priority(i, card.open)
+                    if draft_priority is not None and not st.session_state.company_email_sent_states[freelancer_id]["content"] and \
+                       st.session_state.company_email_sent_states[freelancer_id]["count"] == 0 and \
+                       not st.session_state.company_email_sent_states[freelancer_id].get("regenerating") and not st.session_state.company_email_sent_states[freelancer_id].get("draft_failed"):
+                        initial_job = job_queue.submit(("initial", freelancer_id), speculative.fingerprint(sanitized_freelance_data, sanitized_prospect_data_sender), generate_mail, sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content="", card=freelancer_id, priority=draft_priority)
+                        if not initial_job.done():
+                            if card.open: # Closed cards collect their draft on a later rerun, e.g. when opened
+                                waiting_jobs.append(("initial", freelancer_id))
+                            if not st.session_state.get(f"textarea_{freelancer_id}"): # A quick local draft is shown until the generated one arrives
+                                st.session_state[f"textarea_{freelancer_id}"] = st.session_state.company_email_sent_states[freelancer_id]["placeholder"] = draft_email(sanitized_freelance_data, sanitized_prospect_data_sender, "company")
+                            st.info("⏳ Drafting your email... Here is a quick draft in the meantime.")
+                        elif initial_job.status == "done":
+                            job_queue.pop(("initial", freelancer_id))
+                            shown = st.session_state.get(f"textarea_{freelancer_id}")
+                            if shown and shown != st.session_state.company_email_sent_states[freelancer_id].get("placeholder"): # The user started editing the quick draft: keep their text
+                                st.session_state.company_email_sent_states[freelancer_id]["content"] = shown
+                                st.info("✏️ Your edits to the quick draft were kept. Click 🔄 Regenerate for a generated email.")
+                            else:
+                                st.session_state.company_email_sent_states[freelancer_id]["content"] = initial_job.result
+                                st.session_state[f"textarea_{freelancer_id}"] = initial_job.result # The text area shows its widget state, not "content"
                             st.session_state.company_email_sent_states[freelancer_id]["count"] = 1
-                        except Exception as e:
-                            st.warning(f"⚠️ Initial email generation error for {display_freelancer_name}: {e}")
+                            record_activity("generation", target=display_freelancer_name, sector=sanitized_freelance_data["main_sector"], tone=sanitized_prospect_data_sender["target_tone"])
+                        else: # The quick draft stays a placeholder: it can only be sent once regenerated or edited
+                            job_queue.pop(("initial", freelancer_id))
+                            st.session_state.company_email_sent_states[freelancer_id]["draft_failed"] = True # Not queued again on every rerun: 🔄 Regenerate retries
+                            if not st.session_state.get(f"textarea_{freelancer_id}"):
+                                st.session_state[f"textarea_{freelancer_id}"] = st.session_state.company_email_sent_states[freelancer_id]["placeholder"] = draft_email(sanitized_freelance_data, sanitized_prospect_data_sender, "company")
+                            if isinstance(initial_job.error, DeadlineExceeded):
+                                st.warning("⏱️ Your email took too long to generate. Click 🔄 Regenerate to try again, or edit the quick draft before sending it.")
+                            else:
+                                st.warning(f"⚠️ Initial email generation error for {display_freelancer_name}: {initial_job.error}. Click 🔄 Regenerate to try again, or edit the quick draft before sending it.")
+
+                    current_textarea_content = st.session_state.company_email_sent_states[freelancer_id]["content"]
+                    next_variant = speculative.fingerprint(sanitized_freelance_data, sanitized_prospect_data_sender, current_textarea_content)
+                    if st.session_state.company_email_sent_states[freelancer_id].get("regenerating"):
+                        regen_job = speculative.claimed(freelancer_id, next_variant) or \
+                            speculative.claim(freelancer_id, next_variant, generate_mail, sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content=current_textarea_content, card=freelancer_id)
+                        if not regen_job.done():
+                            waiting_jobs.append(speculative.job_key(freelancer_id))
+                            st.info("⏳ Regenerating your email...")
+                        else:
+                            speculative.discard(freelancer_id)
+                            st.session_state.company_email_sent_states[freelancer_id]["regenerating"] = False
+                            if regen_job.status == "done":
+                                st.session_state.company_email_sent_states[freelancer_id]["content"] = regen_job.result
+                                st.session_state.company_email_sent_states[freelancer_id]["draft_failed"] = False
+                                st.session_state[f"textarea_{freelancer_id}"] = regen_job.result # The text area shows its widget state, not "content"
+                                st.session_state.company_email_sent_states[freelancer_id]["count"] += 1
+                                record_activity("regeneration", target=display_freelancer_name, sector=sanitized_freelance_data["main_sector"], tone=sanitized_prospect_data_sender["target_tone"])
+                                st.session_state.company_email_sent_states[freelancer_id]["sent"] = False
+                            elif isinstance(regen_job.error, DeadlineExceeded):
+                                st.warning("⏱️ The new draft took too long. Your current draft is kept, please try again.")
+                            else:
+                                st.warning(f"⚠️ Error: {regen_job.error}")
 
                     st.caption("✉️ Tone-matched email")
-                    st.text_area("tone_matched_email", st.session_state.company_email_sent_states[freelancer_id]["content"], height=180, key=f"textarea_{freelancer_id}")
+                    if f"textarea_{freelancer_id}" not in st.session_state: # Widget state is dropped when another page is shown
+                        st.session_state[f"textarea_{freelancer_id}"] = st.session_state.company_email_sent_states[freelancer_id]["content"] or st.session_state.company_email_sent_states[freelancer_id].get("placeholder", "")
+                    st.text_area("tone_matched_email", height=180, key=f"textarea_{freelancer_id}")
+                    # The quick draft (a template, or an email written for a similar request) is never sent as is
+                    shown = st.session_state[f"textarea_{freelancer_id}"]
+                    placeholder_only = not st.session_state.company_email_sent_states[freelancer_id]["content"] and (not shown or shown == st.session_state.company_email_sent_states[freelancer_id].get("placeholder"))
+                    if placeholder_only and st.session_state.company_email_sent_states[freelancer_id].get("draft_failed"):
+                        st.caption("📝 This is a quick draft, not a generated email: click 🔄 Regenerate, or edit it, before sending.")
+
+                    # Draft the next variant in the background so "Regenerate" is instant (see speculative.py).
+                    # Only for open cards: prefetching every card would double the generations of a search
+                    current_textarea_content = st.session_state.company_email_sent_states[freelancer_id]["content"]
+                    next_variant = speculative.fingerprint(sanitized_freelance_data, sanitized_prospect_data_sender, current_textarea_content)
+                    if card.open and current_textarea_content and st.session_state.company_email_sent_states[freelancer_id]["count"] < 3 and \
+                       not st.session_state.company_email_sent_states[freelancer_id]["sent"]:
+                        speculative.prefetch(freelancer_id, next_variant, generate_mail, sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content=current_textarea_content, card=freelancer_id)
 
                     regen_col, validate_col = st.columns([1, 1])
                     with regen_col:
                         if st.button("🔄 Regenerate", key=f"regen_{freelancer_id}"):
                             st.session_state[expander_key] = True
                             st.session_state.company_email_sent_states[freelancer_id]["show_success_message"] = False
-                            if st.session_state.company_email_sent_states[freelancer_id]["count"] < 3:
-                                try:
-                                    sanitized_freelance_data = sanitize_freelancer_data(f)
-                                    # Use profile data for sender, override statement with form's current value
-                                    sanitized_prospect_data_sender = sanitize_prospect_data({
-                                        **st.session_state.user_profile_data, # Use profile as base
-                                        "company": comp,
-                                        "company_size": csize,
-                                        "city": loc,
-                                        "sector": sector,
-                                        "mission_statement": mission, # Use the statement from the current form
-                                        "remote": mode == "Remote",
-                                        "contact_role": title,
-                                        "preferred_tone": ", ".join(selected_tone if selected_tone else ["Professional"])
-                                    })
-                                    current_textarea_content = st.session_state.company_email_sent_states[freelancer_id]["content"]
-                                    new_mail = generate_mail(sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content=current_textarea_content)
-                                    st.session_state.company_email_sent_states[freelancer_id]["content"] = new_mail
-                                    st.session_state.company_email_sent_states[freelancer_id]["count"] += 1
-                                    st.session_state.company_email_sent_states[freelancer_id]["sent"] = False
-                                except Exception as e:
-                                    st.warning(f"⚠️ Error: {e}")
+                            if st.session_state.company_email_sent_states[freelancer_id].get("regenerating"):
+                                pass # Already on its way: a second click must not start a second generation
+                            elif st.session_state.company_email_sent_states[freelancer_id]["count"] < 3:
+                                # Usually picks up the prefetched variant; the card collects it on the rerun
+                                if semantic_cache.loaded() is not None:
+                                    semantic_cache.loaded().reject(current_textarea_content) # A reused draft the user didn't keep
+                                speculative.claim(freelancer_id, next_variant, generate_mail, sanitized_freelance_data, sanitized_prospect_data_sender, sender_type="company", previous_mail_content=current_textarea_content, card=freelancer_id)
+                                st.session_state.company_email_sent_states[freelancer_id]["regenerating"] = True
+                                st.rerun()
                             else:
                                 st.warning("⚠️ You’ve reached the limit of email generations. Upgrade to LeadCraftr Pro.")
                     with validate_col:
@@ -755,8 +848,10 @@ if st.session_state.page == "🏠 Home":
                                 unsafe_allow_html=True
                             )
                         else:
-                            if st.button("✅ Validate this email", key=f"validate_{freelancer_id}"):
+                            if st.button("✅ Validate this email", key=f"validate_{freelancer_id}", disabled=placeholder_only):
                                 st.session_state[expander_key] = True
+                                if not st.session_state.company_email_sent_states[freelancer_id]["content"]: # The user's own edit of the quick draft
+                                    st.session_state.company_email_sent_states[freelancer_id]["content"] = shown
                                 st.session_state.company_email_sent_states[freelancer_id]["show_modal"] = True
                                 st.session_state.company_email_sent_states[freelancer_id]["show_success_message"] = False
 
@@ -768,16 +863,31 @@ if st.session_state.page == "🏠 Home":
                             st.session_state.company_email_sent_states[freelancer_id]["show_modal"] = False
                             st.session_state.company_email_sent_states[freelancer_id]["sent"] = True
                             st.session_state.company_email_sent_states[freelancer_id]["show_success_message"] = True
+                            speculative.discard(freelancer_id) # No more regenerations for this card
 
                             # Incrémenter le temps et l'argent économisés (Company)
                             st.session_state.total_time_saved += 5 # Based on research: ~5 mins saved per personalized email drafting
                             st.session_state.total_money_saved += 20 # Based on research: value of personalized copywriting
+                            record_activity("send", target=display_freelancer_name, sector=sanitize_freelancer_data(f)["main_sector"])
+                            to_addr = outbox.recipient(sanitized_freelance_data.get("email"))
+                            if outbox.ENABLED and to_addr: # Delivered in the background (see outbox.py)
+                                subject, body = outbox.split_subject(st.session_state.company_email_sent_states[freelancer_id]["content"], f"{sanitized_prospect_data_sender['company']} · {display_freelancer_name}")
+                                st.session_state.company_email_sent_states[freelancer_id]["outbox_id"] = outbox.get_outbox().enqueue(
+                                    to_addr, subject, body, user=current_user_key(), reply_to=st.session_state.user_profile_data.get("contact_email", ""))
 
                             st.toast("Email sent! 🎉", icon="✅")
                             st.rerun()
 
                     if st.session_state.company_email_sent_states[freelancer_id]["sent"] and st.session_state.company_email_sent_states[freelancer_id]["show_success_message"]:
                         st.success("Your message has been sent successfully!")
+                    if st.session_state.company_email_sent_states[freelancer_id]["sent"]:
+                        if st.session_state.company_email_sent_states[freelancer_id].get("outbox_id"):
+                            st.caption(outbox.describe(outbox.get_outbox().status(st.session_state.company_email_sent_states[freelancer_id]["outbox_id"])))
+                        elif outbox.ENABLED:
+                            st.caption("✉️ No email address for this freelancer: copy the email above to send it yourself.")
+
+            if waiting_jobs:
+                job_queue.rerun_when_done(waiting_jobs) # Shows the drafts as soon as they are ready
 
 # ====== PAGE "CREATE YOUR PROFILE" / "MY PROFILE" ======
 elif st.session_state.page in ["📝 Create your profile", "👤 My Profile"]:
@@ -875,6 +985,7 @@ elif st.session_state.page in ["📝 Create your profile", "👤 My Profile"]:
             work_mode = st.selectbox("Preferred Work Mode for Freelancers", ["Remote", "On-site", "Hybrid"], index=["Remote", "On-site", "Hybrid"].index(current_data.get("work_mode", "Remote")))
             location = st.text_input("Company Location (City)", value=current_data.get("location", ""))
             target_tone = st.selectbox("Target Email Tone", ["Warm", "Professional", "Creative", "Direct", "Empathetic"], index=["Warm", "Professional", "Creative", "Direct", "Empathetic"].index(current_data.get("target_tone", "Professional")))
+            preferred_email_style = st.selectbox("Preferred Email Style", ["Storytelling", "Direct", "Formal", "Informal", "Benefit-driven", "Technical"], index=["Storytelling", "Direct", "Formal", "Informal", "Benefit-driven", "Technical"].index(current_data.get("preferred_email_style", "Direct")))
 
             submitted = st.form_submit_button("Save Profile")
 
@@ -895,6 +1006,7 @@ elif st.session_state.page in ["📝 Create your profile", "👤 My Profile"]:
                         "work_mode": work_mode,
                         "location": location,
                         "target_tone": target_tone,
+                        "preferred_email_style": preferred_email_style,
                         "user_type": "company"
                     })
                     st.session_state.profile_created = True
@@ -926,6 +1038,24 @@ elif st.session_state.page == "🧮 Calculate your daily rate":
     """, unsafe_allow_html=True)
     display_tjm_calculator()
 
+# ====== BULK OUTREACH PAGE ======
+elif st.session_state.page == "📦 Bulk outreach":
+    st.markdown("""
+        <style>
+        section[data-testid="stSidebar"],
+        header[data-testid="stHeader"] {
+            display: block !important;
+            visibility: visible !important;
+            height: auto !important;
+        }
+        [data-testid="stAppViewContainer"] > .main .block-container {
+            max-width: unset !important;
+            padding: 1rem !important;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+    display_bulk_outreach(current_user_key(), record_activity)
+
 # ====== DASHBOARD PAGE ======
 elif st.session_state.page == "📊 Dashboard":
     st.markdown("""
@@ -956,37 +1086,50 @@ elif st.session_state.page == "📊 Dashboard":
     st.info("💡 *Time and money saved estimates are based on your daily rate, assuming 8 hours of work per day."
             "Reduced weekly prospecting time from 2.5 hours to less than 20 minutes with LeadCraftr.*")
 
-    st.subheader("✉️ Recent Interactions")
-
-    if st.session_state.user_type == "freelancer":
-        recent_interactions_count = 0
-        for freelancer_id, data in st.session_state.freelancer_email_sent_states.items():
-            if data["sent"]: # Check if sent
-                st.success(f"✅ Email sent to **{freelancer_id}** — {time.strftime('%d %B')}")
-                recent_interactions_count += 1
+    # Persisted history: one row per active day, bucketed by week/month when it gets long
+    st.subheader("📉 Time & Money Saved Over Time")
+    all_time_sends, all_time_minutes, all_time_money = history_store.get_store().totals(current_user_key())
+    history = history_store.downsample(history_store.get_store().daily_series(current_user_key()))
+    if history:
+        st.caption(f"All time: **{all_time_sends}** emails sent · **{all_time_minutes:.0f} min** and **€{all_time_money:.2f}** saved")
+        days, cumulative_minutes, cumulative_money = [], [], []
+        for day, minutes, money in history:
+            days.append(day)
+            cumulative_minutes.append((cumulative_minutes[-1] if cumulative_minutes else 0) + minutes)
+            cumulative_money.append((cumulative_money[-1] if cumulative_money else 0) + money)
+        col_chart1, col_chart2 = st.columns(2)
+        with col_chart1:
+            st.line_chart({"Day": days, "Time saved (min)": cumulative_minutes}, x="Day", y="Time saved (min)")
+        with col_chart2:
+            st.line_chart({"Day": days, "Money saved (€)": cumulative_money}, x="Day", y="Money saved (€)")
+    else:
+        st.info("Your saved time and money will be charted here once you start sending emails.")
 
-        if recent_interactions_count == 0:
-            st.info("No recent interactions yet. Generate and send some emails to see them here!")
+    st.subheader("✉️ Recent Interactions")
 
-    elif st.session_state.user_type == "company":
-        recent_interactions_count = 0
-        for freelancer_id, data in st.session_state.company_email_sent_states.items():
-            if data["sent"]: # Check if sent
-                st.success(f"✅ Email sent to **{freelancer_id}** — {time.strftime('%d %B')}")
-                recent_interactions_count += 1
+    # Kept up to date by record_activity(): no need to walk every card state here
+    recent_sends = st.session_state.activity.recent_sends[st.session_state.user_type]
+    for event in recent_sends:
+        st.success(f"✅ Email sent to **{event['target']}** — {time.strftime('%d %B, %H:%M', time.localtime(event['ts']))}")
 
-        if recent_interactions_count == 0:
-            st.info("No recent interactions yet. Generate and send some emails to see them here!")
+    if not recent_sends:
+        st.info("No recent interactions yet. Generate and send some emails to see them here!")
 
 
     st.markdown("---")
     st.markdown("### 📈 Activity Summary")
-    st.markdown("🕒 Last login: Today, 08:46 AM (Simulated)")
-    st.markdown("📆 Total sessions this week: **15** (Simulated)")
-    st.markdown("💼 Most contacted sector: **Tech / SaaS** (Simulated)")
-    st.markdown("🎙️ Most used tone: **Professional** (Simulated)")
+    summary = activity.get_log().aggregates(current_user_key())
+    last_login = summary.previous_session_start
+    st.markdown(f"🕒 Last login: {time.strftime('%d %B, %I:%M %p', time.localtime(last_login)) if last_login else 'This is your first visit'}")
+    st.markdown(f"📆 Total sessions this week: **{summary.sessions_this_week()}**")
+    st.markdown(f"💼 Most contacted sector: **{summary.top_sector or 'No email sent yet'}**")
+    st.markdown(f"🎙️ Most used tone: **{summary.top_tone or 'No email generated yet'}**")
 
 # ---------- FOOTER ----------
+telemetry.section("footer")
 st.markdown("---")
 st.caption("LeadCraftr · Demo front-end with API integration")
 st.caption("Crafted with Love for freelancers & businesses · © 2025 LeadCraftr")
+session_snapshot.save()
+telemetry.end_run()
+profiling.finish_run()
@@ -0,0 +1,184 @@
+"""budget_fit.py
+
+Ranking of matched freelancers by how well their daily rate fits the company's budget.
+
+In company mode the API returns freelancers in its own order, whatever their
+rate. `rank` scores each of them against ``budget_per_day``, with no API call:
+
+    - the expected rate is the freelancer's ``daily_rate`` when the match has
+      one, else an estimate from their profile with the multipliers of the
+      daily-rate calculator (daily_rate_page_NEW.py): years of experience,
+      seniority and specialisation read from the title and skills, market from
+      the city, industry from the sector. Estimates are flagged as such;
+    - a rate within budget fits fully (1.0); above it, the fit drops linearly to
+      0 at ``OVER_BUDGET_TOLERANCE`` (50 %) over budget.
+
+Profiles are encoded to multiplier indexes with a few whole-word keyword
+lookups each (cached: titles, cities and sectors repeat); the rates and fits of
+the whole list are then computed in one NumPy pass (500 candidates take ~5 ms,
+mostly reading the profiles). Freelancers with the same fit keep the API's
+order, which reflects relevance.
+"""
+
+import functools
+import re
+
+import numpy as np
+
+import telemetry
+from daily_rate_page_NEW import (BASE_RATE, EXPERIENCE_MULTIPLIERS, INDUSTRY_ADJUSTMENTS, LOCATION_ADJUSTMENTS,
+                                 SKILL_ADJUSTMENTS, SPECIALIZATION_ADJUSTMENTS)
+
+OVER_BUDGET_TOLERANCE = 0.5
+DEFAULT_YEARS = 5
+RATE_STEP = 25  # Same rounding as the calculator
+
+# (keywords, category) pairs, first match wins; matched as whole words against lower-case text
+# ("build engineer" isn't UI/UX, "Kyiv, Ukraine" isn't the UK). A trailing "*" matches any word
+# starting with the keyword ("financ*": finance, financial, ...)
+SKILL_KEYWORDS = [
+    (("lead", "principal", "head of", "expert", "architect", "staff"), "Expert/Lead"),
+    (("senior", "sr.", "confirmed"), "Senior"),
+    (("junior", "jr.", "intern", "graduate"), "Junior"),
+]
+SPECIALIZATION_KEYWORDS = [
+    (("data", "machine learning", "ml", "ai", "deep learning", "nlp"), "Data Science/ML"),
+    (("devops", "cloud", "aws", "azure", "gcp", "kubernetes", "sre"), "DevOps/Cloud"),
+    (("full-stack", "fullstack", "full stack"), "Full-stack Development"),
+    (("mobile", "ios", "android", "flutter", "react native"), "Mobile Development"),
+    (("frontend", "front-end", "front end", "react", "vue", "angular"), "Frontend Development"),
+    (("backend", "back-end", "back end", "django", "node", "java", "golang"), "Backend Development"),
+    (("ux", "ui", "design*"), "UI/UX Design"),
+    (("project manager", "product manager", "scrum", "agile coach"), "Project Management"),
+    (("consult*",), "Consulting"),
+]
+LOCATION_KEYWORDS = [
+    (("paris",), "France (Paris)"),
+    (("berlin", "munich", "hamburg", "frankfurt", "germany"), "Germany"),
+    (("london", "manchester", "uk", "united kingdom"), "UK"),
+    (("amsterdam", "rotterdam", "netherlands"), "Netherlands"),
+    (("zurich", "geneva", "lausanne", "switzerland"), "Switzerland"),
+    (("new york", "san francisco", "usa", "united states"), "USA"),
+    (("remote",), "Global/Remote"),
+]
+INDUSTRY_KEYWORDS = [
+    (("fintech", "financ*", "bank*", "insur*"), "Finance/Banking"),
+    (("health*", "medic*", "pharma*", "biotech"), "Healthcare"),
+    (("e-commerce", "ecommerce", "commerce", "retail"), "E-commerce"),
+    (("media", "entertain*", "gaming"), "Media/Entertainment"),
+    (("consult*",), "Consulting"),
+    (("govern*", "public sector"), "Government"),
+    (("tech", "saas", "software", "ai", "data", "cloud"), "Tech/SaaS"),
+]
+
+
+def _table(adjustments: dict) -> tuple:
+    """Category -> index, and the multipliers as an array in index order."""
+    return {name: i for i, name in enumerate(adjustments)}, np.array(list(adjustments.values()))
+
+
+_EXPERIENCE = np.array([EXPERIENCE_MULTIPLIERS[years] for years in range(len(EXPERIENCE_MULTIPLIERS))])
+_SKILL_INDEX, _SKILL = _table(SKILL_ADJUSTMENTS)
+_SPECIALIZATION_INDEX, _SPECIALIZATION = _table(SPECIALIZATION_ADJUSTMENTS)
+_LOCATION_INDEX, _LOCATION = _table(LOCATION_ADJUSTMENTS)
+_INDUSTRY_INDEX, _INDUSTRY = _table(INDUSTRY_ADJUSTMENTS)
+
+
+def _classifier(keywords: list, default: str):
+    """text -> category of its first matching keywords, or `default`. Keywords match whole words only;
+    results are cached, as the same titles, cities and sectors come up again and again."""
+    def word(keyword: str) -> str:
+        if keyword.endswith("*"):
+            return rf"(?<!\w){re.escape(keyword[:-1])}"
+        return rf"(?<!\w){re.escape(keyword)}(?!\w)"  # Lookarounds rather than \b: keywords may end with "."
+    patterns = [(re.compile("|".join(map(word, words))), category) for words, category in keywords]
+
+    @functools.lru_cache(maxsize=4096)
+    def category(text: str) -> str:
+        for pattern, name in patterns:
+            if pattern.search(text):
+                return name
+        return default
+    return category
+
+
+_skill_category = _classifier(SKILL_KEYWORDS, "Mid-level")
+_specialization_category = _classifier(SPECIALIZATION_KEYWORDS, "General Development")
+_location_category = _classifier(LOCATION_KEYWORDS, "France (Other cities)")
+_industry_category = _classifier(INDUSTRY_KEYWORDS, "General")
+
+
+def _years(freelancer: dict) -> int:
+    years = freelancer.get("years_experience", freelancer.get("experience_years"))
+    try:
+        return min(max(int(years), 0), len(EXPERIENCE_MULTIPLIERS) - 1)
+    except (TypeError, ValueError):
+        return DEFAULT_YEARS
+
+
+def _known_rate(freelancer: dict) -> float:
+    rate = freelancer.get("daily_rate")
+    if isinstance(rate, list):
+        rate = rate[0] if rate else None
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        return np.nan
+    return rate if rate > 0 else np.nan
+
+
+def _skills(freelancer: dict) -> str:
+    skills = freelancer.get("top3_skills") or ""
+    return ", ".join(map(str, skills)) if isinstance(skills, list) else str(skills)
+
+
+def expected_rates(freelancers: list) -> tuple:
+    """Expected daily rate of each freelancer, and whether it was estimated (arrays)."""
+    known = np.array([_known_rate(f) for f in freelancers], dtype=float)
+    years = np.array([_years(f) for f in freelancers], dtype=int)
+    skill, specialization, location, industry = [], [], [], []
+    for f in freelancers:
+        title = f" {f.get('title') or ''} ".lower()
+        skill.append(_SKILL_INDEX[_skill_category(title)])
+        specialization.append(_SPECIALIZATION_INDEX[_specialization_category(f"{title}{_skills(f).lower()} ")])
+        location.append(_LOCATION_INDEX[_location_category(str(f.get("city") or "remote").lower())])
+        industry.append(_INDUSTRY_INDEX[_industry_category(str(f.get("main_sector") or "").lower())])
+    estimated = (BASE_RATE * _EXPERIENCE[years] * _SKILL[skill] * _SPECIALIZATION[specialization]
+                 * _LOCATION[location] * _INDUSTRY[industry])
+    estimated = np.round(estimated / RATE_STEP) * RATE_STEP
+    is_estimated = np.isnan(known)
+    return np.where(is_estimated, estimated, known), is_estimated
+
+
+def fit_scores(rates: np.ndarray, budget: float) -> np.ndarray:
+    """1.0 within budget, down to 0.0 at `OVER_BUDGET_TOLERANCE` over it."""
+    if not budget or budget <= 0:
+        return np.ones_like(rates)
+    return np.clip(1 - (rates - budget) / (budget * OVER_BUDGET_TOLERANCE), 0.0, 1.0)
+
+
+@telemetry.traced("budget_fit.rank")
+def rank(freelancers: list, budget: float) -> list:
+    """`freelancers` sorted by budget fit (API order among equals), each annotated with
+    ``expected_daily_rate``, ``daily_rate_estimated`` and ``budget_fit``."""
+    if not freelancers:
+        return []
+    rates, is_estimated = expected_rates(freelancers)
+    scores = fit_scores(rates, budget)
+    order = np.argsort(-scores, kind="stable")
+    return [
+        {**freelancers[i], "expected_daily_rate": int(rates[i]), "daily_rate_estimated": bool(is_estimated[i]),
+         "budget_fit": round(float(scores[i]), 2)}
+        for i in order
+    ]
+
+
+def describe(freelancer: dict, budget: float) -> str:
+    """Short label of a ranked freelancer's rate against the budget, e.g. "€600/day · within budget"."""
+    if "expected_daily_rate" not in freelancer:
+        return ""
+    rate = freelancer["expected_daily_rate"]
+    label = f"{'~' if freelancer['daily_rate_estimated'] else ''}€{rate}/day"
+    if not budget or rate <= budget:
+        return f"{label} · within budget"
+    return f"{label} · {round(100 * (rate - budget) / budget)}% over budget"
@@ -0,0 +1,243 @@
+"""bulk_outreach.py
+
+Bulk outreach pipeline: a CSV of targets in, one generated email per target out.
+
+    - The CSV is read lazily in chunks (`read_chunks`) and each chunk is
+      sanitized row by row under one trace span (`sanitization.sanitize_rows`),
+      so memory stays flat whatever the size of the file. Numeric columns (`NUMERIC_FIELDS`) are
+      parsed first: sanitization replaces a rate it can't read with a default.
+    - Generations run on a bounded pool: at most `concurrency` calls are in
+      flight and no more rows are read until one of them finishes.
+    - Failed calls are retried with exponential backoff.
+    - API calls are scheduled as bulk traffic (scheduler.py): interactive users
+      of the app are served first.
+    - Every result is appended to ``<data_dir>/bulk/<job id>/results.jsonl`` as
+      soon as it arrives. The job id is derived from the file, the settings and
+      the sender's profile, so uploading the same file again with the same
+      profile resumes where the last run stopped.
+    - Results are exported as CSV, or as a ZIP with the CSV and one .txt per email,
+      or queued for delivery through the outbox (outbox.py). Exports are only
+      rebuilt when results were added since the last one.
+
+The page itself is in bulk_outreach_page.py.
+"""
+
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import outbox
+import scheduler
+from api_client import DeadlineExceeded, generate_mail
+from sanitization import sanitize_rows
+from settings import data_dir
+
+CHUNK_SIZE = 200
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_S = 1.0
+NUMERIC_FIELDS = ("daily_rate", "years_experience", "experience_years", "budget_per_day")
+_SPACES = re.compile(r"[\s\u202f]+")
+_THOUSANDS = re.compile(r"\d{1,3}(,\d{3})+")
+
+
+def job_id_for(file_bytes: bytes, sender_type: str, tone: str, style: str, sender: dict) -> str:
+    """Stable id of a bulk job: same file, settings and sender profile, same job (and same results folder)."""
+    digest = hashlib.sha1(file_bytes)
+    digest.update(f"|{sender_type}|{tone}|{style}|".encode("utf-8"))
+    digest.update(json.dumps(sender, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _number(text: str):
+    """`text` as an int or float (e.g. "650", "€1 200", "1,200", "650,5"), or None if it isn't a number."""
+    text = _SPACES.sub("", text).strip("€$£")
+    if "," in text and ("." in text or _THOUSANDS.fullmatch(text)):
+        text = text.replace(",", "")  # Thousands separators
+    text = text.replace(",", ".")  # Decimal comma
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def read_chunks(text_stream, chunk_size: int = CHUNK_SIZE):
+    """Yields `(first row index, rows)` chunks from a CSV with a header line."""
+    reader = csv.DictReader(text_stream)
+    chunk, start = [], 0
+    for index, row in enumerate(reader):
+        # Empty cells become missing fields so the sanitize_* defaults apply
+        row = {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+        for field in NUMERIC_FIELDS:
+            if field in row:
+                value = _number(row.pop(field))
+                if value is not None:  # Unreadable: left out, so it gets the default
+                    row[field] = value
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield start, chunk
+            chunk, start = [], index + 1
+    if chunk:
+        yield start, chunk
+
+
+class BulkJob:
+    """One bulk generation run and its results folder."""
+
+    def __init__(self, job_id: str, sender: dict, sender_type: str):
+        self.job_id = job_id
+        self.sender = sender
+        self.sender_type = sender_type
+        self.folder = data_dir("bulk", job_id)
+        self.results_path = os.path.join(self.folder, "results.jsonl")
+        self.done = self._load_done()
+
+    def _load_done(self) -> set:
+        done = set()
+        if os.path.exists(self.results_path):
+            with open(self.results_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line after a crash: that row is redone
+                    if result["status"] == "ok":
+                        done.add(result["row"])
+        return done
+
+    def _generate(self, row_index: int, target: dict) -> dict:
+        """Generates one email, retrying with backoff. Never raises."""
+        if self.sender_type == "freelancer":
+            freelance, prospect, name = self.sender, target, target["company"]
+        else:
+            freelance, prospect, name = target, self.sender, target["name"]
+        error = ""
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                with scheduler.traffic_class(scheduler.BULK):
+                    email = generate_mail(freelance, prospect, sender_type=self.sender_type)
+                return {"row": row_index, "target": name, "to": outbox.recipient(target.get("email")), "email": email, "status": "ok", "error": ""}
+            except DeadlineExceeded as e:
+                error = f"Timed out: {e}"
+            except Exception as e:
+                error = str(e)
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(RETRY_BACKOFF_S * 2 ** attempt)
+        return {"row": row_index, "target": name, "to": outbox.recipient(target.get("email")), "email": "", "status": "failed", "error": error}
+
+    def run(self, text_stream, concurrency: int, on_progress=None) -> dict:
+        """Generates every row not done yet. `on_progress(counts)` is called after each result.
+
+        Blocks until the whole file is done: the page runs it as a background job (job_queue.py)."""
+        counts = {"ok": len(self.done), "failed": 0, "skipped": len(self.done)}
+        target_kind = "prospect" if self.sender_type == "freelancer" else "freelancer"
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk") as pool, \
+                open(self.results_path, "a", encoding="utf-8") as results:
+            in_flight = set()
+
+            def collect():
+                nonlocal in_flight
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    results.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    results.flush()
+                    counts[result["status"]] += 1
+                    if on_progress is not None:
+                        on_progress(counts)
+
+            for start, chunk in read_chunks(text_stream):
+                todo = [(start + i, row) for i, row in enumerate(chunk) if start + i not in self.done]
+                for (row_index, _), target in zip(todo, sanitize_rows([row for _, row in todo], target_kind)):
+                    while len(in_flight) >= concurrency:
+                        collect()
+                    # In the caller's context: the pool threads keep its session and user (telemetry, semantic cache)
+                    in_flight.add(pool.submit(contextvars.copy_context().run, self._generate, row_index, target))
+            while in_flight:
+                collect()
+        return counts
+
+    def _latest_results(self) -> dict:
+        """Row index -> last result written for it (a retried row has several lines)."""
+        latest = {}
+        with open(self.results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                latest[result["row"]] = result
+        return latest
+
+    def _is_current(self, path: str) -> bool:
+        """Was the export at `path` written after the last result?"""
+        try:
+            return os.stat(path).st_mtime_ns >= os.stat(self.results_path).st_mtime_ns
+        except OSError:
+            return False
+
+    def export_csv(self) -> str:
+        """Writes results.csv in the job folder (unless it is up to date) and returns its path."""
+        path = os.path.join(self.folder, "results.csv")
+        if self._is_current(path):
+            return path
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["row", "target", "to", "status", "email", "error"])
+            writer.writeheader()
+            for _, result in sorted(self._latest_results().items()):
+                writer.writerow(result)
+        return path
+
+    def export_zip(self) -> str:
+        """Writes outreach.zip (results.csv + one .txt per email) in the job folder (unless it is up to date)
+        and returns its path."""
+        csv_path = self.export_csv()
+        path = os.path.join(self.folder, "outreach.zip")
+        if self._is_current(path):
+            return path
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(csv_path, "results.csv")
+            for row, result in sorted(self._latest_results().items()):
+                if result["status"] == "ok":
+                    safe_name = "".join(c if c.isalnum() else "_" for c in result["target"])[:40]
+                    archive.writestr(f"emails/{row:05d}_{safe_name}.txt", result["email"])
+        return path
+
+
+    def queue_delivery(self, user: str = "", reply_to: str = "") -> tuple:
+        """Queues every generated email that has a deliverable recipient in the outbox.
+
+        Returns `(queued, skipped)`: the results queued, and the number of generated emails skipped for
+        lack of a valid address (missing, malformed or a placeholder, see `outbox.recipient`). Message ids
+        are derived from the job and the row, so queuing a job again doesn't send anything twice."""
+        sender_name = self.sender.get("name") if self.sender_type == "freelancer" else self.sender.get("company")
+        queued, skipped = [], 0
+        for row, result in sorted(self._latest_results().items()):
+            if result["status"] != "ok":
+                continue
+            to_addr = outbox.recipient(result.get("to"))
+            if not to_addr:
+                skipped += 1
+                continue
+            subject, body = outbox.split_subject(result["email"], f"{sender_name} · {result['target']}")
+            outbox.get_outbox().enqueue(to_addr, subject, body, user=user, reply_to=reply_to,
+                                        message_id=f"bulk-{self.job_id}-{row}")
+            queued.append(result)
+        return queued, skipped
+
+
+def count_rows(file_bytes: bytes) -> int:
+    """Number of data rows in the CSV (one streaming pass, for the progress bar)."""
+    return max(0, sum(1 for _ in csv.reader(open_csv_text(file_bytes))) - 1)
+
+
+def open_csv_text(file_bytes: bytes):
+    """Text stream over uploaded CSV bytes (handles a UTF-8 BOM)."""
+    return io.TextIOWrapper(io.BytesIO(file_bytes), encoding="utf-8-sig", newline="")
@@ -0,0 +1,141 @@
+"""bulk_outreach_page.py
+
+"📦 Bulk outreach" page for LeadCraftr: upload a CSV of targets and get one
+tailored email per row, downloadable as CSV or ZIP, or sent through the
+outbox when SMTP delivery is set up (outbox.py).
+
+Freelancers upload companies (columns like `company`, `sector`, `city`,
+`main_contact`, `mission_statement`, `email`); companies upload freelancers
+(`name`, `title`, `main_sector`, `top3_skills`, `daily_rate`, `city`, ...).
+Missing columns get the same defaults as the rest of the app.
+
+The pipeline itself (chunked reading, bounded concurrency, retries, resume)
+lives in bulk_outreach.py. A run is a background job (job_queue.py): clicks
+and reruns don't interrupt it, and a fragment polls its progress. Call
+`display_bulk_outreach(current_user_key(), record_activity)` from app_V4.py.
+"""
+
+import streamlit as st
+
+import bulk_outreach
+import job_queue
+import outbox
+from sanitization import sanitize_freelancer_data, sanitize_prospect_data
+
+TONES = ["Warm", "Professional", "Creative", "Direct", "Empathetic"]
+STYLES = ["Storytelling", "Direct", "Formal", "Informal", "Benefit-driven", "Technical"]
+
+
+def _sender_data(user_type: str, tone: str, style: str) -> dict:
+    """The sender side of every generation, built from the saved profile."""
+    profile = st.session_state.get("user_profile_data", {})
+    if user_type == "freelancer":
+        return sanitize_freelancer_data({
+            **profile,
+            "name": profile.get("first_name"),
+            "title": profile.get("desired_job_title"),
+            "top3_skills": profile.get("skills"),
+            "remote": profile.get("work_mode", "Remote") == "Remote",
+            "mission_statement": profile.get("personal_statement"),
+            "preferred_tone": tone,
+            "preferred_style": style,
+        })
+    return sanitize_prospect_data({
+        **profile,
+        "company": profile.get("company_name"),
+        "city": profile.get("location"),
+        "sector": profile.get("main_sector"),
+        "remote": profile.get("work_mode", "Remote") == "Remote",
+        "preferred_tone": tone,
+    })
+
+
+def _job_key(job_id: str) -> tuple:
+    return ("bulk", job_id)
+
+
+def _show_progress(job_id: str, total: int):
+    """Progress of the running job, polled by a fragment; the whole page reruns once the job has finished."""
+
+    @st.fragment(run_every=job_queue.POLL_INTERVAL_S)
+    def _poll():
+        counts = st.session_state.bulk_progress
+        finished = counts["ok"] + counts["failed"]
+        st.progress(min(1.0, finished / total) if total else 1.0)
+        st.text(f"Generating emails... {finished}/{total} ({counts['failed']} failed)")
+        running = job_queue.get(_job_key(job_id))
+        if running is None or running.done():
+            job_queue.pop(_job_key(job_id))
+            st.session_state.bulk_running = None
+            if running is not None and running.status == "done":
+                st.session_state.bulk_last_job = job_id
+                st.session_state.bulk_summary = dict(running.result)
+            else:
+                st.session_state.bulk_summary = {"error": str(running.error) if running is not None else "The job was lost"}
+            st.rerun(scope="app")
+
+    _poll()
+
+
+def display_bulk_outreach(user_key: str, record_activity):
+    """Render the bulk outreach page.
+
+    Sends are filed under `user_key` and counted in the user's history with `record_activity(kind, **fields)`
+    (app_V4.current_user_key and app_V4.record_activity)."""
+    user_type = st.session_state.get("user_type", "freelancer")
+    targets = "companies" if user_type == "freelancer" else "freelancers"
+
+    st.markdown("## 📦 Bulk outreach")
+    st.markdown(f"Upload a CSV of {targets} and LeadCraftr drafts a tailored email for each of them.")
+    if not st.session_state.get("profile_created"):
+        st.info("💡 Emails are signed with your profile. Create it first for the best results.")
+
+    uploaded = st.file_uploader(f"CSV of {targets} (one per row, with a header line)", type=["csv"])
+    col1, col2, col3 = st.columns(3)
+    tone = col1.selectbox("🎙️ Tone", TONES, index=1, key="bulk_tone")
+    style = col2.selectbox("✍️ Style", STYLES, key="bulk_style")
+    concurrency = col3.slider("Parallel generations", 1, 8, value=4, key="bulk_concurrency")
+    if uploaded is None:
+        return
+
+    file_bytes = uploaded.getvalue()
+    total = bulk_outreach.count_rows(file_bytes)
+    sender = _sender_data(user_type, tone, style)
+    job = bulk_outreach.BulkJob(bulk_outreach.job_id_for(file_bytes, user_type, tone, style, sender), sender, user_type)
+    if job.done:
+        st.caption(f"♻️ {len(job.done)}/{total} emails already generated for this file: starting again resumes the job.")
+
+    if st.session_state.get("bulk_running") == job.job_id:
+        _show_progress(job.job_id, total)
+        return
+    if st.button(f"🚀 Generate {total} emails", key="bulk_start"):
+        # The worker updates this dict in place; the progress fragment reads it
+        st.session_state.bulk_progress = {"ok": len(job.done), "failed": 0, "skipped": len(job.done)}
+        job_queue.submit(_job_key(job.job_id), job.job_id, job.run, bulk_outreach.open_csv_text(file_bytes), concurrency,
+                         on_progress=st.session_state.bulk_progress.update, priority=job_queue.PRIORITY_BACKGROUND)
+        st.session_state.bulk_running = job.job_id
+        st.session_state.bulk_summary = None
+        st.rerun()
+
+    summary = st.session_state.get("bulk_summary")
+    if summary and "error" in summary:
+        st.error(f"⚠️ The bulk run stopped: {summary['error']}. Start again to resume it.")
+    elif summary and st.session_state.get("bulk_last_job") == job.job_id:
+        st.success(f"{summary['ok']} emails ready ✔︎" + (f" · {summary['failed']} failed, start again to retry them" if summary["failed"] else ""))
+
+    if st.session_state.get("bulk_last_job") == job.job_id:
+        col_csv, col_zip = st.columns(2)
+        with open(job.export_csv(), "rb") as f:
+            col_csv.download_button("⬇️ Download CSV", f, file_name="leadcraftr_outreach.csv", mime="text/csv")
+        with open(job.export_zip(), "rb") as f:
+            col_zip.download_button("⬇️ Download ZIP", f, file_name="leadcraftr_outreach.zip", mime="application/zip")
+        if outbox.ENABLED and st.button("📤 Send all", key="bulk_send"):
+            profile = st.session_state.get("user_profile_data", {})
+            queued, skipped = job.queue_delivery(user=user_key, reply_to=profile.get("email") or profile.get("contact_email") or "")
+            recorded = st.session_state.setdefault("bulk_recorded", set())
+            if job.job_id not in recorded:  # Queuing the job again sends nothing twice: don't count it twice either
+                recorded.add(job.job_id)
+                for result in queued:
+                    record_activity("send", target=result["target"])
+            st.success(f"{len(queued)} emails queued for delivery 📬"
+                       + (f" · {skipped} skipped: no valid address in their `email` column" if skipped else ""))
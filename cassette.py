@@ -0,0 +1,140 @@
+"""cassette.py
+
+Record and replay of API traffic, for reproducible benchmarks and load tests.
+
+With ``api_cassette_mode = "record"``, every response api_client.py gets from
+the back-end is appended to the cassette file (``api_cassette``, by default
+``<data_dir>/cassettes/api.jsonl``) with the time it took. With
+``api_cassette_mode = "replay"`` nothing goes on the network: responses are
+served from the cassette after their recorded latency, multiplied by
+``api_replay_speed`` (0 replays instantly, 2 twice as slow).
+
+The file is JSON lines, one compact record per response. When it is opened,
+only an index is built: request hash -> byte offsets of its records, so a
+lookup is one dict access plus one seek however large the cassette grows.
+Requests recorded several times (regenerations of the same card) are replayed
+in turn. A request that was never recorded fails like an unreachable back-end
+(`CassetteMiss`), so a replay never passes off another request's answer as
+its own. With ``api_cassette_lenient`` on, it is answered with a recording of
+the same endpoint instead (for load tests, where only the shape and latency of
+the traffic matter).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from settings import data_dir, get_bool, get_float, get_setting
+
+
+class CassetteMiss(requests.ConnectionError):
+    """No recording to replay for a request (handled like a back-end that can't be reached)."""
+
+
+def request_hash(method: str, endpoint: str, params: dict = None, data: bytes = None, headers: dict = None) -> str:
+    """Digest of what identifies a request: method, endpoint, query and (decoded) JSON body."""
+    body = None
+    if data:
+        if (headers or {}).get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        body = json.loads(data)  # Same payload, same hash, whichever JSON encoder produced the bytes
+    canonical = json.dumps([method, endpoint, params or {}, body], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """An append-only file of recorded responses, indexed by request hash."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_request = {}  # request hash -> byte offsets of its records
+        self._by_endpoint = {}  # endpoint -> byte offsets of its records
+        self._turns = {}  # request hash or endpoint -> how many times it was replayed
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line of a recording that was interrupted
+                    self._index(record, offset)
+                    offset += len(line)
+
+    def __len__(self):
+        return sum(map(len, self._by_request.values()))
+
+    def _index(self, record: dict, offset: int):
+        self._by_request.setdefault(record["key"], []).append(offset)
+        self._by_endpoint.setdefault(record["endpoint"], []).append(offset)
+
+    def record(self, key: str, endpoint: str, response: requests.Response, elapsed_s: float):
+        record = {
+            "key": key,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type", ""),
+            "elapsed_s": round(elapsed_s, 4),
+            "body": response.content.decode("utf-8", errors="replace"),
+        }
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock, open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            self._index(record, offset)
+
+    def lookup(self, key: str, endpoint: str, lenient: bool = False):
+        """The next record for this request (or, if `lenient`, for its endpoint), or None."""
+        with self._lock:
+            for name, offsets in [(key, self._by_request.get(key))] + ([(endpoint, self._by_endpoint.get(endpoint))] if lenient else []):
+                if offsets:
+                    turn = self._turns.get(name, 0)
+                    self._turns[name] = turn + 1
+                    offset = offsets[turn % len(offsets)]
+                    break
+            else:
+                return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def replay(self, key: str, endpoint: str, timeout: float, speed: float, lenient: bool = False) -> requests.Response:
+        """A response rebuilt from the cassette, after its recorded latency (scaled by `speed`)."""
+        record = self.lookup(key, endpoint, lenient)
+        if record is None:
+            raise CassetteMiss(f"No recording for {endpoint} in {self.path}")
+        latency = record["elapsed_s"] * speed
+        time.sleep(min(latency, timeout))
+        if latency > timeout:
+            raise requests.Timeout(f"Recorded latency of {endpoint} ({latency:.1f} s) exceeds the timeout")
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.headers = CaseInsensitiveDict({"Content-Type": record["content_type"]})
+        response._content = record["body"].encode("utf-8")
+        response.url = endpoint
+        return response
+
+
+MODE = get_setting("api_cassette_mode", "")  # "", "record" or "replay"
+REPLAY_SPEED = get_float("api_replay_speed", 1.0)
+LENIENT = get_bool("api_cassette_lenient", False)
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette:
+    """The cassette of this process, opened on first use."""
+    global _cassette
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(get_setting("api_cassette") or os.path.join(data_dir("cassettes"), "api.jsonl"))
+    return _cassette
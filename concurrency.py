@@ -0,0 +1,97 @@
+"""concurrency.py
+
+Adaptive client-side concurrency limit for the generation back-end.
+
+Generations now run in parallel (job queue, prefetch, bulk outreach), so one
+busy front-end could open more LLM calls than the back-end can serve, and every
+extra call only makes all of them slower. `AdaptiveLimiter` sets the number of
+calls in flight across all sessions of the process (the slots themselves are
+handed out by scheduler.py) and finds that limit by itself:
+
+    - additive increase: while latency stays close to its baseline and the limit
+      is actually used, the limit grows by about one call per round trip;
+    - multiplicative decrease: on a 429, a 5xx or a timeout (`DROPPED`) the limit
+      is cut by `BACKOFF`, and when the recent latency drifts above `TOLERANCE`
+      times the long-term baseline it is cut by `LATENCY_BACKOFF` (at most once
+      per round trip, so one burst of errors is one signal).
+
+The baseline is the no-load round-trip time: it drops to any faster call at
+once and only drifts up slowly (over `BASELINE_DRIFT_S`), so queuing on the
+back-end shows up as the gap between it and the recent latency, an exponential
+moving average of the last `RECENT_SAMPLES` successful calls. The limit is reported to metrics.py
+as the ``generate_concurrency_limit`` gauge.
+"""
+
+import math
+import threading
+import time
+
+import metrics
+from settings import get_int
+
+OK = "ok"
+DROPPED = "dropped"  # The back-end is overloaded: 429, 5xx or timeout
+IGNORED = "ignored"  # Says nothing about load (connection refused, 4xx)
+
+BACKOFF = 0.75
+LATENCY_BACKOFF = 0.9
+TOLERANCE = 1.5  # Recent latency above this multiple of the baseline means queuing on the back-end
+BASELINE_DRIFT_S = 300  # Lets the baseline follow a back-end that got slower for good
+RECENT_SAMPLES = 10
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit steered by errors and latency."""
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.baseline_rtt = None
+        self.recent_rtt = None
+        self._last_decrease = 0.0
+        self._baseline_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._report()
+
+    def capacity(self) -> int:
+        return int(self.limit)
+
+    def record(self, rtt_s: float, outcome: str, in_flight: int):
+        """Adjust the limit from how a call went; `in_flight` counts the calls running alongside it, itself included."""
+        with self._lock:
+            was_saturated = in_flight >= int(self.limit) / 2  # Don't grow a limit nobody uses
+            if outcome == DROPPED:
+                self._decrease(BACKOFF)
+            elif outcome == OK:
+                now = time.monotonic()
+                drift = min(1.0, (now - self._baseline_at) / BASELINE_DRIFT_S)
+                self._baseline_at = now
+                self.baseline_rtt = rtt_s if self.baseline_rtt is None else \
+                    min(rtt_s, self.baseline_rtt + (rtt_s - self.baseline_rtt) * drift)
+                self.recent_rtt = rtt_s if self.recent_rtt is None else \
+                    self.recent_rtt + (rtt_s - self.recent_rtt) / RECENT_SAMPLES
+                if self.recent_rtt > TOLERANCE * self.baseline_rtt:
+                    self._decrease(LATENCY_BACKOFF)
+                elif was_saturated:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._report()
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.recent_rtt or 0.0):
+            return  # Already backed off for this round trip
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+
+    def _report(self):
+        metrics.set_gauge(f"{self.name}_concurrency_limit", math.floor(self.limit))
+
+
+generate_limiter = AdaptiveLimiter(
+    "generate",
+    initial=get_int("generate_concurrency_initial", 4),
+    min_limit=1,
+    max_limit=get_int("generate_concurrency_max", 64),
+)
@@ -19,6 +19,88 @@ The function will completely replace the old, simplified TJM page.
 
 import streamlit as st
 
+import rate_sketch
+
+# Multipliers of the daily-rate model, also used to estimate the rate of matched freelancers (budget_fit.py)
+BASE_RATE = 300
+
+EXPERIENCE_MULTIPLIERS = {
+    0: 0.6, 1: 0.7, 2: 0.8, 3: 0.9, 4: 1.0,
+    5: 1.1, 6: 1.2, 7: 1.3, 8: 1.4, 9: 1.5,
+    10: 1.6, 11: 1.7, 12: 1.8, 13: 1.9, 14: 2.0,
+    15: 2.1, 16: 2.2, 17: 2.3, 18: 2.4, 19: 2.5, 20: 2.6
+}
+
+SKILL_ADJUSTMENTS = {
+    "Junior": 0.8,
+    "Mid-level": 1.0,
+    "Senior": 1.3,
+    "Expert/Lead": 1.6
+}
+
+SPECIALIZATION_ADJUSTMENTS = {
+    "General Development": 1.0,
+    "Frontend Development": 1.1,
+    "Backend Development": 1.2,
+    "Full-stack Development": 1.3,
+    "Data Science/ML": 1.5,
+    "DevOps/Cloud": 1.4,
+    "Mobile Development": 1.2,
+    "UI/UX Design": 1.1,
+    "Project Management": 1.2,
+    "Consulting": 1.4
+}
+
+LOCATION_ADJUSTMENTS = {
+    "France (Paris)": 1.2,
+    "France (Other cities)": 1.0,
+    "Germany": 1.3,
+    "UK": 1.4,
+    "Netherlands": 1.3,
+    "Switzerland": 1.8,
+    "USA": 1.6,
+    "Global/Remote": 1.1
+}
+
+INDUSTRY_ADJUSTMENTS = {
+    "Tech/SaaS": 1.2,
+    "Finance/Banking": 1.4,
+    "Healthcare": 1.1,
+    "E-commerce": 1.1,
+    "Media/Entertainment": 0.9,
+    "Consulting": 1.3,
+    "Government": 0.8,
+    "General": 1.0
+}
+
+DEMAND_ADJUSTMENTS = {
+    "Low": 0.8,
+    "Medium": 1.0,
+    "High": 1.2,
+    "Very High": 1.4
+}
+
+BUSINESS_ADJUSTMENTS = {
+    "Low": 0.9,
+    "Medium": 1.0,
+    "High": 1.2,
+    "Critical": 1.4
+}
+
+CLIENT_ADJUSTMENTS = {
+    "Startup": 0.8,
+    "Small Business": 0.9,
+    "Mid-size Company": 1.0,
+    "Large Enterprise": 1.3
+}
+
+PORTFOLIO_ADJUSTMENTS = {
+    "Basic": 0.9,
+    "Good": 1.0,
+    "Strong": 1.1,
+    "Exceptional": 1.3
+}
+
 
 def _calculate_rate(years_experience,
                     skill_level, specialization, location_type,
@@ -26,90 +108,11 @@ def _calculate_rate(years_experience,
                     education, demand_level, business_impact,
                     urgency_premium, client_size, portfolio_strength):
     """Pure helper – returns an integer daily‑rate rounded to €25."""
-    base_rate = 300
-
-    experience_multipliers = {
-        0: 0.6, 1: 0.7, 2: 0.8, 3: 0.9, 4: 1.0,
-        5: 1.1, 6: 1.2, 7: 1.3, 8: 1.4, 9: 1.5,
-        10: 1.6, 11: 1.7, 12: 1.8, 13: 1.9, 14: 2.0,
-        15: 2.1, 16: 2.2, 17: 2.3, 18: 2.4, 19: 2.5, 20: 2.6
-    }
-
-    skill_adjustments = {
-        "Junior": 0.8,
-        "Mid-level": 1.0,
-        "Senior": 1.3,
-        "Expert/Lead": 1.6
-    }
-
-    specialization_adjustments = {
-        "General Development": 1.0,
-        "Frontend Development": 1.1,
-        "Backend Development": 1.2,
-        "Full-stack Development": 1.3,
-        "Data Science/ML": 1.5,
-        "DevOps/Cloud": 1.4,
-        "Mobile Development": 1.2,
-        "UI/UX Design": 1.1,
-        "Project Management": 1.2,
-        "Consulting": 1.4
-    }
-
-    location_adjustments = {
-        "France (Paris)": 1.2,
-        "France (Other cities)": 1.0,
-        "Germany": 1.3,
-        "UK": 1.4,
-        "Netherlands": 1.3,
-        "Switzerland": 1.8,
-        "USA": 1.6,
-        "Global/Remote": 1.1
-    }
-
-    industry_adjustments = {
-        "Tech/SaaS": 1.2,
-        "Finance/Banking": 1.4,
-        "Healthcare": 1.1,
-        "E-commerce": 1.1,
-        "Media/Entertainment": 0.9,
-        "Consulting": 1.3,
-        "Government": 0.8,
-        "General": 1.0
-    }
-
-    demand_adjustments = {
-        "Low": 0.8,
-        "Medium": 1.0,
-        "High": 1.2,
-        "Very High": 1.4
-    }
-
-    business_adjustments = {
-        "Low": 0.9,
-        "Medium": 1.0,
-        "High": 1.2,
-        "Critical": 1.4
-    }
-
-    client_adjustments = {
-        "Startup": 0.8,
-        "Small Business": 0.9,
-        "Mid-size Company": 1.0,
-        "Large Enterprise": 1.3
-    }
-
-    portfolio_adjustments = {
-        "Basic": 0.9,
-        "Good": 1.0,
-        "Strong": 1.1,
-        "Exceptional": 1.3
-    }
-
-    rate = base_rate * experience_multipliers.get(years_experience, 2.6)
-    rate *= skill_adjustments[skill_level]
-    rate *= specialization_adjustments[specialization]
-    rate *= location_adjustments[market_location]
-    rate *= industry_adjustments[industry]
+    rate = BASE_RATE * EXPERIENCE_MULTIPLIERS.get(years_experience, 2.6)
+    rate *= SKILL_ADJUSTMENTS[skill_level]
+    rate *= SPECIALIZATION_ADJUSTMENTS[specialization]
+    rate *= LOCATION_ADJUSTMENTS[market_location]
+    rate *= INDUSTRY_ADJUSTMENTS[industry]
 
     if certifications:
         rate *= 1.1
@@ -117,14 +120,14 @@ def _calculate_rate(years_experience,
     if education in ["Master's Degree", "PhD"]:
         rate *= 1.1
 
-    rate *= demand_adjustments[demand_level]
-    rate *= business_adjustments[business_impact]
+    rate *= DEMAND_ADJUSTMENTS[demand_level]
+    rate *= BUSINESS_ADJUSTMENTS[business_impact]
 
     if urgency_premium:
         rate *= 1.2
 
-    rate *= client_adjustments[client_size]
-    rate *= portfolio_adjustments[portfolio_strength]
+    rate *= CLIENT_ADJUSTMENTS[client_size]
+    rate *= PORTFOLIO_ADJUSTMENTS[portfolio_strength]
 
     return int(round(rate / 25.0) * 25)
 
@@ -209,6 +212,17 @@ def display_tjm_calculator():
         st.metric("Yearly (12 m)", f"€{tjm * 14 * 12:,}")
         st.caption("*Figures assume 14 billable days/month in average & 12 working months/year.*")
 
+        # Where the rate stands among the rates of matched freelancers (see rate_sketch.py). Freelancer
+        # profiles have no city, so the sector and skills scopes are the most specific ones here
+        profile = st.session_state.get("user_profile_data", {})
+        position = rate_sketch.get_sketches().position(tjm, sector=profile.get("main_sector"), skills=profile.get("skills") or ())
+        if position is not None:
+            scope = "all observed rates" if position.scope == rate_sketch.ALL else \
+                f"observed rates for the {position.scope} “{position.name}”"
+            suffix = "th" if 10 <= position.percentile % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(position.percentile % 10, "th")
+            st.info(f"📍 Your rate is at the **{position.percentile}{suffix} percentile** of {scope} "
+                    f"(median €{position.median:.0f}, {position.observations:,} freelancers).")
+
          # Rate range recommendation
         st.markdown("### 💡 Rate Range Recommendation")
 
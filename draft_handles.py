@@ -0,0 +1,87 @@
+"""draft_handles.py
+
+Client side of stateful regeneration: server-issued draft handles.
+
+A back-end that keeps the context of a generation can return a handle with
+the draft: ``{"email": "...", "draft_handle": "<opaque>", "draft_handle_ttl_s": 900}``.
+A later regeneration of that draft then doesn't need to resend everything: it
+posts only the handle and the fields that changed since (tone, style, ...):
+
+    {"draft_handle": "<opaque>", "sender_type": "freelancer",
+     "changes": {"freelance": {"preferred_tone": "Warm"}, "prospect": {}}}
+
+Handles are looked up by the session, the card and the draft they produced
+(the ``previous_mail_content`` of the regeneration): two cards, or two
+sessions, that happen to show the same text never share a handle, and so
+never regenerate from each other's server-side context. A handle past its TTL
+is never sent; if the server has expired it anyway (404 or
+410) the client forgets it and sends the full payload (see
+`api_client.generate_mail`). Back-ends that don't issue handles never get a
+compact request.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+import telemetry
+from settings import get_float
+
+DEFAULT_TTL_S = get_float("draft_handle_ttl_s", 900)
+MAX_HANDLES = 5000
+MAX_CHANGED_FIELDS = 8  # Beyond this, the compact request isn't worth it
+EXPIRED_STATUS = [404, 410]
+CACHE_NAME = "draft_handle"
+
+_handles = OrderedDict()  # (session, card, draft digest) -> (handle, sender type, freelance, prospect, expires at)
+_lock = threading.Lock()
+
+
+def _key(card: str, draft: str) -> tuple:
+    # From the telemetry context: generations run on job workers, in a copy of the session's context
+    session_id = telemetry.get_context().get("session_id", "")
+    return session_id, card, hashlib.sha1(draft.encode("utf-8")).hexdigest()
+
+
+def _changes(before: dict, after: dict) -> dict:
+    changed = {k: v for k, v in after.items() if before.get(k) != v}
+    changed.update({k: None for k in before if k not in after})
+    return changed
+
+
+def remember(card: str, draft: str, handle: str, sender_type: str, freelance: dict, prospect: dict, ttl_s: float = None):
+    """Keep the handle the server issued with `draft` for `card` of this session, and what it was generated from."""
+    if not handle or not draft:
+        return
+    key = _key(card, draft)
+    with _lock:
+        _handles[key] = (handle, sender_type, dict(freelance), dict(prospect),
+                         time.monotonic() + float(ttl_s or DEFAULT_TTL_S))
+        _handles.move_to_end(key)
+        while len(_handles) > MAX_HANDLES:
+            _handles.popitem(last=False)
+
+
+def forget(card: str, draft: str):
+    with _lock:
+        _handles.pop(_key(card, draft), None)
+
+
+def compact_payload(card: str, sender_type: str, freelance: dict, prospect: dict, previous_mail_content: str):
+    """The handle-based request for regenerating `previous_mail_content` of `card`, or None to send the full payload."""
+    if not previous_mail_content or not _handles:
+        return None  # Nothing to regenerate from, or a back-end that doesn't issue handles
+    with _lock:
+        entry = _handles.get(_key(card, previous_mail_content))
+    if entry is None or entry[1] != sender_type or entry[4] < time.monotonic():
+        metrics.cache_miss(CACHE_NAME)
+        return None
+    handle, _, old_freelance, old_prospect, _ = entry
+    changes = {"freelance": _changes(old_freelance, freelance), "prospect": _changes(old_prospect, prospect)}
+    if sum(map(len, changes.values())) > MAX_CHANGED_FIELDS:
+        metrics.cache_miss(CACHE_NAME)
+        return None
+    metrics.cache_hit(CACHE_NAME)
+    return {"draft_handle": handle, "sender_type": sender_type, "changes": changes}
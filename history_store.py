@@ -0,0 +1,199 @@
+"""history_store.py
+
+Persistent outreach history (SQLite in WAL mode) for the Dashboard charts.
+
+Searches, generations and sends are queued with `HistoryStore.enqueue`, which
+never touches the disk: a background thread writes them in batches, one
+transaction per batch. Next to the raw `events` table (indexed by user, day and
+sector) the writer keeps a `daily_totals` table up to date, so a year of
+history is ~365 rows and the Dashboard time series is a single indexed read.
+`downsample` then buckets long series into weeks or months before charting.
+
+The database lives in ``<data_dir>/history.sqlite3``.
+"""
+
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from settings import data_dir
+
+FLUSH_INTERVAL_S = 0.5
+MAX_BATCH = 500
+# What one sent email is worth (see the Dashboard note on time and money saved)
+MINUTES_SAVED_PER_SEND = 5
+MONEY_SAVED_PER_SEND = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    user TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    sector TEXT,
+    tone TEXT,
+    target TEXT,
+    minutes_saved REAL NOT NULL DEFAULT 0,
+    money_saved REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_user_day ON events (user, day);
+CREATE INDEX IF NOT EXISTS events_user_sector ON events (user, sector);
+CREATE INDEX IF NOT EXISTS events_day ON events (day);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    searches INTEGER NOT NULL DEFAULT 0,
+    generations INTEGER NOT NULL DEFAULT 0,
+    sends INTEGER NOT NULL DEFAULT 0,
+    minutes_saved REAL NOT NULL DEFAULT 0,
+    money_saved REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, day)
+);
+"""
+
+_UPSERT_DAILY = """
+INSERT INTO daily_totals (user, day, searches, generations, sends, minutes_saved, money_saved)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user, day) DO UPDATE SET
+    searches = searches + excluded.searches,
+    generations = generations + excluded.generations,
+    sends = sends + excluded.sends,
+    minutes_saved = minutes_saved + excluded.minutes_saved,
+    money_saved = money_saved + excluded.money_saved
+"""
+
+_MOVE_DAILY = """
+INSERT INTO daily_totals (user, day, searches, generations, sends, minutes_saved, money_saved)
+SELECT ?, day, searches, generations, sends, minutes_saved, money_saved FROM daily_totals WHERE user = ?
+ON CONFLICT (user, day) DO UPDATE SET
+    searches = searches + excluded.searches,
+    generations = generations + excluded.generations,
+    sends = sends + excluded.sends,
+    minutes_saved = minutes_saved + excluded.minutes_saved,
+    money_saved = money_saved + excluded.money_saved
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class HistoryStore:
+    """Batched writer and indexed reader over the history database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        with closing(_connect(path)) as connection:
+            connection.executescript(_SCHEMA)
+        threading.Thread(target=self._write_loop, name="history-writer", daemon=True).start()
+
+    def enqueue(self, user: str, event: dict):
+        """Queue an activity event (see activity.py) for the next batch. Never blocks."""
+        kind = event["kind"]
+        if kind not in ["search", "generation", "regeneration", "send"]:
+            return
+        sent = kind == "send"
+        self._queue.put((
+            event["ts"], datetime.date.fromtimestamp(event["ts"]).isoformat(), user, kind,
+            event.get("sector"), event.get("tone"), event.get("target"),
+            MINUTES_SAVED_PER_SEND if sent else 0, MONEY_SAVED_PER_SEND if sent else 0,
+        ))
+
+    def rekey(self, old: str, new: str):
+        """Move the history of user `old` (e.g. a session key) to `new`, events already queued for `old` included."""
+        self._queue.put((old, new))
+
+    def _write_loop(self):
+        connection = _connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(FLUSH_INTERVAL_S)
+            while len(batch) < MAX_BATCH and not self._queue.empty():
+                batch.append(self._queue.get())
+            try:
+                with connection:
+                    start = 0
+                    for i, item in enumerate(batch):
+                        if len(item) == 2:  # A rekey: the events queued before it are written first
+                            _insert(connection, batch[start:i])
+                            _move(connection, *item)
+                            start = i + 1
+                    _insert(connection, batch[start:])
+            except sqlite3.Error:
+                pass  # History is best effort: never take the app down for it
+
+    def _read(self, query: str, parameters: tuple) -> list:
+        # Script runs come and go on fresh threads: each read opens a connection and closes it
+        with closing(_connect(self.path)) as connection:
+            return connection.execute(query, parameters).fetchall()
+
+    def daily_series(self, user: str) -> list:
+        """`(day, minutes saved, money saved)` per active day, oldest first."""
+        return self._read("SELECT day, minutes_saved, money_saved FROM daily_totals WHERE user = ? ORDER BY day", (user,))
+
+    def totals(self, user: str) -> tuple:
+        """All-time `(sends, minutes saved, money saved)` of `user`."""
+        row, = self._read(
+            "SELECT SUM(sends), SUM(minutes_saved), SUM(money_saved) FROM daily_totals WHERE user = ?", (user,))
+        return tuple(value or 0 for value in row)
+
+
+def _insert(connection: sqlite3.Connection, events: list):
+    daily = {}
+    for ts, day, user, kind, sector, tone, target, minutes, money in events:
+        totals = daily.setdefault((user, day), [0, 0, 0, 0.0, 0.0])
+        totals[0] += kind == "search"
+        totals[1] += kind in ["generation", "regeneration"]
+        totals[2] += kind == "send"
+        totals[3] += minutes
+        totals[4] += money
+    connection.executemany(
+        "INSERT INTO events (ts, day, user, kind, sector, tone, target, minutes_saved, money_saved)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+    connection.executemany(_UPSERT_DAILY, [(u, d, *t) for (u, d), t in daily.items()])
+
+
+def _move(connection: sqlite3.Connection, old: str, new: str):
+    connection.execute("UPDATE events SET user = ? WHERE user = ?", (new, old))
+    connection.execute(_MOVE_DAILY, (new, old))
+    connection.execute("DELETE FROM daily_totals WHERE user = ?", (old,))
+
+
+def downsample(series: list, max_points: int = 120) -> list:
+    """Merge daily `(day, *values)` rows into weekly, then monthly buckets until they fit in `max_points`."""
+    for bucket_of in [lambda day: day, _week_of, lambda day: day[:7] + "-01"]:
+        buckets = {}
+        for day, *values in series:
+            key = bucket_of(day)
+            buckets[key] = [a + b for a, b in zip(buckets[key], values)] if key in buckets else list(values)
+        if len(buckets) <= max_points:
+            break
+    return [(key, *values) for key, values in buckets.items()]
+
+
+def _week_of(day: str) -> str:
+    date = datetime.date.fromisoformat(day)
+    return (date - datetime.timedelta(days=date.weekday())).isoformat()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> HistoryStore:
+    """The history store of this process, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore(os.path.join(data_dir(), "history.sqlite3"))
+    return _store
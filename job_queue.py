@@ -0,0 +1,213 @@
+"""job_queue.py
+
+Process-wide background job queue for email generations.
+
+Generations used to run inline in the Streamlit script thread: the page stayed
+"running" until the API answered, and any click restarted the script in the
+middle of the call. Now a card submits a job and renders right away; worker
+threads run the jobs and keep the results in a shared store until the card
+collects them on a later rerun.
+
+Jobs are keyed per session and card, e.g. ``(session id, "initial", card id)``.
+Submitting a key that is already queued, running or finished with the same
+fingerprint (a digest of the request) returns the existing job, so reruns never
+duplicate or cancel in-flight work. Submitting it with a different fingerprint
+replaces it (the old result, if it ever arrives, is dropped).
+
+Pages waiting for jobs call `rerun_when_done(keys)`: a small fragment polls the
+store and triggers a rerun as soon as one of them has finished, so a draft shows
+up when it is ready rather than with the slowest of the batch.
+
+The first drafts of a list of cards are queued by `draft_priority`: cards the
+user has opened come first, then the top ``eager_drafts`` cards (3 by default),
+then the rest of the list at background priority (or not until the card is
+opened, with ``background_drafts = false``). Opening a card re-submits its job
+at interactive priority, which moves it up the queue.
+"""
+
+import contextvars
+import itertools
+import queue
+import threading
+import time
+
+import streamlit as st
+
+import scheduler
+import telemetry
+from settings import get_bool, get_int
+
+PRIORITY_INTERACTIVE = 0  # Somebody is looking at a spinner for it
+PRIORITY_PREFETCH = 1  # Speculative work, e.g. the next regeneration variant
+PRIORITY_BACKGROUND = 2  # Work nobody is looking at yet, e.g. drafts of closed cards down the list
+TRAFFIC_CLASS = {PRIORITY_INTERACTIVE: scheduler.INTERACTIVE, PRIORITY_PREFETCH: scheduler.PREFETCH,
+                 PRIORITY_BACKGROUND: scheduler.PREFETCH}  # For API calls
+EAGER_DRAFTS = get_int("eager_drafts", 3)
+BACKGROUND_DRAFTS = get_bool("background_drafts", True)
+RESULT_TTL_S = 600  # Finished jobs nobody collected (closed tabs) are forgotten after this
+POLL_INTERVAL_S = 1.0
+
+
+class Job:
+    """One unit of background work and, once finished, its outcome."""
+
+    def __init__(self, key: tuple, fingerprint: str, priority: int, fn, args: tuple, kwargs: dict):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.priority = priority
+        self.status = "queued"  # queued -> running -> done | failed, or cancelled
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self._call = (contextvars.copy_context(), fn, args, kwargs)  # Spans keep their session/page tags
+        self._finished = threading.Event()
+
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def _run(self):
+        context, fn, args, kwargs = self._call
+        try:
+            self.result = context.run(_call_as, TRAFFIC_CLASS[self.priority], fn, args, kwargs)
+            self.status = "done"
+        except Exception as e:
+            self.error = e
+            self.status = "failed"
+        self._finish()
+
+    def _finish(self):
+        self._call = None
+        self.finished_at = time.monotonic()
+        self._finished.set()
+
+
+def _call_as(traffic_class: str, fn, args: tuple, kwargs: dict):
+    with scheduler.traffic_class(traffic_class):
+        return fn(*args, **kwargs)
+
+
+class JobQueue:
+    """A priority queue served by daemon worker threads, plus the result store."""
+
+    def __init__(self, workers: int):
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()  # FIFO among jobs of the same priority
+        self._jobs = {}  # key -> Job
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, key: tuple, fingerprint: str, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Job:
+        """Queue `fn(*args, **kwargs)` under `key`, or return the job already there for the same request."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.fingerprint == fingerprint and job.status != "cancelled":
+                if job.status == "queued" and priority < job.priority:
+                    job.priority = priority  # Somebody is now waiting for it: jump the queue
+                    self._queue.put((priority, next(self._order), job))
+                return job
+            if job is not None:
+                self._cancel(job)
+            self._prune()
+            job = self._jobs[key] = Job(key, fingerprint, priority, fn, args, kwargs)
+            self._queue.put((priority, next(self._order), job))
+            return job
+
+    def get(self, key: tuple):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def pop(self, key: tuple):
+        """Collect (remove) a job from the store."""
+        with self._lock:
+            return self._jobs.pop(key, None)
+
+    def cancel(self, key: tuple):
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if job is not None:
+                self._cancel(job)
+
+    def cancel_matching(self, predicate):
+        """Cancel every job whose key matches `predicate(key)`."""
+        with self._lock:
+            for key in [k for k in self._jobs if predicate(k)]:
+                self._cancel(self._jobs.pop(key))
+
+    def _cancel(self, job: Job):
+        # A running job can't be interrupted: it finishes, but nobody collects it
+        if job.status == "queued":
+            job.status = "cancelled"
+            job._finish()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [k for k, j in self._jobs.items() if j.done() and now - j.finished_at > RESULT_TTL_S]:
+            del self._jobs[key]
+
+    def _work(self):
+        while True:
+            priority, _, job = self._queue.get()
+            with self._lock:
+                # Skip cancelled jobs and the stale copy of jobs that were bumped to a higher priority
+                if job.status != "queued" or priority != job.priority:
+                    continue
+                job.status = "running"
+            job._run()
+
+
+_jobs = JobQueue(get_int("job_workers", 8))
+
+
+def _session_key(key: tuple) -> tuple:
+    return (telemetry.current_session_id(), *key)
+
+
+def submit(key: tuple, fingerprint: str, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Job:
+    """`JobQueue.submit` for a key of the current session."""
+    return _jobs.submit(_session_key(key), fingerprint, fn, *args, priority=priority, **kwargs)
+
+
+def get(key: tuple):
+    return _jobs.get(_session_key(key))
+
+
+def pop(key: tuple):
+    return _jobs.pop(_session_key(key))
+
+
+def cancel(key: tuple):
+    _jobs.cancel(_session_key(key))
+
+
+def cancel_session():
+    """Cancel every job of the current session (e.g. when a new search replaces the cards)."""
+    session_id = telemetry.current_session_id()
+    _jobs.cancel_matching(lambda key: key[0] == session_id)
+
+
+def draft_priority(position: int, is_open: bool):
+    """Priority of the first draft of the card at `position` in a list, or None to wait until it is opened."""
+    if is_open:
+        return PRIORITY_INTERACTIVE
+    if position < EAGER_DRAFTS:
+        return PRIORITY_PREFETCH
+    return PRIORITY_BACKGROUND if BACKGROUND_DRAFTS else None
+
+
+def rerun_when_done(keys: list):
+    """Poll the given jobs of the current session and rerun the page as soon as one of them has finished."""
+    if not keys:
+        return
+    waiting = [_session_key(key) for key in keys]
+
+    @st.fragment(run_every=POLL_INTERVAL_S)
+    def _poll():
+        if any(job is None or job.done() for job in map(_jobs.get, waiting)):
+            st.rerun(scope="app")
+
+    _poll()
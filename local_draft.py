@@ -0,0 +1,94 @@
+"""local_draft.py
+
+Instant placeholder drafts, built locally while the back-end writes the real one.
+
+`draft_email` fills a template with the sanitized freelancer and prospect
+fields (names, company, sector, top skills) in the requested tone and style.
+It takes well under a millisecond, so a card shows a usable draft on the very
+rerun that queues its generation; the page swaps it for the generated email
+when that arrives, and keeps it if the generation fails.
+
+When an email was generated before for a similar request, that email (with
+the names swapped, see semantic_cache.py) makes a better placeholder than the
+template and is used instead. Either way the result is only a placeholder: the
+page never sends it unless the user regenerates or edits it.
+"""
+
+import metrics
+import semantic_cache
+import telemetry
+from api_client import GENERATE_ENDPOINTS, PAYLOAD_FIELDS, project
+
+GREETINGS = {
+    "Warm": "Hi {recipient},",
+    "Professional": "Dear {recipient},",
+    "Creative": "Hello {recipient}!",
+    "Direct": "Hi {recipient},",
+    "Empathetic": "Dear {recipient},",
+}
+SIGN_OFFS = {
+    "Warm": "Warm regards,",
+    "Professional": "Best regards,",
+    "Creative": "Looking forward to creating something great together,",
+    "Direct": "Best,",
+    "Empathetic": "Kind regards,",
+}
+
+# Body openers by style; the rest of the email is the same for every style
+FREELANCER_OPENERS = {
+    "Storytelling": "When I read about {company}'s mission, it reminded me of why I started working in {sector} in the first place.",
+    "Direct": "I'm a {title} specialised in {skills}, and I'd like to help {company}.",
+    "Formal": "I am writing to offer my services as a {title} to {company}.",
+    "Informal": "I came across {company} and really liked what you're doing in {sector}.",
+    "Benefit-driven": "I help {sector} companies like {company} ship faster with {skills}.",
+    "Technical": "My stack ({skills}) is a close fit for the challenges {company} is tackling in {sector}.",
+}
+COMPANY_OPENERS = {
+    "Storytelling": "At {company}, we are growing our team in {sector}, and your profile caught our attention.",
+    "Direct": "{company} is looking for a {title} with your skills in {skills}.",
+    "Formal": "On behalf of {company}, I would like to present a mission that matches your profile.",
+    "Informal": "We came across your profile and think you'd be a great fit at {company}.",
+    "Benefit-driven": "Joining {company} means working on meaningful {sector} projects, at a rate that fits your expertise.",
+    "Technical": "Our {sector} projects at {company} rely on {skills}, which is exactly your stack.",
+}
+
+
+def _first_tone(tones: str) -> str:
+    tone = (tones or "").split(",")[0].strip()
+    return tone if tone in GREETINGS else "Professional"
+
+
+@telemetry.traced("local_draft")
+def draft_email(freelance: dict, prospect: dict, sender_type: str) -> str:
+    """A personalised placeholder email from `freelance` to `prospect` (or the reverse for companies)."""
+    cache = semantic_cache.loaded()
+    if cache is not None:
+        fields = PAYLOAD_FIELDS[GENERATE_ENDPOINTS[sender_type]]
+        hit = cache.lookup(sender_type, project(freelance, fields["freelance"]), project(prospect, fields["prospect"]))
+        if hit is not None:
+            metrics.cache_hit("semantic_seed")
+            return hit.email
+        metrics.cache_miss("semantic_seed")
+    fields = {
+        "company": prospect.get("company", ""),
+        "sector": prospect.get("sector", ""),
+        "title": freelance.get("title", ""),
+        "skills": freelance.get("top3_skills", ""),
+    }
+    if sender_type == "company":
+        tone = _first_tone(prospect.get("target_tone"))
+        recipient, sender = freelance.get("name", ""), f"{prospect.get('contact_role', '')}, {fields['company']}"
+        # Company senders are built from the profile, whose style field is "preferred_email_style"
+        opener = COMPANY_OPENERS.get(prospect.get("preferred_email_style"), COMPANY_OPENERS["Direct"])
+        pitch = f"{prospect.get('mission_statement', '')} Would you be open to a short call to discuss it?"
+    else:
+        tone = _first_tone(freelance.get("preferred_tone"))
+        recipient, sender = prospect.get("main_contact", ""), f"{freelance.get('name', '')}, {fields['title']}"
+        opener = FREELANCER_OPENERS.get(freelance.get("preferred_style"), FREELANCER_OPENERS["Direct"])
+        pitch = f"{freelance.get('mission_statement', '')} Would you be open to a short call to see how I could help?"
+    return "\n\n".join([
+        GREETINGS[tone].format(recipient=recipient),
+        opener.format(**fields),
+        pitch,
+        f"{SIGN_OFFS[tone]}\n{sender}",
+    ])
@@ -0,0 +1,268 @@
+"""local_matcher.py
+
+Offline fallback for the /match_* endpoints.
+
+Every successful `get_matches` response is remembered in a local corpus
+(``<data_dir>/corpus/<kind>.jsonl``, plus any bundled ``data/corpus/<kind>.jsonl``
+shipped with the app). The corpus is indexed with BM25 over hashed terms, in
+plain NumPy (no scikit-learn on the front-end, see requirements.txt):
+
+    term_ptr.npy      postings offsets, one per hash bucket (+1)
+    doc_ids.npy       posting document ids
+    weights.npy       posting BM25 weights (idf and length normalisation baked in)
+    doc_offsets.npy   byte offset of each document in docs.jsonl
+    docs.jsonl        the documents
+
+Each build writes these files to a new generation folder
+(``<kind>.<generation>/``), then points ``<kind>.current`` at it with one
+atomic rename. A loaded index keeps reading its own generation, whose files it
+holds open, so a rebuild never moves documents under its offsets; later builds
+remove the old generations.
+
+The arrays are memory-mapped, so loading an index at startup is instant and a
+query only touches the postings of its own terms. When the API is slow or down,
+`search` returns ranked matches in the same shape as the API, each flagged with
+``"offline_match": True`` so the page can say the results are degraded.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from settings import data_dir
+
+N_BUCKETS = 2 ** 18
+BM25_K1 = 1.2
+BM25_B = 0.75
+REBUILD_DEBOUNCE_S = 30
+BUNDLED_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "corpus")
+
+# Which corpus a search for a given user type reads, and what identifies a document in it
+CORPUS_OF = {"freelancer": "companies", "company": "freelancers"}
+KEY_FIELD = {"companies": "company", "freelancers": "name"}
+TEXT_FIELDS = ["company", "name", "title", "sector", "main_sector", "top3_skills", "city", "mission_statement"]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> list:
+    return _TOKEN.findall(text.lower())
+
+
+def _bucket(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) % N_BUCKETS  # Stable across processes, unlike hash()
+
+
+def _document_text(doc: dict) -> str:
+    parts = []
+    for field in TEXT_FIELDS:
+        value = doc.get(field)
+        parts.append(" ".join(map(str, value)) if isinstance(value, list) else str(value or ""))
+    return " ".join(parts)
+
+
+def _current_generation(kind: str, folder: str):
+    """Folder of the current index generation of `kind`, or None if it was never built."""
+    try:
+        with open(os.path.join(folder, f"{kind}.current"), encoding="utf-8") as f:
+            return os.path.join(folder, f.read().strip())
+    except OSError:
+        return None
+
+
+def _remove_old_generations(kind: str, folder: str, current: str):
+    # Recent generations are kept: another process may still be writing one, or be about to load it
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.startswith(f"{kind}.") and os.path.isdir(path) and path != current:
+            try:
+                if time.time() - os.path.getmtime(path) > REBUILD_DEBOUNCE_S:
+                    shutil.rmtree(path)
+            except OSError:
+                pass  # Still open (Windows) or already gone: the next build tries again
+
+
+def build_index(kind: str, docs: list, folder: str) -> str:
+    """Writes the BM25 index of `docs` as a new generation in `folder`, makes it current and returns its folder."""
+    doc_terms = [np.array([_bucket(t) for t in _tokens(_document_text(d))], dtype=np.int64) for d in docs]
+    lengths = np.array([len(t) for t in doc_terms], dtype=np.float32)
+    avg_length = float(lengths.mean()) if len(docs) else 1.0
+
+    # One (bucket, doc, term frequency) triple per distinct term of each document
+    buckets, doc_ids, tfs = [], [], []
+    for doc_id, terms in enumerate(doc_terms):
+        unique, counts = np.unique(terms, return_counts=True)
+        buckets.append(unique)
+        doc_ids.append(np.full(len(unique), doc_id, dtype=np.int32))
+        tfs.append(counts.astype(np.float32))
+    buckets = np.concatenate(buckets) if buckets else np.zeros(0, dtype=np.int64)
+    doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+    tfs = np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.float32)
+
+    order = np.argsort(buckets, kind="stable")
+    buckets, doc_ids, tfs = buckets[order], doc_ids[order], tfs[order]
+    doc_freq = np.bincount(buckets, minlength=N_BUCKETS)
+    idf = np.log1p((len(docs) - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_ids] / avg_length)
+    weights = idf[buckets] * tfs * (BM25_K1 + 1) / (tfs + norm)
+    term_ptr = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+
+    generation = f"{kind}.{time.time_ns():x}.{os.getpid()}"
+    generation_folder = os.path.join(folder, generation)
+    os.makedirs(generation_folder)
+    offsets = []
+    with open(os.path.join(generation_folder, "docs.jsonl"), "w", encoding="utf-8") as f:
+        for doc in docs:
+            offsets.append(f.tell())
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    for name, array in [("doc_offsets", np.array(offsets, dtype=np.int64)), ("term_ptr", term_ptr),
+                        ("doc_ids", doc_ids), ("weights", weights.astype(np.float32))]:
+        np.save(os.path.join(generation_folder, f"{name}.npy"), array)
+
+    pointer = os.path.join(folder, f"{kind}.current")
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(generation)
+    os.replace(pointer + ".tmp", pointer)
+    _remove_old_generations(kind, folder, generation_folder)
+    return generation_folder
+
+
+class LocalIndex:
+    """A memory-mapped BM25 index over one corpus, read from one generation folder."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        load = lambda name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+        self.term_ptr = load("term_ptr")
+        self.doc_ids = load("doc_ids")
+        self.weights = load("weights")
+        self.doc_offsets = load("doc_offsets")
+        self._docs = open(os.path.join(folder, "docs.jsonl"), "rb")  # Kept open: the generation may be removed later
+        self._docs_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_offsets)
+
+    def search(self, query: str, top_k: int = 10) -> list:
+        scores = np.zeros(len(self), dtype=np.float32)
+        for bucket in {_bucket(t) for t in _tokens(query)}:
+            start, end = self.term_ptr[bucket], self.term_ptr[bucket + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]  # Doc ids are unique within a bucket
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k == 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        results = []
+        with self._docs_lock:
+            for doc_id in best:
+                self._docs.seek(int(self.doc_offsets[doc_id]))
+                results.append({**json.loads(self._docs.readline()), "offline_match": True})
+        return results
+
+
+class LocalMatcher:
+    """Remembers API matches and answers from them when the API can't."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._indexes = {}
+        self._known = {}  # kind -> set of document keys already in the corpus
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuild_scheduled = False
+
+    def _corpus_path(self, kind: str) -> str:
+        return os.path.join(self.folder, f"{kind}.jsonl")
+
+    def _load_corpus(self, kind: str) -> list:
+        docs, seen = [], set()
+        for path in [os.path.join(BUNDLED_CORPUS_DIR, f"{kind}.jsonl"), self._corpus_path(kind)]:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        doc = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = doc.get(KEY_FIELD[kind])
+                    if key and key not in seen:
+                        seen.add(key)
+                        docs.append(doc)
+        return docs
+
+    def remember(self, user_type: str, matches: list):
+        """Adds the documents of an API response to the corpus; the index is rebuilt in the background."""
+        kind = CORPUS_OF[user_type]
+        with self._lock:
+            if kind not in self._known:
+                self._known[kind] = {d.get(KEY_FIELD[kind]) for d in self._load_corpus(kind)}
+            new = [m for m in matches if m.get(KEY_FIELD[kind]) and m.get(KEY_FIELD[kind]) not in self._known[kind]]
+            if not new:
+                return
+            with open(self._corpus_path(kind), "a", encoding="utf-8") as f:
+                for doc in new:
+                    self._known[kind].add(doc[KEY_FIELD[kind]])
+                    f.write(json.dumps({k: v for k, v in doc.items() if k != "offline_match"}, ensure_ascii=False) + "\n")
+            self._dirty.add(kind)
+            if not self._rebuild_scheduled:
+                self._rebuild_scheduled = True
+                timer = threading.Timer(REBUILD_DEBOUNCE_S, self._rebuild_dirty)
+                timer.daemon = True
+                timer.start()
+
+    def _rebuild_dirty(self):
+        with self._lock:
+            dirty, self._dirty, self._rebuild_scheduled = self._dirty, set(), False
+        for kind in dirty:
+            self.rebuild(kind)
+
+    def rebuild(self, kind: str):
+        with self._build_lock:
+            self._indexes[kind] = LocalIndex(build_index(kind, self._load_corpus(kind), self.folder))
+
+    def _index(self, kind: str):
+        index = self._indexes.get(kind)
+        if index is None:
+            with self._build_lock:
+                index = self._indexes.get(kind)
+                if index is not None:
+                    return index
+                generation = _current_generation(kind, self.folder)
+                if generation is None or not os.path.isdir(generation):
+                    docs = self._load_corpus(kind)
+                    if not docs:
+                        return None
+                    generation = build_index(kind, docs, self.folder)  # First search on a corpus that was never indexed
+                try:
+                    index = self._indexes[kind] = LocalIndex(generation)
+                except OSError:
+                    return None  # Removed by another process's build meanwhile: the next search loads the new one
+        return index
+
+    def search(self, statement: str, user_type: str, top_k: int = 10) -> list:
+        """Ranked offline matches for `statement`, or [] if there is nothing to match against."""
+        index = self._index(CORPUS_OF[user_type])
+        return index.search(statement, top_k) if index is not None and len(index) else []
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher() -> LocalMatcher:
+    """The local matcher of this process."""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = LocalMatcher(data_dir("corpus"))
+    return _matcher
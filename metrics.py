@@ -0,0 +1,250 @@
+"""metrics.py
+
+Process-wide, constant-memory metrics for the operations page (pages/operations.py)
+and the Prometheus endpoint served by telemetry.py.
+
+    - per API endpoint: request and error counts, in-flight calls, request body
+      sizes and a streaming latency histogram (`LatencyHistogram`);
+    - per cache: hits and misses;
+    - a few gauges and counters set by other modules (e.g. the generation
+      concurrency limit, semantic cache quality flags);
+    - active sessions and the process memory.
+
+Everything here is cheap to update from any thread; nothing grows with traffic.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets grow by 10% from 1 ms up to ~2 min: ~125 counters per
+# endpoint, quantiles accurate to within ~5%
+HISTOGRAM_MIN_S = 0.001
+HISTOGRAM_GROWTH = 1.1
+HISTOGRAM_BUCKETS = 125
+SESSION_IDLE_S = 300  # A session counts as active if it reran in the last 5 minutes
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with a fixed number of counters."""
+
+    def __init__(self):
+        self.counts = [0] * (HISTOGRAM_BUCKETS + 1)  # Last bucket catches everything slower
+        self.total = 0
+        self.sum_s = 0.0
+        self.max_s = 0.0
+
+    @staticmethod
+    def bucket_of(seconds: float) -> int:
+        if seconds <= HISTOGRAM_MIN_S:
+            return 0
+        return min(HISTOGRAM_BUCKETS, int(math.log(seconds / HISTOGRAM_MIN_S, HISTOGRAM_GROWTH)) + 1)
+
+    @staticmethod
+    def upper_bound(bucket: int) -> float:
+        return HISTOGRAM_MIN_S * HISTOGRAM_GROWTH ** bucket
+
+    def record(self, seconds: float):
+        self.counts[self.bucket_of(seconds)] += 1
+        self.total += 1
+        self.sum_s += seconds
+        self.max_s = max(self.max_s, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (0 when empty)."""
+        if not self.total:
+            return 0.0
+        rank = q * self.total
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.upper_bound(bucket), self.max_s)
+        return self.max_s
+
+    def nonempty_buckets(self) -> list:
+        """`(upper bound in seconds, count)` of every bucket that holds at least one call."""
+        return [(self.upper_bound(b), c) for b, c in enumerate(self.counts) if c]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bodies = 0
+        self.body_bytes = 0
+        self.latency = LatencyHistogram()
+
+
+class _Call:
+    """Handed out by `track`; set `status_code` to let non-2xx answers count as errors, `body_bytes` to count the request body."""
+    status_code = None
+    body_bytes = 0
+
+
+_lock = threading.Lock()
+_endpoints = {}  # endpoint -> EndpointStats
+_caches = {}  # cache name -> [hits, misses]
+_sessions = {}  # session id -> last seen (monotonic)
+_gauges = {}  # name -> last value
+_counters = {}  # name -> count
+
+
+@contextmanager
+def track(endpoint: str):
+    """Count one API call to `endpoint` and time it."""
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, EndpointStats())
+        stats.in_flight += 1
+    call = _Call()
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield call
+        failed = call.status_code is not None and call.status_code >= 400
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.errors += failed
+            stats.bodies += call.body_bytes > 0
+            stats.body_bytes += call.body_bytes
+            stats.latency.record(elapsed)
+
+
+def cache_hit(name: str):
+    with _lock:
+        _caches.setdefault(name, [0, 0])[0] += 1
+
+
+def cache_miss(name: str):
+    with _lock:
+        _caches.setdefault(name, [0, 0])[1] += 1
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def touch_session(session_id: str):
+    """Mark a session as active (called on every rerun)."""
+    now = time.monotonic()
+    with _lock:
+        _sessions[session_id] = now
+        if len(_sessions) > 64:  # Forget idle sessions now and then, so the dict stays small
+            for sid in [s for s, seen in _sessions.items() if now - seen > SESSION_IDLE_S]:
+                del _sessions[sid]
+
+
+def active_sessions() -> int:
+    now = time.monotonic()
+    with _lock:
+        return sum(1 for seen in _sessions.values() if now - seen <= SESSION_IDLE_S)
+
+
+def memory_rss_bytes() -> int:
+    """Resident memory of this process (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def endpoint_snapshot() -> dict:
+    """Per-endpoint stats, copied under the lock so callers can read them at leisure."""
+    with _lock:
+        return {
+            endpoint: {
+                "requests": s.requests,
+                "errors": s.errors,
+                "error_rate": s.errors / s.requests if s.requests else 0.0,
+                "in_flight": s.in_flight,
+                "p50_s": s.latency.quantile(0.50),
+                "p95_s": s.latency.quantile(0.95),
+                "p99_s": s.latency.quantile(0.99),
+                "mean_s": s.latency.sum_s / s.latency.total if s.latency.total else 0.0,
+                "body_bytes": s.body_bytes,
+                "mean_body_bytes": s.body_bytes / s.bodies if s.bodies else 0.0,
+                "buckets": s.latency.nonempty_buckets(),
+            }
+            for endpoint, s in _endpoints.items()
+        }
+
+
+def cache_snapshot() -> dict:
+    """Cache name -> (hits, misses, hit ratio)."""
+    with _lock:
+        return {name: (h, m, h / (h + m) if h + m else 0.0) for name, (h, m) in _caches.items()}
+
+
+def gauge_snapshot() -> dict:
+    with _lock:
+        return dict(_gauges)
+
+
+def counter_snapshot() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def prometheus_text() -> str:
+    """Endpoint, cache and process metrics in the Prometheus text exposition format.
+
+    Each metric family is written in one block (HELP, TYPE, then all its samples), as the format requires."""
+    families = {}  # name -> (type, help, sample lines), in output order
+
+    def family(name: str, kind: str, description: str) -> list:
+        return families.setdefault(f"leadcraftr_{name}", (kind, description, []))[2]
+
+    requests_total = family("api_requests_total", "counter", "API calls per endpoint.")
+    errors_total = family("api_errors_total", "counter", "API calls that failed, per endpoint.")
+    in_flight = family("api_in_flight", "gauge", "API calls in progress, per endpoint.")
+    body_bytes = family("api_request_body_bytes_total", "counter", "Bytes of request bodies sent, per endpoint.")
+    latency = family("api_latency_seconds", "histogram", "API call latency, per endpoint.")
+    with _lock:
+        for endpoint, s in sorted(_endpoints.items()):
+            label = f'endpoint="{endpoint}"'
+            requests_total.append(f"leadcraftr_api_requests_total{{{label}}} {s.requests}")
+            errors_total.append(f"leadcraftr_api_errors_total{{{label}}} {s.errors}")
+            in_flight.append(f"leadcraftr_api_in_flight{{{label}}} {s.in_flight}")
+            body_bytes.append(f"leadcraftr_api_request_body_bytes_total{{{label}}} {s.body_bytes}")
+            cumulative = 0
+            # Every boundary, empty or not: a series that appears only once a bucket fills breaks rate() over it
+            for bucket, count in enumerate(s.latency.counts[:-1]):
+                cumulative += count
+                le = f"{LatencyHistogram.upper_bound(bucket):.4f}"
+                latency.append(f'leadcraftr_api_latency_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            latency.append(f'leadcraftr_api_latency_seconds_bucket{{{label},le="+Inf"}} {s.latency.total}')
+            latency.append(f"leadcraftr_api_latency_seconds_sum{{{label}}} {s.latency.sum_s:.6f}")
+            latency.append(f"leadcraftr_api_latency_seconds_count{{{label}}} {s.latency.total}")
+        hits = family("cache_hits_total", "counter", "Cache hits, per cache.")
+        misses = family("cache_misses_total", "counter", "Cache misses, per cache.")
+        for name, (hit_count, miss_count) in sorted(_caches.items()):
+            hits.append(f'leadcraftr_cache_hits_total{{cache="{name}"}} {hit_count}')
+            misses.append(f'leadcraftr_cache_misses_total{{cache="{name}"}} {miss_count}')
+        for name, value in sorted(_gauges.items()):
+            family(name, "gauge", name.replace("_", " ").capitalize() + ".").append(f"leadcraftr_{name} {value}")
+        for name, count in sorted(_counters.items()):
+            family(f"{name}_total", "counter", name.replace("_", " ").capitalize() + ".").append(f"leadcraftr_{name}_total {count}")
+    family("active_sessions", "gauge", "Sessions seen recently.").append(f"leadcraftr_active_sessions {active_sessions()}")
+    family("memory_rss_bytes", "gauge", "Resident memory of the process.").append(f"leadcraftr_memory_rss_bytes {memory_rss_bytes()}")
+    lines = []
+    for name, (kind, description, samples) in families.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", *samples]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,124 @@
+"""micro_batch.py
+
+Process-wide micro-batching of requests that arrive at the same moment.
+
+When many sessions ask for a generation at once, each used to be its own HTTP
+call. A `MicroBatcher` groups them instead: the first request to arrive opens a
+batch and waits for a short window (``generate_batch_window_ms``, 15 ms by
+default); every request that arrives meanwhile joins it, and the opener then
+sends the whole batch in one call and hands each waiter its own result. A batch
+is sent early once it holds ``generate_batch_max`` requests.
+
+The window is only held open under concurrency. Callers wrap each request,
+batched or not, in `in_flight(key)`; a request that arrives while no other
+request of its key is in flight is sent on its own at once, so a lone user
+never waits for a batch nobody will join.
+
+No extra thread is involved: the opener sends the batch from its own thread,
+so the call keeps the opener's session and traffic class (scheduler.py) and
+takes a single scheduler slot. Requests only share a batch with requests of
+the same key (api_client.py uses the traffic class), so an interactive
+generation never waits in the bulk queue because a bulk request opened its
+batch. A batch is sent with the shortest budget of its requests: it is back,
+or given up on, before any of them stops waiting, so no request is sent on its
+own while the batch is still generating it.
+
+Any result may be None, meaning "send this one on its own": a batch of one, a
+batch call that failed, or a waiter whose budget ran out before the batch came
+back all fall back to single calls, so batching never loses a request.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import metrics
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.deadlines = []  # time.monotonic() by which each request needs its result
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Groups concurrent `submit` calls and sends them together through `flush(items, timeout)`.
+
+    `flush` returns one result per item, in order (None for items to send on
+    their own), or None if the whole batch should fall back to single calls.
+    """
+
+    def __init__(self, name: str, flush: Callable[[list, float], Optional[list]], window_s: float, max_size: int):
+        self.name = name
+        self.flush = flush
+        self.window_s = window_s
+        self.max_size = max_size
+        self.enabled = window_s > 0 and max_size > 1
+        self._open = {}  # key -> batch accepting requests
+        self._in_flight = {}  # key -> requests between `in_flight` enter and exit
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def in_flight(self, key=None):
+        """Count a request of `key` as in flight while it is submitted and, if need be, sent on its own."""
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+
+    def submit(self, item, timeout: float, key=None):
+        """The batched result of `item`, or None to send it on its own. Waits at most `timeout` seconds.
+
+        `item` is only batched with items submitted with the same `key`."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            batch = self._open.get(key)
+            opener = batch is None
+            if opener and self._in_flight.get(key, 0) > 1:
+                batch = self._open[key] = _Batch()
+            if batch is not None:
+                index = len(batch.items)
+                batch.items.append(item)
+                batch.deadlines.append(time.monotonic() + timeout)
+                if len(batch.items) >= self.max_size:
+                    del self._open[key]
+                    batch.full.set()
+        if batch is None:  # Nothing else pending or in flight: don't hold a window nobody will join
+            metrics.increment(f"{self.name}_single_requests")
+            return None
+        if opener:
+            self._send(batch, key)
+        elif not batch.done.wait(timeout):
+            return None
+        return batch.results[index] if batch.results is not None else None
+
+    def _send(self, batch: _Batch, key):
+        batch.full.wait(self.window_s)
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+        results = None
+        try:
+            timeout = min(batch.deadlines) - time.monotonic()
+            if len(batch.items) > 1 and timeout > 0:
+                results = self.flush(batch.items, timeout)
+        except Exception:
+            results = None  # Whatever went wrong, every request is sent on its own
+        finally:
+            if results is not None and len(results) == len(batch.items):
+                batch.results = results
+                metrics.increment(f"{self.name}_batches")
+                metrics.increment(f"{self.name}_batched_requests", len(batch.items))
+            else:
+                metrics.increment(f"{self.name}_single_requests", len(batch.items))
+            batch.done.set()
@@ -0,0 +1,330 @@
+"""outbox.py
+
+Email delivery: a persistent outbox drained over pooled SMTP connections.
+
+"📤 Send" (app_V4.py) and bulk outreach (bulk_outreach_page.py) queue messages
+with `Outbox.enqueue`, which returns at once: the Streamlit rerun never waits
+on SMTP. Behind it:
+
+    - messages are kept in SQLite (``<data_dir>/outbox.sqlite3``) until they
+      are delivered or given up on, so a restart loses nothing; a message id
+      is its idempotency key (queuing the same bulk job twice sends it once);
+    - one dispatcher thread owns the database: it stores new messages, hands
+      due ones out in batches of ``smtp_batch_size`` and records the outcomes;
+    - ``smtp_pool_size`` sender threads each keep one SMTP connection open and
+      send batch after batch over it (the connection, TLS handshake and login
+      are paid once, not per message), closing it after `IDLE_CLOSE_S` idle;
+    - a temporary failure (4xx, dropped connection, server down) is retried
+      with exponential backoff, up to ``outbox_max_attempts``; a permanent one
+      (5xx: unknown recipient, rejected content) fails the message at once.
+    - only deliverable recipients are queued (`recipient`): a missing or
+      malformed address, or a placeholder such as the ``info@example.com``
+      sanitization.py fills in, is refused; a message that can't be built (a
+      header with a line break) fails on its own without stopping its sender.
+
+Delivery is off unless ``smtp_host`` is set. For local testing, run an SMTP
+stand-in such as ``python -m aiosmtpd -n -l localhost:8025`` with
+``smtp_host = "localhost"``, ``smtp_port = 8025`` and ``smtp_security = "none"``.
+Counts of sent, retried and failed messages and the queue length are reported
+to metrics.py.
+"""
+
+import os
+import queue
+import re
+import smtplib
+import sqlite3
+import ssl
+import threading
+import time
+import uuid
+from contextlib import closing
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+import metrics
+from settings import data_dir, get_int, get_setting
+
+SMTP_HOST = get_setting("smtp_host", "")
+SMTP_PORT = get_int("smtp_port", 587)
+SMTP_USER = get_setting("smtp_user", "")
+SMTP_PASSWORD = get_setting("smtp_password", "")
+SMTP_SECURITY = get_setting("smtp_security", "starttls")  # "starttls", "ssl" or "none"
+MAIL_FROM = get_setting("mail_from", "LeadCraftr <no-reply@leadcraftr.app>")
+POOL_SIZE = get_int("smtp_pool_size", 2)
+BATCH_SIZE = get_int("smtp_batch_size", 50)
+MAX_ATTEMPTS = get_int("outbox_max_attempts", 6)
+ENABLED = bool(SMTP_HOST)
+
+SMTP_TIMEOUT_S = 20
+RETRY_BACKOFF_S = 5.0  # Doubled after every failed attempt
+MAX_BACKOFF_S = 900
+IDLE_CLOSE_S = 30  # Servers drop idle clients after about a minute anyway
+POLL_S = 1.0
+
+QUEUED, SENT, FAILED = "queued", "sent", "failed"
+_ADDRESS = re.compile(r"[^@\s<>()\[\],;:\"]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)+")
+# Reserved for documentation (RFC 2606): sanitization.py fills missing addresses with info@example.com
+_PLACEHOLDER_DOMAINS = ("example.com", "example.org", "example.net")
+_PLACEHOLDER_TLDS = (".example", ".test", ".invalid", ".localhost")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    user TEXT,
+    to_addr TEXT NOT NULL,
+    reply_to TEXT,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def split_subject(email_text: str, default: str) -> tuple:
+    """`(subject, body)` of a generated email: its "Subject:" line if it starts with one, else `default`."""
+    first_line, _, rest = email_text.strip().partition("\n")
+    if first_line.lower().startswith("subject:"):
+        return first_line[len("subject:"):].strip() or default, rest.strip()
+    return default, email_text.strip()
+
+
+def recipient(address) -> str:
+    """`address` stripped if it is one we can deliver to, else "" (missing, malformed or a placeholder)."""
+    address = str(address or "").strip()
+    if not _ADDRESS.fullmatch(address):
+        return ""
+    domain = address.rpartition("@")[2].lower()
+    if domain in _PLACEHOLDER_DOMAINS or domain.endswith(_PLACEHOLDER_TLDS) or domain.endswith(
+            tuple("." + d for d in _PLACEHOLDER_DOMAINS)):
+        return ""
+    return address
+
+
+def _message(message_id: str, to_addr: str, reply_to: str, subject: str, body: str) -> EmailMessage:
+    """The email to send; raises ValueError on a header that can't be sent (e.g. with a line break)."""
+    message = EmailMessage()
+    message["From"] = MAIL_FROM
+    message["To"] = to_addr
+    if reply_to:
+        message["Reply-To"] = reply_to
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid(idstring=message_id)
+    message.set_content(body)
+    return message
+
+
+def describe(status) -> str:
+    """One line for the page about a message's `status` (as returned by `Outbox.status`)."""
+    if status is None or (status[0] == QUEUED and not status[1]):
+        return "📬 Queued for delivery"
+    if status[0] == QUEUED:
+        return f"📬 Delivery will be retried (attempt {status[1] + 1}/{MAX_ATTEMPTS}): {status[2]}"
+    if status[0] == SENT:
+        return "📨 Delivered"
+    return f"⚠️ Delivery failed: {status[2]}"
+
+
+def _smtp_connection() -> smtplib.SMTP:
+    if SMTP_SECURITY == "ssl":
+        connection = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_S, context=ssl.create_default_context())
+    else:
+        connection = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_S)
+        if SMTP_SECURITY == "starttls":
+            connection.starttls(context=ssl.create_default_context())
+    if SMTP_USER:
+        connection.login(SMTP_USER, SMTP_PASSWORD)
+    return connection
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Will sending this message again never work (5xx reply)?"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return isinstance(code, int) and code >= 500
+
+
+class Outbox:
+    """Persistent queue of outgoing emails and the threads that deliver them."""
+
+    def __init__(self, path: str, pool_size: int = POOL_SIZE):
+        self.path = path
+        self._inbox = queue.SimpleQueue()  # New messages and delivery outcomes, for the dispatcher
+        self._batches = queue.SimpleQueue()  # Batches of due messages, for the senders
+        self._idle_senders = pool_size
+        with closing(_connect(path)) as connection:
+            connection.executescript(_SCHEMA)
+        threading.Thread(target=self._dispatch_loop, name="outbox-dispatcher", daemon=True).start()
+        for i in range(pool_size):
+            threading.Thread(target=self._send_loop, name=f"outbox-sender-{i}", daemon=True).start()
+
+    def enqueue(self, to_addr: str, subject: str, body: str, user: str = "", reply_to: str = "", message_id: str = "") -> str:
+        """Queue an email for delivery and return its id. Never blocks.
+
+        Raises ValueError if `to_addr` isn't a deliverable address (see `recipient`): check it first."""
+        if not recipient(to_addr):
+            raise ValueError(f"Not a deliverable address: {to_addr!r}")
+        message_id = message_id or uuid.uuid4().hex
+        self._inbox.put(("new", (message_id, time.time(), user, to_addr, reply_to, subject, body, time.time())))
+        return message_id
+
+    def rekey(self, old: str, new: str):
+        """File the messages of user `old` (e.g. a session key) under `new`."""
+        self._inbox.put(("rekey", (old, new)))
+
+    def status(self, message_id: str):
+        """`(status, attempts, last error)` of a message, or None while it isn't stored yet."""
+        # Script runs come and go on fresh threads: each read opens a connection and closes it
+        with closing(_connect(self.path)) as connection:
+            return connection.execute(
+                "SELECT status, attempts, last_error FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+
+    # ====== DISPATCHER ======
+    def _dispatch_loop(self):
+        connection = _connect(self.path)
+        in_flight = set()
+        while True:
+            events = []
+            try:
+                events.append(self._inbox.get(timeout=POLL_S))
+                while True:
+                    events.append(self._inbox.get_nowait())
+            except queue.Empty:
+                pass
+            self._idle_senders += sum(kind == "idle" for kind, _ in events)
+            events = [(kind, data) for kind, data in events if kind != "idle"]
+            try:
+                with connection:
+                    for kind, data in events:
+                        if kind == "new":
+                            connection.execute(
+                                "INSERT OR IGNORE INTO messages (id, created, user, to_addr, reply_to, subject, body, next_attempt)"
+                                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data)
+                        elif kind == "rekey":
+                            connection.execute("UPDATE messages SET user = ? WHERE user = ?", (data[1], data[0]))
+                        else:
+                            in_flight.discard(data[0])
+                            self._record(connection, kind, *data)
+                    if self._idle_senders:
+                        self._hand_out(connection, in_flight)
+                    if events:
+                        queued = connection.execute("SELECT COUNT(*) FROM messages WHERE status = 'queued'").fetchone()[0]
+                        metrics.set_gauge("outbox_queued", queued)
+            except sqlite3.Error:
+                for event in events:  # Locked or full disk: nothing was written, try again on the next round
+                    self._inbox.put(event)
+                time.sleep(POLL_S)
+
+    def _record(self, connection: sqlite3.Connection, kind: str, message_id: str, error: str = ""):
+        now = time.time()
+        if kind == "sent":
+            connection.execute("UPDATE messages SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?", (now, message_id))
+            metrics.increment("outbox_sent")
+        elif kind == "failed":
+            connection.execute("UPDATE messages SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?", (error, message_id))
+            metrics.increment("outbox_failed")
+        elif kind == "retry":
+            attempts = connection.execute("SELECT attempts FROM messages WHERE id = ?", (message_id,)).fetchone()[0] + 1
+            if attempts >= MAX_ATTEMPTS:
+                connection.execute("UPDATE messages SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?", (attempts, error, message_id))
+                metrics.increment("outbox_failed")
+            else:
+                connection.execute("UPDATE messages SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                                   (attempts, now + min(MAX_BACKOFF_S, RETRY_BACKOFF_S * 2 ** (attempts - 1)), error, message_id))
+                metrics.increment("outbox_retried")
+        elif kind == "deferred":  # Not attempted: the server was unreachable for an earlier message of the batch
+            connection.execute("UPDATE messages SET next_attempt = ? WHERE id = ?", (now + RETRY_BACKOFF_S, message_id))
+
+    def _hand_out(self, connection: sqlite3.Connection, in_flight: set):
+        rows = connection.execute(
+            "SELECT id, to_addr, reply_to, subject, body FROM messages WHERE status = 'queued' AND next_attempt <= ?"
+            " ORDER BY next_attempt LIMIT ?", (time.time(), BATCH_SIZE * self._idle_senders + len(in_flight))
+        ).fetchall()
+        due = [row for row in rows if row[0] not in in_flight]
+        while due and self._idle_senders:
+            batch, due = due[:BATCH_SIZE], due[BATCH_SIZE:]
+            in_flight.update(row[0] for row in batch)
+            self._idle_senders -= 1
+            self._batches.put(batch)
+
+    # ====== SENDERS ======
+    def _send_loop(self):
+        smtp = None
+        while True:
+            try:
+                batch = self._batches.get(timeout=IDLE_CLOSE_S)
+            except queue.Empty:
+                smtp = self._close(smtp)
+                continue
+            for position, (message_id, to_addr, reply_to, subject, body) in enumerate(batch):
+                try:
+                    message = _message(message_id, to_addr, reply_to, subject, body)
+                except (ValueError, TypeError) as e:
+                    self._inbox.put(("failed", (message_id, f"Invalid message: {e}")))  # Only this one: it can never be sent
+                    continue
+                outcome, error = "sent", ""
+                for reused in [smtp is not None, False]:
+                    try:
+                        if smtp is None:
+                            smtp = _smtp_connection()
+                        smtp.send_message(message)
+                        break
+                    except smtplib.SMTPServerDisconnected as e:
+                        smtp = self._close(smtp)
+                        outcome, error = "retry", str(e) or "Disconnected"
+                        if reused:
+                            continue  # The pooled connection had gone stale: one more try on a fresh one
+                    except (smtplib.SMTPException, OSError) as e:
+                        outcome, error = ("failed" if _is_permanent(e) else "retry"), str(e)
+                        if smtp is not None and not isinstance(e, smtplib.SMTPResponseException):
+                            smtp = self._close(smtp)
+                    except Exception as e:  # e.g. an address smtplib can't encode: fail the message, keep the sender
+                        outcome, error = "failed", str(e) or type(e).__name__
+                    break
+                if outcome == "retry" and smtp is None:
+                    # The server is unreachable: don't burn the attempts of the rest of the batch
+                    self._inbox.put(("retry", (message_id, error)))
+                    for rest in batch[position + 1:]:
+                        self._inbox.put(("deferred", (rest[0],)))
+                    break
+                self._inbox.put((outcome, (message_id, error)))
+            self._inbox.put(("idle", None))
+
+    @staticmethod
+    def _close(smtp):
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+        return None
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """The outbox of this process, started on first use."""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox(os.path.join(data_dir(), "outbox.sqlite3"))
+    return _outbox
@@ -0,0 +1,105 @@
+"""operations.py
+
+Admin-only operations page: live API latency, error rates, cache hit ratios,
+sessions and memory of this front-end process.
+
+Streamlit picks it up automatically from the `pages/` directory. Access needs
+the ``admin_token`` setting (see settings.py); without it the page stays locked.
+The token is typed in the page, or sent by a reverse proxy in an
+``X-Admin-Token`` header; it is never read from the URL, where it would end
+up in browser history and access logs.
+All the numbers come from metrics.py, which only keeps fixed-size counters, so
+refreshing this page costs the same whatever the traffic.
+"""
+
+import hmac
+
+import streamlit as st
+
+import metrics
+from settings import get_setting
+
+REFRESH_EVERY_S = 2
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+st.set_page_config(page_title="LeadCraftr · Operations", layout="wide")
+
+
+def _is_admin() -> bool:
+    admin_token = get_setting("admin_token")
+    if not admin_token:
+        st.warning("The operations page is disabled: set `admin_token` in the secrets to enable it.")
+        return False
+    if st.session_state.get("ops_admin"):
+        return True
+    token = st.context.headers.get(ADMIN_TOKEN_HEADER) or st.text_input("Admin token", type="password")
+    if token and hmac.compare_digest(str(token), str(admin_token)):
+        st.session_state.ops_admin = True
+        return True
+    if token:
+        st.error("Wrong admin token.")
+    return False
+
+
+@st.fragment(run_every=REFRESH_EVERY_S)
+def display_live_metrics():
+    """Rendered again every few seconds without rerunning the rest of the page."""
+    col1, col2, col3 = st.columns(3)
+    col1.metric("👥 Active sessions", metrics.active_sessions())
+    col2.metric("🧠 Process memory (RSS)", f"{metrics.memory_rss_bytes() / 2 ** 20:.0f} MiB")
+    col3.metric("🔁 Refresh", f"every {REFRESH_EVERY_S} s")
+
+    st.subheader("🌐 API endpoints")
+    endpoints = metrics.endpoint_snapshot()
+    if not endpoints:
+        st.info("No API call has been made by this process yet.")
+    else:
+        st.dataframe([
+            {
+                "Endpoint": endpoint,
+                "Requests": s["requests"],
+                "In flight": s["in_flight"],
+                "Error rate": f"{s['error_rate']:.1%}",
+                "p50 (ms)": round(s["p50_s"] * 1000),
+                "p95 (ms)": round(s["p95_s"] * 1000),
+                "p99 (ms)": round(s["p99_s"] * 1000),
+                "Mean (ms)": round(s["mean_s"] * 1000),
+                "Avg body (B)": round(s["mean_body_bytes"]),
+            }
+            for endpoint, s in sorted(endpoints.items())
+        ], width="stretch", hide_index=True)
+
+        for endpoint, s in sorted(endpoints.items()):
+            with st.expander(f"📊 Latency histogram · {endpoint}"):
+                st.bar_chart(
+                    {"≤ ms": [f"{bound * 1000:.0f}" for bound, _ in s["buckets"]],
+                     "Calls": [count for _, count in s["buckets"]]},
+                    x="≤ ms", y="Calls"
+                )
+
+    gauges = metrics.gauge_snapshot()
+    if gauges:
+        st.subheader("🎚️ Gauges")
+        st.dataframe([{"Gauge": name, "Value": value} for name, value in sorted(gauges.items())],
+                     width="stretch", hide_index=True)
+
+    counters = metrics.counter_snapshot()
+    if counters:
+        st.subheader("🔢 Counters")
+        st.dataframe([{"Counter": name, "Count": count} for name, count in sorted(counters.items())],
+                     width="stretch", hide_index=True)
+
+    st.subheader("🗄️ Caches")
+    caches = metrics.cache_snapshot()
+    if not caches:
+        st.info("No cache has reported any lookup yet.")
+    else:
+        st.dataframe([
+            {"Cache": name, "Hits": hits, "Misses": misses, "Hit ratio": f"{ratio:.1%}"}
+            for name, (hits, misses, ratio) in sorted(caches.items())
+        ], width="stretch", hide_index=True)
+
+
+st.markdown("## ⚙️ Operations")
+if _is_admin():
+    display_live_metrics()
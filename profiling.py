@@ -0,0 +1,124 @@
+"""profiling.py
+
+On-demand CPU and memory profiling of a single Streamlit rerun.
+
+Profiling is off unless the ``debug_profiling`` setting is on (env var
+``LEADCRAFTR_DEBUG_PROFILING=1`` or ``debug_profiling = true`` in secrets.toml).
+When it is, opening the app with ``?profile=1`` arms the profiler for the
+session, and the *next* rerun (e.g. the slow click the customer reported) is run
+under cProfile and tracemalloc. The report is written to
+``<data_dir>/profiles/`` (a ``.prof`` file for snakeviz/pstats and a ``.txt``
+summary) and summarised in an expander at the bottom of the page.
+
+Python allows one active profiler per process (3.12+ raises "Another profiling
+tool is already active"), so only one run is profiled at a time: an armed
+session whose run starts while another is being profiled stays armed, and the
+skipped run is logged.
+
+In app_V4.py:
+
+    profiling.start_run()    # right after st.set_page_config
+    ...
+    profiling.finish_run()   # after the footer
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+import telemetry
+from settings import data_dir, get_bool
+
+TOP_N = 20
+QUERY_PARAM = "profile"
+
+_active = {}  # session id -> (profiler, start time) of the profiled run in progress (one at most)
+_lock = threading.Lock()
+_logger = logging.getLogger(__name__)
+
+
+def is_enabled() -> bool:
+    return get_bool("debug_profiling", False)
+
+
+def start_run():
+    """Arm the profiler from the query param, or start it if it was armed by a previous run."""
+    session_id = telemetry.current_session_id()
+    if session_id in _active:
+        # The profiled run was cut short by st.rerun()/st.stop(): report what we have
+        _finish(session_id)
+
+    if not is_enabled():
+        return
+    if st.query_params.get(QUERY_PARAM):
+        del st.query_params[QUERY_PARAM]
+        st.session_state["_profile_next_run"] = True
+        st.toast("🔬 Profiling armed: your next interaction will be profiled.")
+        return
+    if st.session_state.get("_profile_next_run"):
+        with _lock:
+            if _active:
+                _logger.info("Not profiling this run of session %s: another session's run is being profiled", session_id)
+                return  # Still armed: a later run of this session is profiled
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:  # Another profiling tool (e.g. a debugger or coverage) is active
+                _logger.info("Not profiling this run of session %s: %s", session_id, e)
+                return
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(10)
+            _active[session_id] = (profiler, time.perf_counter())
+        del st.session_state["_profile_next_run"]
+
+
+def finish_run():
+    """Stop the profiler of the current run (if any), save the report and show its summary."""
+    session_id = telemetry.current_session_id()
+    if session_id in _active:
+        _finish(session_id)
+    report = st.session_state.get("_profile_report")
+    if report:
+        with st.expander(f"🔬 Profile of the last profiled rerun ({report['wall_s']:.2f} s)"):
+            st.caption(f"Saved to `{report['path']}.prof` / `.txt`")
+            st.markdown(f"**Peak traced memory:** {report['peak_kib']:.0f} KiB")
+            st.markdown("**Top functions (cumulative time)**")
+            st.code(report["cpu_top"], language="text")
+            st.markdown("**Top allocations**")
+            st.code(report["memory_top"], language="text")
+
+
+def _finish(session_id: str):
+    with _lock:
+        profiler, started = _active.pop(session_id)
+        profiler.disable()
+        wall_s = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    cpu_stream = io.StringIO()
+    pstats.Stats(profiler, stream=cpu_stream).strip_dirs().sort_stats("cumulative").print_stats(TOP_N)
+    cpu_top = cpu_stream.getvalue().strip()
+    memory_top = "\n".join(str(stat) for stat in snapshot.statistics("lineno")[:TOP_N])
+
+    session_tag = "".join(c for c in session_id if c.isalnum())[:8] or "bare"
+    path = os.path.join(data_dir("profiles"), f"{time.strftime('%Y%m%d-%H%M%S')}-{session_tag}")
+    profiler.dump_stats(path + ".prof")
+    with open(path + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"Wall time: {wall_s:.3f} s\nPeak traced memory: {peak / 1024:.0f} KiB\n\n")
+        f.write(cpu_top + "\n\n" + memory_top + "\n")
+
+    try:
+        st.session_state["_profile_report"] = {
+            "path": path, "wall_s": wall_s, "peak_kib": peak / 1024, "cpu_top": cpu_top, "memory_top": memory_top,
+        }
+    except Exception:
+        pass  # Session already gone: the report is still on disk
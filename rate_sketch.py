@@ -0,0 +1,290 @@
+"""rate_sketch.py
+
+Market daily rates, learnt from the freelancer matches the back-end returns.
+
+Every freelancer returned by ``/match_prospect`` carries a ``daily_rate``.
+`api_client.get_matches` hands those payloads to `RateSketches.observe`, which
+feeds them into quantile sketches per sector, city and skill (plus one over
+every rate). The daily-rate page then tells a freelancer at which percentile of
+the observed rates of their sector, city or skill their own rate stands.
+
+Each sketch is a merging t-digest: rates are buffered, then merged into at
+most ``COMPRESSION`` (100) weighted centroids, finest at the tails. Memory is
+bounded however many rates arrive (``MAX_SKETCHES`` sketches of a few hundred
+numbers each), two digests merge into one (`TDigest.merge`), and a percentile
+query interpolates over the bounded centroid table, so it costs the same after
+a hundred observations or ten million.
+
+The same freelancer is often matched again and again: a rate is only counted
+once per freelancer (among the last ``MAX_SEEN`` seen), so the percentiles
+describe the market rather than the freelancers the matcher likes best. A
+freelancer is recognised by their id, email or name; one with none of them
+can't be told apart from others and is always counted.
+
+Sketches are saved to ``<data_dir>/rate_sketch/sketches.json`` by a background
+thread, at most every ``SAVE_EVERY_S`` seconds, and reloaded on start.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+import metrics
+from settings import data_dir
+
+COMPRESSION = 100
+BUFFER_SIZE = 256
+MAX_SKETCHES = 5000
+MAX_SEEN = 50_000
+MIN_OBSERVATIONS = 20  # Below this, a more general sketch answers instead
+SAVE_EVERY_S = 30
+ALL = "all"
+_SPACES = re.compile(r"\s+")
+
+
+def _k(q: float) -> float:
+    """Scale function k1: centroids are small near the tails and large around the median."""
+    return COMPRESSION / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+
+def _k_inverse(k: float) -> float:
+    return (math.sin(min(k * 2 * math.pi / COMPRESSION, math.pi / 2)) + 1) / 2
+
+
+class TDigest:
+    """Merging t-digest of a stream of numbers."""
+
+    def __init__(self, means=(), weights=(), minimum=np.inf, maximum=-np.inf):
+        self.means = np.asarray(means, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.minimum, self.maximum = float(minimum), float(maximum)
+        self._buffer = []  # (value, weight) pairs not merged yet
+        self._centers = None  # Cumulative weight at each centroid, for queries
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + sum(w for _, w in self._buffer)
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append((float(value), float(weight)))
+        self.minimum, self.maximum = min(self.minimum, value), max(self.maximum, value)
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        """Fold `other` into this digest."""
+        other._compress()
+        self._buffer.extend(zip(other.means.tolist(), other.weights.tolist()))
+        self.minimum, self.maximum = min(self.minimum, other.minimum), max(self.maximum, other.maximum)
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        values, weights = zip(*self._buffer)
+        self._buffer = []
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        merged_means, merged_weights = [means[0]], [weights[0]]
+        done = 0.0  # Weight of the centroids already closed
+        limit = _k_inverse(_k(0.0) + 1) * total  # A centroid may span one unit of the scale function
+        for mean, weight in zip(means[1:].tolist(), weights[1:].tolist()):
+            if done + merged_weights[-1] + weight <= limit:
+                merged_means[-1] += (mean - merged_means[-1]) * weight / (merged_weights[-1] + weight)
+                merged_weights[-1] += weight
+            else:
+                done += merged_weights[-1]
+                limit = _k_inverse(_k(done / total) + 1) * total
+                merged_means.append(mean)
+                merged_weights.append(weight)
+        self.means, self.weights = np.array(merged_means), np.array(merged_weights)
+        self._centers = None
+
+    def _table(self) -> tuple:
+        self._compress()
+        if self._centers is None:
+            self._centers = np.cumsum(self.weights) - self.weights / 2
+        return self.means, self._centers
+
+    def cdf(self, value: float) -> float:
+        """Share of the observations below `value` (0..1)."""
+        if not len(self.weights) and not self._buffer:
+            return float("nan")
+        means, centers = self._table()
+        if value < self.minimum:
+            return 0.0
+        if value >= self.maximum:
+            return 1.0
+        xs = np.concatenate([[self.minimum], means, [self.maximum]])
+        ys = np.concatenate([[0.0], centers, [self.count]])
+        return float(np.interp(value, xs, ys) / self.count)
+
+    def quantile(self, q: float) -> float:
+        if not len(self.weights) and not self._buffer:
+            return float("nan")
+        means, centers = self._table()
+        xs = np.concatenate([[0.0], centers, [self.count]])
+        ys = np.concatenate([[self.minimum], means, [self.maximum]])
+        return float(np.interp(q * self.count, xs, ys))
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {"means": self.means.round(2).tolist(), "weights": self.weights.tolist(),
+                "min": self.minimum, "max": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TDigest":
+        return cls(data["means"], data["weights"], data["min"], data["max"])
+
+
+class Position(NamedTuple):
+    percentile: int
+    scope: str  # e.g. "sector", "city", "skill" or "all"
+    name: str  # e.g. "FinTech"
+    observations: int
+    median: float
+
+
+def _label(text) -> str:
+    return _SPACES.sub(" ", str(text or "")).strip().lower()
+
+
+def _skills(freelancer: dict) -> list:
+    skills = freelancer.get("top3_skills") or []
+    if isinstance(skills, str):
+        skills = skills.split(",")
+    return [s for s in map(_label, skills) if s]
+
+
+def _rate(freelancer: dict) -> Optional[float]:
+    rate = freelancer.get("daily_rate")
+    if isinstance(rate, list):
+        rate = rate[0] if rate else None
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 < rate < 100_000:
+        return None
+    return float(rate)
+
+
+class RateSketches:
+    """Quantile sketches of observed daily rates, by sector, city and skill."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sketches = {}  # (scope, name) -> TDigest
+        self._seen = OrderedDict()  # Digest of a (freelancer, rate) -> None
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._load()
+        threading.Thread(target=self._save_loop, name="rate-sketch-writer", daemon=True).start()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, sketch in data.get("sketches", {}).items():
+            scope, _, name = key.partition(":")
+            self._sketches[(scope, name)] = TDigest.from_dict(sketch)
+        self._report()
+
+    def observe(self, freelancers: list):
+        """Count the daily rates of matched freelancers (each freelancer once)."""
+        observed = 0
+        with self._lock:
+            for freelancer in freelancers:
+                rate = _rate(freelancer) if isinstance(freelancer, dict) else None
+                if rate is None:
+                    continue
+                identity = _label(freelancer.get("id") or freelancer.get("email") or freelancer.get("name"))
+                if identity:  # Nameless freelancers would all look like the same one
+                    digest = hashlib.sha1(f"{identity}|{rate}".encode("utf-8")).digest()
+                    if digest in self._seen:
+                        continue
+                    self._seen[digest] = None
+                    if len(self._seen) > MAX_SEEN:
+                        self._seen.popitem(last=False)
+                keys = [(ALL, ""), ("sector", _label(freelancer.get("main_sector"))), ("city", _label(freelancer.get("city")))]
+                keys += [("skill", skill) for skill in _skills(freelancer)]
+                for key in keys:
+                    if not key[1] and key[0] != ALL:
+                        continue
+                    sketch = self._sketches.get(key)
+                    if sketch is None:
+                        if len(self._sketches) >= MAX_SKETCHES:
+                            continue  # Memory stays bounded: rare sectors/cities/skills beyond the cap aren't tracked
+                        sketch = self._sketches[key] = TDigest()
+                    sketch.add(rate)
+                observed += 1
+        if observed:
+            metrics.increment("rate_sketch_observations", observed)
+            self._report()
+            self._dirty.set()
+
+    def merge(self, other: "RateSketches"):
+        """Fold the sketches of `other` (e.g. another instance's file) into these."""
+        with self._lock:
+            for key, sketch in other._sketches.items():
+                if key in self._sketches:
+                    self._sketches[key].merge(sketch)
+                elif len(self._sketches) < MAX_SKETCHES:
+                    self._sketches[key] = TDigest.from_dict(sketch.to_dict())
+        self._dirty.set()
+
+    def position(self, rate: float, sector: str = "", city: str = "", skills=()) -> Optional[Position]:
+        """Percentile of `rate` among the observed rates of the most specific scope with enough of them."""
+        candidates = [("sector", _label(sector)), ("city", _label(city))]
+        candidates += [("skill", skill) for skill in _skills({"top3_skills": skills})]
+        candidates.append((ALL, ""))
+        with self._lock:
+            for scope, name in candidates:
+                sketch = self._sketches.get((scope, name))
+                if sketch is not None and sketch.count >= MIN_OBSERVATIONS:
+                    return Position(int(round(100 * sketch.cdf(rate))), scope, name, int(sketch.count),
+                                    round(sketch.quantile(0.5)))
+        return None
+
+    def __len__(self):
+        return len(self._sketches)
+
+    def _report(self):
+        metrics.set_gauge("rate_sketches", len(self._sketches))
+
+    def _save_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(SAVE_EVERY_S)
+            self._dirty.clear()
+            with self._lock:
+                data = {"sketches": {f"{scope}:{name}": sketch.to_dict() for (scope, name), sketch in self._sketches.items()}}
+            try:
+                with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(self.path + ".tmp", self.path)
+            except OSError:
+                pass  # Best effort: the next observations schedule another save
+
+
+_sketches = None
+_sketches_lock = threading.Lock()
+
+
+def get_sketches() -> RateSketches:
+    """The rate sketches of this process, loaded on first use."""
+    global _sketches
+    if _sketches is None:
+        with _sketches_lock:
+            if _sketches is None:
+                _sketches = RateSketches(os.path.join(data_dir("rate_sketch"), "sketches.json"))
+    return _sketches
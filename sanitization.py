@@ -0,0 +1,90 @@
+"""sanitization.py
+
+Fills in the fields the generation endpoints expect, with sensible defaults,
+for freelancer and prospect (company) dictionaries coming from the forms, the
+profile or the match API.
+
+`sanitize_freelancer_data` / `sanitize_prospect_data` handle one dictionary;
+`sanitize_rows` handles a whole batch (e.g. a bulk outreach CSV) in one pass.
+"""
+
+import telemetry
+
+
+# --- FONCTIONS DE SANITISATION MISES À JOUR AVEC LES DERNIERS CHAMPS ET VÉRIFICATIONS DE TYPE ---
+@telemetry.traced("sanitize_freelancer_data")
+def sanitize_freelancer_data(freelancer_dict: dict) -> dict:
+    """Ensures a freelancer dictionary has all necessary fields with default values."""
+    sanitized_data = freelancer_dict.copy()
+    sanitized_data['name'] = sanitized_data.get('name') or "A Professional Freelancer"
+    sanitized_data['title'] = sanitized_data.get('title') or "Freelancer"
+    sanitized_data['main_sector'] = sanitized_data.get('main_sector') or "General Tech"
+
+    top3_skills = sanitized_data.get('top3_skills')
+    if isinstance(top3_skills, list):
+        sanitized_data['top3_skills'] = ", ".join(top3_skills)
+    elif not isinstance(top3_skills, str) or not top3_skills:
+        sanitized_data['top3_skills'] = "Software Development, Data Analysis, Project Management"
+
+    # Ensure daily_rate is a number
+    daily_rate_val = sanitized_data.get('daily_rate')
+    if isinstance(daily_rate_val, list):
+        sanitized_data['daily_rate'] = daily_rate_val[0] if daily_rate_val else 500
+    elif not isinstance(daily_rate_val, (int, float)):
+        sanitized_data['daily_rate'] = 500
+
+    sanitized_data['city'] = sanitized_data.get('city') or "Remote"
+
+    original_remote = sanitized_data.get('remote')
+    if isinstance(original_remote, bool):
+        sanitized_data['remote'] = "Yes" if original_remote else "No"
+    elif isinstance(original_remote, str):
+        sanitized_data['remote'] = "Yes" if original_remote.lower() in ['yes', 'true', 'remote'] else "No"
+    else:
+        sanitized_data['remote'] = "No"
+
+    sanitized_data['mission_statement'] = sanitized_data.get('mission_statement') or "Experienced professional ready to contribute to innovative projects."
+    sanitized_data['preferred_tone'] = sanitized_data.get('preferred_tone') or "Professional"
+    sanitized_data['preferred_style'] = sanitized_data.get('preferred_style') or "Storytelling"
+    return sanitized_data
+
+@telemetry.traced("sanitize_prospect_data")
+def sanitize_prospect_data(prospect_dict: dict) -> dict:
+    """Ensures a prospect (company) dictionary has all necessary fields with default values."""
+    sanitized_data = prospect_dict.copy()
+    sanitized_data['company'] = sanitized_data.get('company') or "A Leading Company"
+    sanitized_data['sector'] = sanitized_data.get('sector') or "Tech / SaaS"
+    sanitized_data['main_contact'] = sanitized_data.get('main_contact') or "Valued Partner"
+    sanitized_data['contact_role'] = sanitized_data.get('contact_role') or "Hiring Manager"
+    sanitized_data['city'] = sanitized_data.get('city') or "Remote"
+    sanitized_data['mission_statement'] = sanitized_data.get('mission_statement') or "Driving innovation and delivering value to clients."
+    sanitized_data['company_size'] = sanitized_data.get('company_size') or "Mid-size"
+
+    sanitized_data['funding_stage'] = sanitized_data.get('funding_stage') or "Undisclosed"
+    sanitized_data['ticket_size_class'] = sanitized_data.get('ticket_size_class') or "Medium"
+
+    sanitized_data['target_tone'] = sanitized_data.get('target_tone') or \
+                                   sanitized_data.get('preferred_tone') or \
+                                   "Professional"
+
+    if 'preferred_tone' in sanitized_data: # Remove if it was a misnamed 'target_tone'
+        del sanitized_data['preferred_tone']
+
+    original_remote = sanitized_data.get('remote')
+    if isinstance(original_remote, bool):
+        sanitized_data['remote'] = original_remote
+    elif isinstance(original_remote, str):
+        sanitized_data['remote'] = original_remote.lower() in ['yes', 'true', 'remote']
+    else:
+        sanitized_data['remote'] = False
+
+    sanitized_data['email'] = sanitized_data.get('email') or "info@example.com"
+
+    return sanitized_data
+
+
+def sanitize_rows(rows: list, kind: str) -> list:
+    """Sanitizes a batch of freelancer or prospect dictionaries row by row, traced as a single span (not one per row)."""
+    sanitize = {"freelancer": sanitize_freelancer_data, "prospect": sanitize_prospect_data}[kind].__wrapped__
+    with telemetry.span("sanitize_rows", kind=kind, rows=len(rows)):
+        return [sanitize(row) for row in rows]
@@ -0,0 +1,128 @@
+"""scheduler.py
+
+Weighted fair queuing of outbound API calls across sessions and traffic classes.
+
+Every API attempt takes a slot from the `FairScheduler` of its endpoint group
+before it goes on the wire: generations share the slots set by the adaptive
+concurrency limit (concurrency.py), matches have a fixed number of their own
+(``match_concurrency``), so a flood of generations can never hold up a search.
+When all slots are taken, calls wait in line and freed slots are handed out in
+weighted fair order (self-clocked fair queuing):
+
+    - each (session, traffic class) pair is a flow; a call gets the finish tag
+      ``max(virtual time, last tag of its flow) + 1 / weight of its class``;
+    - the waiting call with the smallest tag gets the next free slot, and the
+      virtual time moves to that tag.
+
+So every session gets its share whatever another one has queued (ten cards
+opened at once are ten calls in the same flow), and with the weights below an
+interactive call overtakes every queued prefetch or bulk call but those still
+progress when nobody is waiting.
+
+The traffic class of a call comes from the context (`traffic_class`):
+interactive by default; job_queue.py runs prefetch jobs as ``"prefetch"`` and
+bulk_outreach.py runs as ``"bulk"``.
+"""
+
+import contextvars
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+import concurrency
+import metrics
+import telemetry
+from settings import get_int
+
+INTERACTIVE = "interactive"
+PREFETCH = "prefetch"
+BULK = "bulk"
+WEIGHTS = {INTERACTIVE: 16, PREFETCH: 2, BULK: 1}
+MATCH_CONCURRENCY = get_int("match_concurrency", 16)
+
+_traffic_class = contextvars.ContextVar("traffic_class", default=INTERACTIVE)
+
+
+@contextmanager
+def traffic_class(name: str):
+    """Run the API calls of the block under traffic class `name`."""
+    token = _traffic_class.set(name)
+    try:
+        yield
+    finally:
+        _traffic_class.reset(token)
+
+
+def current_traffic_class() -> str:
+    """Traffic class of the API calls made from here."""
+    return _traffic_class.get()
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairScheduler:
+    """Hands out at most `capacity()` concurrent slots, in weighted fair order."""
+
+    def __init__(self, name: str, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.in_flight = 0
+        self._virtual_time = 0.0
+        self._last_finish = {}  # flow -> finish tag of its last call
+        self._waiting = []  # heap of (finish tag, arrival order, waiter)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take a slot for the current session and traffic class, waiting up to `timeout` seconds."""
+        klass = _traffic_class.get()
+        # From the telemetry context rather than the script run: job workers and bulk threads have no script
+        # run, but run in a copy of the context of the session that started them
+        flow = (telemetry.get_context().get("session_id", ""), klass)
+        waiter = _Waiter()
+        with self._lock:
+            finish = max(self._virtual_time, self._last_finish.get(flow, 0.0)) + 1 / WEIGHTS[klass]
+            self._last_finish[flow] = finish
+            heapq.heappush(self._waiting, (finish, next(self._order), waiter))
+            self._dispatch()
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:  # It may have been granted right after the wait timed out
+                    waiter.cancelled = True
+                    self._report()
+                    return False
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting and self.in_flight < self.capacity():
+            finish, _, waiter = heapq.heappop(self._waiting)
+            if waiter.cancelled:
+                continue
+            self.in_flight += 1
+            self._virtual_time = finish
+            waiter.granted = True
+            waiter.event.set()
+        if len(self._last_finish) > 256:
+            # Flows whose tags are behind the virtual time start from it anyway: forget them
+            self._last_finish = {f: t for f, t in self._last_finish.items() if t > self._virtual_time}
+        self._report()
+
+    def _report(self):
+        metrics.set_gauge(f"{self.name}_queued", sum(not w.cancelled for _, _, w in self._waiting))
+
+
+generate_scheduler = FairScheduler("generate", concurrency.generate_limiter.capacity)
+match_scheduler = FairScheduler("match", lambda: MATCH_CONCURRENCY)
@@ -0,0 +1,139 @@
+"""bench_payloads.py
+
+Benchmark of the JSON codecs and compression used by api_client.py.
+
+A "search" is modelled as what one Home page search costs the front-end:
+decoding one match list and encoding one generation payload per card shown.
+For every available codec (stdlib json, orjson, msgspec) and compression
+(identity, gzip, brotli) it prints the bytes on the wire and the CPU time spent
+per search, so the savings of the fast path can be read directly.
+
+Usage:
+    python scripts/bench_payloads.py [--matches 10 200 1000] [--repeat 200]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CARDS_PER_SEARCH = 10
+SECTORS = ["FinTech", "HealthTech", "EdTech", "GreenTech", "Tech / SaaS", "MarTech", "Retail / E-com", "Gaming"]
+SKILLS = ["Python", "Rust", "Solidity", "Kubernetes", "Cloud Security", "Quant Analysis", "FastAPI", "LangChain", "PostgreSQL"]
+WORDS = "we build reliable data products for modern teams across europe with a focus on impact and quality".split()
+
+
+def _sentence(rng, n=25):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_match_list(n: int, seed: int = 0) -> list:
+    """Freelancer matches shaped like the /match_prospect response."""
+    rng = random.Random(seed)
+    return [{
+        "name": f"Freelancer {i}",
+        "title": "Senior Data Engineer",
+        "main_sector": rng.choice(SECTORS),
+        "top3_skills": rng.sample(SKILLS, 3),
+        "daily_rate": rng.randrange(300, 1200, 25),
+        "city": rng.choice(["Paris", "Lyon", "Berlin", "Remote"]),
+        "remote": rng.random() < 0.5,
+        "mission_statement": _sentence(rng, 40),
+        "email": f"freelancer{i}@example.com",
+    } for i in range(n)]
+
+
+def make_generation_payload(seed: int = 0) -> dict:
+    """A /generate_mail_* request body with a previous draft to regenerate."""
+    rng = random.Random(seed)
+    return {
+        "freelance": make_match_list(1, seed)[0],
+        "prospect": {
+            "company": "Acme", "sector": rng.choice(SECTORS), "main_contact": "Valued Partner",
+            "contact_role": "CTO", "city": "Paris", "mission_statement": _sentence(rng, 60),
+            "company_size": "Mid-size", "funding_stage": "Series A", "ticket_size_class": "Medium",
+            "target_tone": "Professional", "remote": True, "email": "info@example.com",
+        },
+        "sender_type": "company",
+        "previous_mail_content": "\n".join(_sentence(rng) for _ in range(12)),
+    }
+
+
+def codecs() -> dict:
+    available = {"json": (lambda o: json.dumps(o).encode("utf-8"), json.loads)}
+    if orjson is not None:
+        available["orjson"] = (orjson.dumps, orjson.loads)
+    if msgspec is not None:
+        available["msgspec"] = (msgspec.json.encode, msgspec.json.decode)
+    return available
+
+
+def compressions() -> dict:
+    available = {"identity": (lambda b: b, lambda b: b), "gzip": (lambda b: gzip.compress(b, 5), gzip.decompress)}
+    if brotli is not None:
+        available["brotli"] = (lambda b: brotli.compress(b, quality=5), brotli.decompress)
+    return available
+
+
+def _cpu_us(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def bench_search(n_matches: int, repeat: int) -> list:
+    """Rows of (codec, compression, wire bytes, client CPU µs) for one search."""
+    matches = make_match_list(n_matches)
+    payloads = [make_generation_payload(i) for i in range(CARDS_PER_SEARCH)]
+    rows = []
+    for codec_name, (dumps, loads) in codecs().items():
+        match_body = dumps(matches)
+        for comp_name, (compress, decompress) in compressions().items():
+            wire_match = compress(match_body)
+            wire_payloads = [compress(dumps(p)) for p in payloads]
+            wire_bytes = len(wire_match) + sum(len(b) for b in wire_payloads)
+
+            def one_search():
+                # The server compresses the match list, we decompress and decode it...
+                loads(decompress(wire_match))
+                # ...then encode (and compress) one generation payload per card
+                for p in payloads:
+                    compress(dumps(p))
+
+            rows.append((codec_name, comp_name, wire_bytes, _cpu_us(one_search, repeat)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--matches", type=int, nargs="+", default=[10, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for n in args.matches:
+        rows = bench_search(n, args.repeat)
+        baseline_bytes, baseline_cpu = next((b, c) for name, comp, b, c in rows if (name, comp) == ("json", "identity"))
+        print(f"\n=== One search: {n} matches + {CARDS_PER_SEARCH} generation payloads ===")
+        print(f"{'codec':<8} {'compression':<12} {'bytes':>10} {'saved':>8} {'CPU µs':>10} {'saved':>8}")
+        for name, comp, wire_bytes, cpu in rows:
+            print(f"{name:<8} {comp:<12} {wire_bytes:>10} {1 - wire_bytes / baseline_bytes:>8.0%} "
+                  f"{cpu:>10.0f} {1 - cpu / baseline_cpu:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""load_test.py
+
+Load test of the front-end: N simulated users driving app_V4.py at once.
+
+The harness starts a stub of the LeadCraftr API (with configurable latencies)
+and a real ``streamlit run app_V4.py`` server pointed at it, then connects
+simulated users to the server over the same websocket protocol the browser
+uses. Each user goes through the app like a person would:
+
+    load -> search -> wait for the drafts -> open a card (change its tone)
+    -> regenerate -> validate -> send -> switch to the Dashboard and back
+
+Every action is timed from the moment the widget change is sent until the
+script run it triggered has finished (reruns triggered by ``st.rerun`` are
+included). Drafts are generated in the background, so the harness polls like
+the browser's auto-refresh does and reports the time until they show up.
+
+After a warm-up user (imports, caches and indexes are loaded once per process
+and would otherwise be billed to the first level), users are ramped up level by
+level (``--users 1 5 10 25``). For each level the report gives p50/p95/p99 per
+action, the server's RSS growth and CPU time per session, and the largest level
+whose rerun p95 (actions that don't wait on the API) stays under
+``--max-p95-ms``: how many concurrent users one front-end instance holds. The machine-readable
+report is written as JSON (``--report``); ``--fail-under N`` exits non-zero if
+that capacity drops below N, to catch regressions in CI.
+
+Usage:
+    python scripts/load_test.py [--users 1 5 10] [--iterations 2] [--generate-latency-ms 1500]
+                                [--report load_test_report.json] [--fail-under 5]
+
+With ``--cassette api.jsonl`` the server replays recorded API traffic (see
+cassette.py) instead of calling the stub, for realistic payloads and latencies.
+
+Only Linux reports server RSS and CPU (they are read from /proc). Needs the
+``websockets`` package on top of the app's requirements (see requirements.txt).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_V4.py")
+SECTORS = ["FinTech", "HealthTech", "EdTech", "GreenTech", "Tech / SaaS", "MarTech", "Retail / E-com", "Gaming"]
+STATEMENT = "Senior Python developer, 8 years building data platforms for fintech scale-ups."
+RERUN_ACTIONS = ["open_card", "validate", "send", "switch_page"]  # Plain reruns, no waiting on the API
+POLL_INTERVAL_S = 1.0  # Same as the auto-refresh of pending drafts (job_queue.POLL_INTERVAL_S)
+POLL_TIMEOUT_S = 60.0
+FINISHED_EARLY_FOR_RERUN = 2  # ForwardMsg.script_finished: another run follows (st.rerun)
+
+
+# ---------------------------------------------------------------- stub API
+
+def make_stub_handler(match_latency_s: float, generate_latency_s: float):
+    class StubAPI(BaseHTTPRequestHandler):
+        """Answers like the LeadCraftr API, after a jittered delay."""
+
+        def log_message(self, *args):
+            pass
+
+        def _answer(self, payload, latency_s: float):
+            time.sleep(latency_s * random.uniform(0.8, 1.2))
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/match_freelance":
+                matches = [{"company": f"Company {i}", "sector": random.choice(SECTORS), "city": "Paris",
+                            "mission_statement": "We build reliable data products for modern teams.",
+                            "company_size": "Mid-size", "email": f"contact{i}@example.com"} for i in range(10)]
+            else:
+                matches = [{"name": f"Freelancer {i}", "title": "Data Engineer", "main_sector": random.choice(SECTORS),
+                            "top3_skills": ["Python", "FastAPI", "PostgreSQL"], "daily_rate": 400 + 25 * i,
+                            "city": "Lyon", "mission_statement": "I ship data pipelines."} for i in range(10)]
+            self._answer(matches, match_latency_s)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            email = "Hello,\n\n" + "We would love to work together on your next data project. " * 8 + "\n\nBest regards"
+            self._answer({"email": email}, generate_latency_s)
+
+    return StubAPI
+
+
+def start_stub_api(match_latency_s: float, generate_latency_s: float) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_stub_handler(match_latency_s, generate_latency_s))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ---------------------------------------------------------------- server
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app_server(api_url: str, data_dir: str, cassette_path: str = None) -> tuple:
+    """Starts `streamlit run app_V4.py`; returns (process, port) once it answers its health check."""
+    port = _free_port()
+    env = {**os.environ, "LEADCRAFTR_API_URL": api_url, "LEADCRAFTR_DATA_DIR": data_dir, "LEADCRAFTR_METRICS_PORT": "0"}
+    if cassette_path:
+        # Lenient: simulated users don't send the exact requests that were recorded, only similar ones
+        env.update(LEADCRAFTR_API_CASSETTE_MODE="replay", LEADCRAFTR_API_CASSETTE=os.path.abspath(cassette_path),
+                   LEADCRAFTR_API_CASSETTE_LENIENT="true")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(120):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process, port
+        except OSError:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("The Streamlit server did not start")
+
+
+def process_usage(pid: int) -> tuple:
+    """(RSS bytes, CPU seconds) of a process, from /proc. (0, 0.0) where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+        return rss, cpu
+    except (OSError, StopIteration):
+        return 0, 0.0
+
+
+# ---------------------------------------------------------------- simulated user
+
+class SimulatedUser:
+    """One browser tab: a websocket session, its widgets and what the last run displayed."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ws = None
+        self.widgets = {}  # widget key or label -> widget id
+        self.values = {}  # widget id -> WidgetState the "browser" keeps sending
+        self.alerts = []  # Texts of the st.info/warning/... of the last run
+        self.errors = 0  # Exceptions displayed by the app
+
+    async def connect(self) -> float:
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, changes: dict = None, trigger: str = None) -> float:
+        """Sends widget changes (key or label -> WidgetState field values), waits for the run(s) to finish."""
+        message = BackMsg()
+        for name, value in (changes or {}).items():
+            widget_id = self.widgets[name]
+            state = WidgetState(id=widget_id, **value)
+            self.values[widget_id] = state
+        states = list(self.values.values())
+        if trigger is not None:
+            states = [s for s in states if s.id != self.widgets[trigger]] + [WidgetState(id=self.widgets[trigger], trigger_value=True)]
+        message.rerun_script.widget_states.widgets.extend(states)
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        self.alerts = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                self._seen(forward.delta.new_element)
+            elif kind == "script_finished" and forward.script_finished != FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - started
+
+    def _seen(self, element):
+        kind = element.WhichOneof("type")
+        if kind == "alert":
+            self.alerts.append(element.alert.body)
+        elif kind == "exception":
+            self.errors += 1
+        else:
+            widget = getattr(element, kind)
+            widget_id = getattr(widget, "id", "")
+            if widget_id.startswith("$$ID-"):
+                key = widget_id.split("-", 2)[2]
+                self.widgets[key if key != "None" else widget.label] = widget_id
+
+    def cards(self) -> list:
+        return [name[len("regen_"):] for name in self.widgets if name.startswith("regen_")]
+
+    async def poll_until(self, pending: str) -> float:
+        """Reruns every POLL_INTERVAL_S while an alert containing `pending` is shown; returns the time it took."""
+        started = time.perf_counter()
+        while any(pending in alert for alert in self.alerts) and time.perf_counter() - started < POLL_TIMEOUT_S:
+            await asyncio.sleep(POLL_INTERVAL_S)
+            await self.rerun()
+        return time.perf_counter() - started
+
+
+async def run_user(url: str, iterations: int, think_s: float, timings: dict):
+    """One simulated user going through the scenario `iterations` times."""
+    def record(action: str, seconds: float):
+        timings.setdefault(action, []).append(seconds)
+
+    async def think():
+        await asyncio.sleep(think_s * random.uniform(0.5, 1.5))
+
+    user = SimulatedUser(url)
+    try:
+        record("load", await user.connect())
+        for _ in range(iterations):
+            await think()
+            record("search", await user.rerun({"Personal statement": {"string_value": STATEMENT}},
+                                              trigger=next(n for n in user.widgets if n.startswith("FormSubmitter:"))))
+            record("drafts_ready", await user.poll_until("Drafting"))
+            cards = user.cards()
+            if not cards:
+                continue
+            card = random.choice(cards)
+            await think()
+            record("open_card", await user.rerun({f"tone_{card}": {"string_array_value": {"data": [random.choice(["Warm", "Direct"])]}}}))
+            await think()
+            elapsed = await user.rerun(trigger=f"regen_{card}")
+            record("regenerate", elapsed + await user.poll_until("Regenerating"))
+            await think()
+            record("validate", await user.rerun(trigger=f"validate_{card}"))
+            if f"send_{card}" in user.widgets:
+                record("send", await user.rerun(trigger=f"send_{card}"))
+            await think()
+            record("switch_page", await user.rerun({"navigation_menu": {"string_value": "📊 Dashboard"}}))
+            record("switch_page", await user.rerun({"navigation_menu": {"string_value": "🏠 Home"}}))
+    except Exception as e:
+        timings.setdefault("_failures", []).append(repr(e))
+    finally:
+        timings.setdefault("_app_errors", []).append(user.errors)
+        await user.close()
+
+
+# ---------------------------------------------------------------- report
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))] if ordered else 0.0
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values, default=0.0) * 1000, 1),
+    }
+
+
+async def run_level(url: str, users: int, iterations: int, think_s: float, server_pid: int) -> dict:
+    timings = {}
+    rss_before, cpu_before = process_usage(server_pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(url, iterations, think_s, timings) for _ in range(users)))
+    wall_s = time.perf_counter() - started
+    rss_after, cpu_after = process_usage(server_pid)
+    reruns = [t for action in RERUN_ACTIONS for t in timings.get(action, [])]
+    return {
+        "users": users,
+        "wall_s": round(wall_s, 1),
+        "actions": {action: summarize(values) for action, values in sorted(timings.items()) if not action.startswith("_")},
+        "rerun": summarize(reruns),
+        "failures": timings.get("_failures", []),
+        "app_errors": sum(timings.get("_app_errors", [])),
+        "server_rss_start_mb": round(rss_before / 2 ** 20, 1),
+        "server_rss_end_mb": round(rss_after / 2 ** 20, 1),
+        "rss_growth_mb_per_session": round((rss_after - rss_before) / 2 ** 20 / users, 2),
+        "cpu_s_per_session": round((cpu_after - cpu_before) / users, 3),
+    }
+
+
+def print_level(level: dict):
+    print(f"\n=== {level['users']} concurrent users ({level['wall_s']} s) ===")
+    print(f"{'action':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for action, s in list(level["actions"].items()) + [("(all reruns)", level["rerun"])]:
+        print(f"{action:<14}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+    print(f"server RSS {level['server_rss_start_mb']} -> {level['server_rss_end_mb']} MiB "
+          f"({level['rss_growth_mb_per_session']} MiB/session), CPU {level['cpu_s_per_session']} s/session, "
+          f"{len(level['failures'])} failed users, {level['app_errors']} app errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10], help="Concurrent users, one level after the other")
+    parser.add_argument("--iterations", type=int, default=2, help="Scenarios per user and level")
+    parser.add_argument("--think-ms", type=float, default=500, help="Mean pause between two actions of a user")
+    parser.add_argument("--match-latency-ms", type=float, default=200, help="Stub API latency of /match_*")
+    parser.add_argument("--generate-latency-ms", type=float, default=1500, help="Stub API latency of /generate_mail_*")
+    parser.add_argument("--max-p95-ms", type=float, default=1000, help="Rerun p95 above which a level counts as degraded")
+    parser.add_argument("--cassette", help="Replay this API cassette instead of using the stub latencies")
+    parser.add_argument("--report", default="load_test_report.json", help="Where to write the JSON report")
+    parser.add_argument("--fail-under", type=int, default=0, help="Exit with status 1 if the capacity is below this many users")
+    args = parser.parse_args()
+
+    api_url = start_stub_api(args.match_latency_ms / 1000, args.generate_latency_ms / 1000)
+    with tempfile.TemporaryDirectory(prefix="leadcraftr-load-") as data_dir:
+        server, port = start_app_server(api_url, data_dir, args.cassette)
+        try:
+            url = f"ws://127.0.0.1:{port}/_stcore/stream"
+            asyncio.run(run_level(url, 1, 1, 0.0, server.pid))  # Warm-up, not reported
+            levels = []
+            for users in args.users:
+                levels.append(asyncio.run(run_level(url, users, args.iterations, args.think_ms / 1000, server.pid)))
+                print_level(levels[-1])
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    healthy = [lv["users"] for lv in levels if lv["rerun"]["p95_ms"] <= args.max_p95_ms and not lv["failures"]]
+    capacity = max(healthy, default=0)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "levels": levels,
+        "capacity_users": capacity,
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nCapacity: {capacity} concurrent users with rerun p95 <= {args.max_p95_ms:.0f} ms (report: {args.report})")
+    if capacity < args.fail_under:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
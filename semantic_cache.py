@@ -0,0 +1,305 @@
+"""semantic_cache.py
+
+Near-duplicate cache of generated emails.
+
+Two requests rarely match byte for byte (a statement edited by a few words, a
+prospect whose mission statement was touched up), so the cache compares inputs
+by similarity instead of by hash:
+
+    - the freelance and prospect fields of a request (tone and style aside) are
+      normalised and cut into character 4-grams; 32 MinHash values of those
+      (16 bits each, "b-bit MinHash") estimate the Jaccard similarity of two
+      requests as the share of equal values;
+    - an LSH index of 8 bands of 4 values finds the candidates in a few table
+      reads: each band is a fixed-size NumPy table (latest entry wins), so a
+      lookup costs the same at 1 000 or 300 000 entries (~0.2 ms, reading the
+      email from disk included);
+    - only requests with the same sender type, tone and style can match, and
+      only requests of the same user (`set_scope`, the page's user key) unless
+      ``semantic_cache_shared`` is on.
+
+The cache is off unless ``semantic_cache`` is set. Entries live in a ring of
+``semantic_cache_max_entries`` (50 000 by default, ~12 MB of tables; the tables
+grow linearly with it); the emails themselves stay on disk
+(``<data_dir>/semantic_cache/entries.jsonl``, signatures included so reopening
+doesn't rehash anything). The app loads it with `warm` on a background thread,
+and script runs only use it once it is `loaded`: no user waits for the load.
+
+Every hit carries a quality flag:
+
+    - ``exact``: same fields, same names: the email is reused as is;
+    - ``near``: similar fields (``semantic_cache_threshold``, 0.9 by default),
+      same names: reused as is;
+    - ``adapted``: similar fields, other sender / company / contact names: the
+      names are swapped, but a text substitution can't be trusted with the
+      final email, so it is only used as the placeholder draft;
+    - ``seed``: similar enough to start from (``semantic_cache_seed_threshold``)
+      but not to send: only used as the placeholder draft (local_draft.py).
+
+A placeholder draft is never sent as is: the page keeps it apart from the
+card's email until the user regenerates or edits it.
+
+Only ``exact`` and ``near`` hits (`REUSABLE`) replace a generation. An email
+written for other names is never handed out unless every old name, first and
+last names included, was found and swapped; otherwise the lookup misses.
+
+A reused email the user regenerates is flagged as rejected and only seeds from
+then on. Hit ratios are reported under the ``semantic_generation`` and
+``semantic_seed`` caches, quality flags as ``semantic_cache_<flag>`` counters
+(metrics.py).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+import metrics
+from settings import data_dir, get_bool, get_float, get_int
+
+ENABLED = get_bool("semantic_cache", False)
+THRESHOLD = get_float("semantic_cache_threshold", 0.9)
+SEED_THRESHOLD = get_float("semantic_cache_seed_threshold", 0.6)
+SHARED = get_bool("semantic_cache_shared", False)  # Reuse emails across users
+MAX_ENTRIES = get_int("semantic_cache_max_entries", 50_000)
+
+NUM_HASHES = 32
+BANDS = 8
+ROWS = NUM_HASHES // BANDS
+EXACT, NEAR, ADAPTED, SEED = "exact", "near", "adapted", "seed"
+REUSABLE = (EXACT, NEAR)
+
+STYLE_FIELDS = ("preferred_tone", "preferred_style", "target_tone")
+IDENTITY_FIELDS = (("freelance", "name"), ("prospect", "company"), ("prospect", "main_contact"))
+
+# Fixed seeds: signatures are persisted, so every process must hash alike
+_rng = np.random.default_rng(20250611)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2 ** 63, BANDS, dtype=np.uint64) | np.uint64(1)
+_TOKEN = re.compile(r"[a-z0-9]+")
+_NAME_PART = re.compile(r"\w{3,}")
+_scope = ContextVar("semantic_cache_scope", default="")
+
+
+def set_scope(key: str):
+    """Entries stored and looked up from this context belong to `key` (e.g. the user key of the page)."""
+    _scope.set(key)
+
+
+class Hit(NamedTuple):
+    email: str
+    similarity: float
+    quality: str
+
+
+def _request_text(freelance: dict, prospect: dict) -> str:
+    parts = []
+    for data in (freelance, prospect):
+        parts.extend(str(data[k]) for k in sorted(data) if k not in STYLE_FIELDS)
+    return " ".join(_TOKEN.findall(" ".join(parts).lower()))
+
+
+def _namespace(sender_type: str, freelance: dict, prospect: dict) -> int:
+    style = [sender_type, "" if SHARED else _scope.get()] + [str(d.get(k, "")) for d in (freelance, prospect) for k in STYLE_FIELDS]
+    return zlib.crc32("|".join(style).encode("utf-8"))
+
+
+def _identity(freelance: dict, prospect: dict) -> list:
+    data = {"freelance": freelance, "prospect": prospect}
+    return [str(data[kind].get(field) or "") for kind, field in IDENTITY_FIELDS]
+
+
+def signature(text: str) -> np.ndarray:
+    """32 16-bit MinHash values over the character 4-grams of `text`."""
+    data = np.frombuffer(text.encode("utf-8").ljust(4), dtype=np.uint8).astype(np.uint64)
+    grams = np.unique((data[:-3] << 24) | (data[1:-2] << 16) | (data[2:-1] << 8) | data[3:])
+    hashed = (grams[None, :] * _MULTIPLIERS[:, None] + _OFFSETS[:, None]) >> np.uint64(48)
+    return hashed.min(axis=1).astype(np.uint16)
+
+
+def _adapt(email: str, old: list, new: list) -> Optional[str]:
+    """`email` with the names of `old` replaced by those of `new`, or None if that can't be done safely.
+
+    Full names are swapped first, then their first and last words ("Dear Marie," for "Marie Curie"); if any
+    word of an old name is still in the email afterwards, the email isn't adapted and None is returned."""
+    kept = {part.lower() for name in new for part in _NAME_PART.findall(name)}
+    for before, after in zip(old, new):
+        if before == after:
+            continue
+        if not before or not after:
+            return None
+        before_parts, after_parts = before.split(), after.split()
+        swaps = [(before, after), (before_parts[0], after_parts[0])]
+        if len(before_parts) > 1:
+            swaps.append((before_parts[-1], after_parts[-1]))
+        for old_text, new_text in swaps:
+            email = re.sub(rf"\b{re.escape(old_text)}\b", new_text.replace("\\", r"\\"), email)
+    left = {part.lower() for name in old for part in _NAME_PART.findall(name)} - kept
+    words = {word.lower() for word in _NAME_PART.findall(email)}
+    return None if left & words else email
+
+
+def _digest(email: str) -> str:
+    return hashlib.sha1(email.encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """Generated emails, looked up by the similarity of the requests that produced them."""
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._slot_bits = max(10, (2 * max_entries - 1).bit_length())
+        self._sigs = np.zeros((max_entries, NUM_HASHES), dtype=np.uint16)
+        self._namespaces = np.zeros(max_entries, dtype=np.uint32)
+        self._offsets = np.full(max_entries, -1, dtype=np.int64)
+        self._table_ids = np.full((BANDS, 1 << self._slot_bits), -1, dtype=np.int32)
+        self._table_checks = np.zeros((BANDS, 1 << self._slot_bits), dtype=np.uint32)
+        self._count = 0
+        self._rejected = set()
+        self._served = OrderedDict()  # digest of a reused email -> entry id
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return min(self._count, self.max_entries)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines, records = [], []
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # Torn last line
+                lines.append(line)
+        if len(lines) > self.max_entries or sum(map(len, lines)) != os.path.getsize(self.path):
+            # Keep what the ring can hold (and drop a torn line), so the file doesn't grow forever
+            lines, records = lines[-self.max_entries:], records[-self.max_entries:]
+            with open(self.path + ".tmp", "wb") as f:
+                f.writelines(lines)
+            os.replace(self.path + ".tmp", self.path)
+        if records:
+            self._insert(np.array([r["ns"] for r in records], dtype=np.uint32),
+                         np.frombuffer(bytes.fromhex("".join(r["sig"] for r in records)), dtype=np.uint16).reshape(-1, NUM_HASHES),
+                         np.cumsum([0] + [len(line) for line in lines[:-1]]))
+        self._report()
+
+    def _band_slots(self, namespaces: np.ndarray, sigs: np.ndarray) -> tuple:
+        """Table slot and check value of every band of `sigs` (shape ``(n, BANDS)`` each)."""
+        bands = sigs.reshape(-1, BANDS, ROWS).astype(np.uint64)
+        packed = bands[..., 0] | (bands[..., 1] << 16) | (bands[..., 2] << 32) | (bands[..., 3] << 48)
+        mixed = (packed ^ np.asarray(namespaces, dtype=np.uint64).reshape(-1, 1)) * _BAND_MIX
+        return (mixed >> np.uint64(64 - self._slot_bits)).astype(np.int64), (mixed & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def _insert(self, namespaces: np.ndarray, sigs: np.ndarray, offsets: np.ndarray):
+        """Add entries in order, the oldest ones making room (and, in the tables, the latest winning)."""
+        entries = (self._count + np.arange(len(sigs))) % self.max_entries
+        self._count += len(sigs)
+        self._sigs[entries] = sigs
+        self._namespaces[entries] = namespaces
+        self._offsets[entries] = offsets
+        self._rejected.difference_update(entries.tolist())
+        slots, checks = self._band_slots(namespaces, sigs)
+        bands = np.broadcast_to(np.arange(BANDS), slots.shape)
+        self._table_ids[bands, slots] = entries[:, None]
+        self._table_checks[bands, slots] = checks
+
+    def _read(self, entry: int) -> dict:
+        with open(self.path, "rb") as f:
+            f.seek(self._offsets[entry])
+            return json.loads(f.readline())
+
+    def lookup(self, sender_type: str, freelance: dict, prospect: dict) -> Optional[Hit]:
+        """The closest previous email for this request, flagged with its quality, or None."""
+        namespace = _namespace(sender_type, freelance, prospect)
+        sig = signature(_request_text(freelance, prospect))
+        slots, checks = self._band_slots(namespace, sig)
+        ids = self._table_ids[np.arange(BANDS), slots[0]]
+        ids = np.unique(ids[(ids >= 0) & (self._table_checks[np.arange(BANDS), slots[0]] == checks[0])])
+        ids = ids[self._namespaces[ids] == namespace]
+        if not len(ids):
+            return None
+        similarities = (self._sigs[ids] == sig).mean(axis=1)
+        best = int(similarities.argmax())
+        entry, similarity = int(ids[best]), float(similarities[best])
+        if similarity < SEED_THRESHOLD:
+            return None
+        record = self._read(entry)
+        identity = _identity(freelance, prospect)
+        email = _adapt(record["email"], record["identity"], identity)
+        if email is None:
+            return None  # Written for other names that couldn't all be swapped: never hand it out
+        if similarity < THRESHOLD or entry in self._rejected:
+            return Hit(email, similarity, SEED)
+        quality = ADAPTED if record["identity"] != identity else EXACT if similarity == 1.0 else NEAR
+        with self._lock:
+            self._served[_digest(email)] = entry
+            while len(self._served) > 10_000:
+                self._served.popitem(last=False)
+        return Hit(email, similarity, quality)
+
+    def store(self, sender_type: str, freelance: dict, prospect: dict, email: str):
+        namespace = _namespace(sender_type, freelance, prospect)
+        sig = signature(_request_text(freelance, prospect))
+        record = {"ns": namespace, "sig": sig.tobytes().hex(), "identity": _identity(freelance, prospect), "email": email}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            self._insert(np.array([namespace], dtype=np.uint32), sig[None, :], np.array([offset]))
+        self._report()
+
+    def reject(self, email: str):
+        """The user asked for another version of `email`: if it was reused, don't reuse its entry again."""
+        with self._lock:
+            entry = self._served.pop(_digest(email), None)
+            if entry is not None:
+                self._rejected.add(entry)
+        if entry is not None:
+            metrics.increment("semantic_cache_rejected")
+
+    def _report(self):
+        metrics.set_gauge("semantic_cache_entries", len(self))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_warming = False
+
+
+def get_cache() -> SemanticCache:
+    """The semantic cache of this process, loaded on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(os.path.join(data_dir("semantic_cache"), "entries.jsonl"))
+    return _cache
+
+
+def warm():
+    """Start loading the cache on a background thread (called on every run: only the first call does anything)."""
+    global _warming
+    if ENABLED and not _warming:
+        with _cache_lock:
+            if _warming:
+                return
+            _warming = True
+        threading.Thread(target=get_cache, name="semantic-cache-loader", daemon=True).start()
+
+
+def loaded() -> Optional[SemanticCache]:
+    """The cache if it is already loaded, else None: for script runs, which must not wait for `warm`."""
+    return _cache
@@ -0,0 +1,178 @@
+"""session_snapshot.py
+
+Session snapshots, so a browser reload doesn't lose the profile, matches and drafts.
+
+Every session gets a resume token in the URL (``?resume=<token>``). A reload
+starts a new Streamlit session with an empty `st.session_state`, but keeps the
+URL: `resume` then restores the last snapshot saved under the token, before the
+page is drawn, so the Home page comes back with its matches and drafts without
+calling the back-end again.
+
+Snapshots are cheap for reruns. `save`, at the end of each run, serialises the
+`SNAPSHOT_KEYS` of the session and compares a checksum per key with the last
+save, so only the parts that changed are queued. Writes happen in a background
+thread, at most every `DEBOUNCE_S` seconds per batch: the parts are
+zlib-compressed there and upserted in SQLite (``<data_dir>/snapshots.sqlite3``,
+one row per token and key). Snapshots untouched for ``snapshot_ttl_days`` (7 by
+default) are deleted.
+
+The token is the only credential to a snapshot, so it is random (128 bits) and
+only read from the URL of a fresh session.
+"""
+
+import json
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+
+import streamlit as st
+
+from api_client import json_dumps
+from settings import data_dir, get_float
+
+QUERY_PARAM = "resume"
+TOKEN_KEY = "snapshot_token"
+DIGESTS_KEY = "snapshot_digests"
+SNAPSHOT_KEYS = [
+    "page", "user_type", "profile_created", "user_profile_data", "freelancer_tjm", "welcome_message_shown",
+    "total_time_saved", "total_money_saved",
+    "freelancer_matches", "freelancer_form_submitted", "freelancer_email_sent_states",
+    "company_matches", "company_form_submitted", "company_email_sent_states",
+]
+DEBOUNCE_S = 1.0
+TTL_S = get_float("snapshot_ttl_days", 7) * 86400
+PRUNE_EVERY_S = 3600
+_TOKEN = re.compile(r"^[A-Za-z0-9_-]{22,64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot_parts (
+    token TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (token, key)
+);
+CREATE INDEX IF NOT EXISTS snapshot_parts_updated ON snapshot_parts (updated);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class SnapshotStore:
+    """Debounced writer and reader of session snapshots."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        with closing(_connect(path)) as connection:
+            connection.executescript(_SCHEMA)
+        threading.Thread(target=self._write_loop, name="snapshot-writer", daemon=True).start()
+
+    def enqueue(self, token: str, parts: dict):
+        """Queue the changed `parts` (key -> JSON bytes) of a snapshot. Never blocks."""
+        self._queue.put((token, parts))
+
+    def _write_loop(self):
+        connection = _connect(self.path)
+        pruned_at = 0.0
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(DEBOUNCE_S)
+            while not self._queue.empty():
+                batch.append(self._queue.get())
+            latest = {}  # Only the last version of each part is worth writing
+            for token, parts in batch:
+                for key, data in parts.items():
+                    latest[(token, key)] = data
+            now = time.time()
+            try:
+                with connection:
+                    connection.executemany(
+                        "INSERT INTO snapshot_parts (token, key, data, updated) VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT (token, key) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                        [(token, key, zlib.compress(data), now) for (token, key), data in latest.items()])
+                    if now - pruned_at > PRUNE_EVERY_S:
+                        pruned_at = now
+                        connection.execute(
+                            "DELETE FROM snapshot_parts WHERE token IN"
+                            " (SELECT token FROM snapshot_parts GROUP BY token HAVING MAX(updated) < ?)", (now - TTL_S,))
+            except sqlite3.Error:
+                pass  # Snapshots are best effort: never take the app down for them
+
+    def load(self, token: str) -> dict:
+        """The last saved snapshot of `token` (key -> value), {} if there is none."""
+        # Read once per session, from a fresh script thread: the connection is closed right away
+        with closing(_connect(self.path)) as connection:
+            rows = connection.execute(
+                "SELECT key, data FROM snapshot_parts WHERE token = ? AND updated >= ?", (token, time.time() - TTL_S)
+            ).fetchall()
+        return {key: json.loads(zlib.decompress(data)) for key, data in rows}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SnapshotStore:
+    """The snapshot store of this process, opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SnapshotStore(os.path.join(data_dir(), "snapshots.sqlite3"))
+    return _store
+
+
+def resume():
+    """On the first run of a session, restore the snapshot of the URL's resume token (or issue a new token)."""
+    if TOKEN_KEY in st.session_state:
+        return
+    token = st.query_params.get(QUERY_PARAM, "")
+    snapshot = {}
+    if _TOKEN.match(token):
+        try:
+            snapshot = get_store().load(token)
+        except (sqlite3.Error, ValueError, zlib.error):
+            snapshot = {}
+    if snapshot:
+        for key in SNAPSHOT_KEYS:
+            if key in snapshot:
+                st.session_state[key] = snapshot[key]
+    else:
+        token = secrets.token_urlsafe(16)
+        st.query_params[QUERY_PARAM] = token
+    st.session_state[TOKEN_KEY] = token
+    st.session_state[DIGESTS_KEY] = {}
+
+
+def save():
+    """Queue the parts of this session's snapshot that changed since the last save."""
+    token = st.session_state.get(TOKEN_KEY)
+    if token is None:
+        return
+    digests = st.session_state[DIGESTS_KEY]
+    changed = {}
+    for key in SNAPSHOT_KEYS:
+        if key not in st.session_state:
+            continue
+        try:
+            data = json_dumps(st.session_state[key])
+        except TypeError:
+            continue  # Not JSON-friendly: not worth restoring
+        digest = zlib.crc32(data)
+        if digests.get(key) != digest:
+            digests[key] = digest
+            changed[key] = data
+    if changed:
+        get_store().enqueue(token, changed)
@@ -0,0 +1,59 @@
+"""settings.py
+
+Runtime settings shared by the LeadCraftr front-end modules.
+
+A setting called ``match_deadline_s`` is looked up, in order, in:
+
+    1. the environment variable ``LEADCRAFTR_MATCH_DEADLINE_S``
+    2. ``st.secrets["match_deadline_s"]`` (see `.streamlit/secrets.toml.sample`)
+    3. the default passed by the caller
+
+Nothing in here renders anything, so it is safe to import from helper modules
+and background threads.
+"""
+
+import os
+
+import streamlit as st
+
+
+def get_setting(name: str, default=None):
+    """Return the raw value of a setting, or `default` when it is not configured."""
+    env_value = os.environ.get(f"LEADCRAFTR_{name.upper()}")
+    if env_value is not None:
+        return env_value
+    try:
+        return st.secrets[name]
+    except Exception:  # No secrets.toml, or key missing
+        return default
+
+
+def get_float(name: str, default: float) -> float:
+    """Same as `get_setting` but always returns a float."""
+    try:
+        return float(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_int(name: str, default: int) -> int:
+    """Same as `get_setting` but always returns an int."""
+    try:
+        return int(get_setting(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_bool(name: str, default: bool = False) -> bool:
+    """Same as `get_setting` but understands "1", "true", "yes" and "on"."""
+    value = get_setting(name, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ["1", "true", "yes", "on"]
+
+
+def data_dir(*parts: str) -> str:
+    """Local directory for the files the front-end writes (traces, caches, ...), created on demand."""
+    path = os.path.join(get_setting("data_dir", ".leadcraftr"), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,62 @@
+"""speculative.py
+
+Speculative generation of the next "🔄 Regenerate" variant of a card.
+
+Once a card is open and shows a draft (with generations left), the page calls
+`prefetch` with the request the Regenerate button would send next: closed cards
+don't cost a second generation each. It is queued at
+low priority on the background job queue (see job_queue.py), so when the user
+does click Regenerate, `claim` usually finds a finished draft and the card
+updates instantly; if it is still running, `claim` moves it up the queue instead
+of starting a second call. A speculative draft is only used if the request it
+was made for is still the one the button would send (same tone, same sender,
+same current draft): that is checked with a fingerprint.
+
+Unused drafts are discarded when the card is sent (`discard`), when a new search
+starts (`job_queue.cancel_session`) or after `job_queue.RESULT_TTL_S`. Requests
+already on the wire can't be recalled; their result is simply dropped.
+"""
+
+import hashlib
+import json
+
+import job_queue
+import metrics
+
+CACHE_NAME = "speculative_regeneration"
+
+
+def fingerprint(*parts) -> str:
+    """Stable digest of the arguments of a generation request."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def job_key(card_id: str) -> tuple:
+    """Job queue key of the speculative draft of a card (e.g. for `job_queue.rerun_when_done`)."""
+    return ("next_variant", card_id)
+
+
+def prefetch(card_id: str, request_fingerprint: str, fn, *args, **kwargs):
+    """Queue `fn(*args, **kwargs)` in the background for this card, unless it is already queued or done."""
+    job_queue.submit(job_key(card_id), request_fingerprint, fn, *args, priority=job_queue.PRIORITY_PREFETCH, **kwargs)
+
+
+def claim(card_id: str, request_fingerprint: str, fn, *args, **kwargs) -> job_queue.Job:
+    """The user wants this variant now: the prefetched job if there is one, else a new interactive job."""
+    job = job_queue.get(job_key(card_id))
+    if job is not None and job.fingerprint == request_fingerprint:
+        metrics.cache_hit(CACHE_NAME)
+    else:
+        metrics.cache_miss(CACHE_NAME)
+    return job_queue.submit(job_key(card_id), request_fingerprint, fn, *args, **kwargs)
+
+
+def claimed(card_id: str, request_fingerprint: str):
+    """The job of an earlier `claim` for this exact request, or None."""
+    job = job_queue.get(job_key(card_id))
+    return job if job is not None and job.fingerprint == request_fingerprint else None
+
+
+def discard(card_id: str):
+    """Drop the speculative draft of a card (e.g. once its email is sent or its draft collected)."""
+    job_queue.cancel(job_key(card_id))
@@ -0,0 +1,263 @@
+"""telemetry.py
+
+Lightweight, always-on tracing for the LeadCraftr front-end.
+
+Spans are opened with the `span` context manager (or the `traced` decorator)
+and are tagged with the current session id and page. Finished spans are:
+
+    - appended by a background thread to ``<data_dir>/traces.jsonl``, one
+      OTLP-style JSON span per line (traceId, spanId, parentSpanId, name,
+      start/end in unix nanoseconds, attributes, status);
+    - aggregated per (span, page) and served in the Prometheus text format on
+      ``http://localhost:<metrics_port>/metrics`` (9464 by default, 0 disables it),
+      next to the endpoint and cache metrics of metrics.py.
+
+A Streamlit rerun is traced as one ``script.run`` span split into sections:
+
+    telemetry.begin_run(page="🏠 Home")
+    telemetry.section("sidebar")
+    ...
+    telemetry.end_run()
+
+`st.rerun()` and `st.stop()` end a script run with an exception, so a run that
+is still open when the same session starts a new one is closed as "interrupted".
+"""
+
+import contextvars
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from settings import data_dir, get_int
+
+TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024  # Rotated to traces.jsonl.1 past this size
+EXPORT_INTERVAL_S = 1.0
+METRICS_PORT = get_int("metrics_port", 9464)
+
+_context = contextvars.ContextVar("leadcraftr_telemetry_context", default={})
+_current_span = contextvars.ContextVar("leadcraftr_current_span", default=None)
+
+_export_queue = queue.SimpleQueue()
+_aggregates = {}  # (span name, page) -> [count, errors, total seconds]
+_aggregates_lock = threading.Lock()
+_open_runs = {}  # session id -> (run span, section span) of the script run in progress
+_started = False
+_start_lock = threading.Lock()
+
+
+def current_session_id() -> str:
+    """Id of the Streamlit session running in this thread, or "" outside of a script run."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return ""
+    return ctx.session_id if ctx is not None else ""
+
+
+def set_context(**tags):
+    """Add tags (e.g. session_id, page) to every span opened from now on in this context."""
+    _context.set({**_context.get(), **tags})
+
+
+def get_context() -> dict:
+    return dict(_context.get())
+
+
+class Span:
+    """One timed operation. Use `span()` rather than instantiating this directly."""
+
+    def __init__(self, name: str, parent=None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else ""
+        self.attributes = {**_context.get(), **attributes}
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration_s = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, status: str = None):
+        if self.duration_s is not None:
+            return
+        self.duration_s = time.perf_counter() - self._start
+        if status is not None:
+            self.status = status
+        _record(self)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the enclosed block as a child of the current span."""
+    current = Span(name, parent=_current_span.get(), **attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        # st.rerun()/st.stop() raise BaseExceptions: the run was cut short, not broken
+        current.end(status="error" if isinstance(e, Exception) else "interrupted")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name: str):
+    """Decorator version of `span`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ====== SCRIPT RUNS ======
+def begin_run(**attributes):
+    """Open the root span of a Streamlit script run for the current session."""
+    _ensure_started()
+    session_id = current_session_id()
+    metrics.touch_session(session_id)
+    set_context(session_id=session_id, **attributes)
+    _close_run(session_id, status="interrupted")
+    run = Span("script.run")
+    _current_span.set(run)
+    _open_runs[session_id] = (run, None)
+
+
+def section(name: str):
+    """End the current section of the script run (if any) and start a new one."""
+    session_id = current_session_id()
+    if session_id not in _open_runs:
+        return
+    run, previous = _open_runs[session_id]
+    if previous is not None:
+        previous.end()
+    current = Span(f"script.{name}", parent=run)
+    _current_span.set(current)  # API calls made in this section are traced as its children
+    _open_runs[session_id] = (run, current)
+
+
+def end_run():
+    """Close the script run of the current session."""
+    _close_run(current_session_id(), status="ok")
+
+
+def _close_run(session_id: str, status: str):
+    run, current_section = _open_runs.pop(session_id, (None, None))
+    if run is None:
+        return
+    run.set(**_context.get())  # Picks up tags set during the run, e.g. the page picked in the sidebar
+    if current_section is not None:
+        current_section.end(status=status)
+    run.end(status=status)
+
+
+# ====== EXPORT ======
+def _record(finished: Span):
+    page = finished.attributes.get("page", "")
+    with _aggregates_lock:
+        stats = _aggregates.setdefault((finished.name, page), [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += finished.status == "error"
+        stats[2] += finished.duration_s
+    _export_queue.put(finished)
+
+
+def _to_otlp(finished: Span) -> dict:
+    return {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "parentSpanId": finished.parent_id,
+        "name": finished.name,
+        "startTimeUnixNano": finished.start_ns,
+        "endTimeUnixNano": finished.start_ns + int(finished.duration_s * 1e9),
+        "attributes": {k: v if isinstance(v, (str, int, float, bool)) else str(v) for k, v in finished.attributes.items()},
+        "status": finished.status,
+    }
+
+
+def _export_loop():
+    path = os.path.join(data_dir(), "traces.jsonl")
+    while True:
+        batch = [_export_queue.get()]
+        time.sleep(EXPORT_INTERVAL_S)  # Let a few more spans pile up: one write per interval
+        while not _export_queue.empty():
+            batch.append(_export_queue.get())
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > TRACE_FILE_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(_to_otlp(s), ensure_ascii=False) + "\n" for s in batch)
+        except OSError:
+            pass  # Tracing must never break the app
+
+
+def prometheus_text() -> str:
+    """Current span aggregates in the Prometheus text exposition format."""
+    lines = [
+        "# HELP leadcraftr_span_duration_seconds Time spent in traced operations.",
+        "# TYPE leadcraftr_span_duration_seconds summary",
+    ]
+    with _aggregates_lock:
+        snapshot = sorted(_aggregates.items())
+    for (name, page), (count, _, total) in snapshot:
+        labels = f'span="{name}",page="{_escape(page)}"'
+        lines.append(f"leadcraftr_span_duration_seconds_count{{{labels}}} {count}")
+        lines.append(f"leadcraftr_span_duration_seconds_sum{{{labels}}} {total:.6f}")
+    lines.append("# HELP leadcraftr_span_errors_total Traced operations that raised.")
+    lines.append("# TYPE leadcraftr_span_errors_total counter")
+    for (name, page), (_, errors, _) in snapshot:
+        lines.append(f'leadcraftr_span_errors_total{{span="{name}",page="{_escape(page)}"}} {errors}')
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = (prometheus_text() + metrics.prometheus_text()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _ensure_started():
+    """Start the exporter thread and the metrics endpoint, once per process."""
+    global _started
+    if _started:
+        return
+    with _start_lock:
+        if _started:
+            return
+        threading.Thread(target=_export_loop, name="telemetry-exporter", daemon=True).start()
+        if METRICS_PORT:
+            try:
+                server = ThreadingHTTPServer(("127.0.0.1", METRICS_PORT), _MetricsHandler)
+                threading.Thread(target=server.serve_forever, name="telemetry-metrics", daemon=True).start()
+            except OSError:
+                pass  # Port taken, e.g. by another Streamlit process: spans are still written to disk
+        _started = True
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The modules live at the repository root, next to app_V4.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LEADCRAFTR_METRICS_PORT", "0")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Every test writes its databases, logs and caches to its own directory."""
+    monkeypatch.setenv("LEADCRAFTR_DATA_DIR", str(tmp_path))
+    return tmp_path
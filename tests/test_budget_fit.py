@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import budget_fit
+from daily_rate_page_NEW import (BASE_RATE, EXPERIENCE_MULTIPLIERS, INDUSTRY_ADJUSTMENTS, LOCATION_ADJUSTMENTS,
+                                 SKILL_ADJUSTMENTS, SPECIALIZATION_ADJUSTMENTS)
+
+
+def test_fit_is_full_within_budget_and_drops_linearly_above_it():
+    scores = budget_fit.fit_scores(np.array([300.0, 500.0, 625.0, 750.0, 900.0]), 500)
+
+    assert scores.tolist() == [1.0, 1.0, 0.5, 0.0, 0.0]
+
+
+@pytest.mark.parametrize("budget", [0, None, -100])
+def test_without_a_budget_everyone_fits(budget):
+    assert budget_fit.fit_scores(np.array([300.0, 3000.0]), budget).tolist() == [1.0, 1.0]
+
+
+def test_rank_sorts_by_fit_and_keeps_the_api_order_among_equals():
+    freelancers = [
+        {"name": "Too expensive", "daily_rate": 900},
+        {"name": "First fit", "daily_rate": 400},
+        {"name": "Slightly over", "daily_rate": 600},
+        {"name": "Second fit", "daily_rate": 450},
+    ]
+
+    ranked = budget_fit.rank(freelancers, 500)
+
+    assert [f["name"] for f in ranked] == ["First fit", "Second fit", "Slightly over", "Too expensive"]
+    assert [f["budget_fit"] for f in ranked] == [1.0, 1.0, 0.6, 0.0]
+    assert ranked[2]["expected_daily_rate"] == 600 and not ranked[2]["daily_rate_estimated"]
+
+
+def test_missing_rate_is_estimated_with_the_calculator_multipliers():
+    freelancer = {"title": "Senior Data Engineer", "top3_skills": ["Python", "Spark"], "city": "Paris",
+                  "main_sector": "Fintech", "years_experience": 7}
+
+    rates, estimated = budget_fit.expected_rates([freelancer])
+
+    expected = (BASE_RATE * EXPERIENCE_MULTIPLIERS[7] * SKILL_ADJUSTMENTS["Senior"]
+                * SPECIALIZATION_ADJUSTMENTS["Data Science/ML"] * LOCATION_ADJUSTMENTS["France (Paris)"]
+                * INDUSTRY_ADJUSTMENTS["Finance/Banking"])
+    assert rates[0] == round(expected / budget_fit.RATE_STEP) * budget_fit.RATE_STEP
+    assert estimated.tolist() == [True]
+
+
+@pytest.mark.parametrize("rate", [None, "", "n/a", 0, -50, []])
+def test_unusable_rates_are_estimated(rate):
+    _, estimated = budget_fit.expected_rates([{"daily_rate": rate}])
+
+    assert estimated.tolist() == [True]
+
+
+def test_rate_given_as_a_list_or_string_is_used():
+    rates, estimated = budget_fit.expected_rates([{"daily_rate": [550]}, {"daily_rate": "480"}])
+
+    assert rates.tolist() == [550, 480] and estimated.tolist() == [False, False]
+
+
+@pytest.mark.parametrize("classify, text, category", [
+    (budget_fit._location_category, "kyiv, ukraine", "France (Other cities)"),  # Not the UK
+    (budget_fit._location_category, "london", "UK"),
+    (budget_fit._specialization_category, " build engineer ", "General Development"),  # Not UI/UX
+    (budget_fit._specialization_category, " product designer ", "UI/UX Design"),
+    (budget_fit._industry_category, "financial services", "Finance/Banking"),
+    (budget_fit._skill_category, " sr. developer ", "Senior"),
+])
+def test_keywords_match_whole_words(classify, text, category):
+    assert classify(text) == category
+
+
+def test_describe_labels_estimates_and_overruns():
+    assert budget_fit.describe({"expected_daily_rate": 450, "daily_rate_estimated": False}, 500) == \
+        "€450/day · within budget"
+    assert budget_fit.describe({"expected_daily_rate": 600, "daily_rate_estimated": True}, 500) == \
+        "~€600/day · 20% over budget"
+    assert budget_fit.describe({"name": "Not ranked"}, 500) == ""
+
+
+def test_rank_of_nobody_is_empty():
+    assert budget_fit.rank([], 500) == []
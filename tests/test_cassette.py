@@ -0,0 +1,100 @@
+import gzip
+import json
+import time
+
+import pytest
+import requests
+
+from cassette import Cassette, CassetteMiss, request_hash
+
+
+def response(status: int, body: dict) -> requests.Response:
+    recorded = requests.Response()
+    recorded.status_code = status
+    recorded.headers["Content-Type"] = "application/json"
+    recorded._content = json.dumps(body).encode()
+    return recorded
+
+
+@pytest.fixture
+def path(data_dir):
+    return str(data_dir / "api.jsonl")
+
+
+def test_request_hash_ignores_how_the_body_was_encoded():
+    body = {"prospect": {"company": "Acme"}, "sender_type": "freelancer"}
+    plain = json.dumps(body).encode()
+    reordered = json.dumps(dict(reversed(body.items())), separators=(",", ":")).encode()
+
+    assert request_hash("POST", "/generate", data=plain) == request_hash("POST", "/generate", data=reordered)
+    assert request_hash("POST", "/generate", data=plain) == request_hash(
+        "POST", "/generate", data=gzip.compress(plain), headers={"Content-Encoding": "gzip"})
+    assert request_hash("POST", "/generate", data=plain) != request_hash("POST", "/other", data=plain)
+    assert request_hash("GET", "/match", params={"q": "a"}) != request_hash("GET", "/match", params={"q": "b"})
+
+
+def test_recording_is_replayed_by_a_new_process(path):
+    Cassette(path).record("k1", "/generate", response(200, {"email": "Hi"}), elapsed_s=1.5)
+
+    replayed = Cassette(path).replay("k1", "/generate", timeout=5, speed=0)
+
+    assert replayed.status_code == 200
+    assert replayed.json() == {"email": "Hi"}
+    assert replayed.headers["content-type"] == "application/json"
+
+
+def test_requests_recorded_several_times_are_replayed_in_turn(path):
+    cassette = Cassette(path)
+    for i in range(2):
+        cassette.record("k1", "/generate", response(200, {"email": f"Draft {i}"}), elapsed_s=0)
+
+    emails = [cassette.replay("k1", "/generate", timeout=5, speed=0).json()["email"] for _ in range(3)]
+
+    assert emails == ["Draft 0", "Draft 1", "Draft 0"]
+
+
+def test_request_never_recorded_fails_like_an_unreachable_back_end(path):
+    cassette = Cassette(path)
+    cassette.record("k1", "/generate", response(200, {"email": "Hi"}), elapsed_s=0)
+
+    with pytest.raises(CassetteMiss):
+        cassette.replay("k2", "/generate", timeout=5, speed=0)
+    assert issubclass(CassetteMiss, requests.ConnectionError)
+
+
+def test_lenient_replay_answers_with_a_recording_of_the_same_endpoint(path):
+    cassette = Cassette(path)
+    cassette.record("k1", "/generate", response(200, {"email": "Hi"}), elapsed_s=0)
+
+    assert cassette.replay("k2", "/generate", timeout=5, speed=0, lenient=True).json() == {"email": "Hi"}
+    with pytest.raises(CassetteMiss):
+        cassette.replay("k2", "/match", timeout=5, speed=0, lenient=True)
+
+
+def test_recorded_latency_is_scaled_by_the_replay_speed(path):
+    cassette = Cassette(path)
+    cassette.record("k1", "/generate", response(200, {}), elapsed_s=0.1)
+
+    started = time.monotonic()
+    cassette.replay("k1", "/generate", timeout=5, speed=2)
+
+    assert 0.2 <= time.monotonic() - started < 1
+
+
+def test_recorded_latency_beyond_the_timeout_times_out(path):
+    cassette = Cassette(path)
+    cassette.record("k1", "/generate", response(200, {}), elapsed_s=10)
+
+    with pytest.raises(requests.Timeout):
+        cassette.replay("k1", "/generate", timeout=0.05, speed=1)
+
+
+def test_torn_last_line_of_an_interrupted_recording_is_ignored(path):
+    Cassette(path).record("k1", "/generate", response(200, {"email": "Hi"}), elapsed_s=0)
+    with open(path, "ab") as f:
+        f.write(b'{"key": "k2", "endpoint": "/gen')
+
+    cassette = Cassette(path)
+
+    assert len(cassette) == 1
+    assert cassette.replay("k1", "/generate", timeout=5, speed=0).json() == {"email": "Hi"}
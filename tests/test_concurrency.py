@@ -0,0 +1,70 @@
+import pytest
+
+from concurrency import BACKOFF, DROPPED, IGNORED, LATENCY_BACKOFF, OK, AdaptiveLimiter
+
+
+@pytest.fixture
+def limiter():
+    return AdaptiveLimiter("test", initial=4, min_limit=1, max_limit=8)
+
+
+def test_limit_grows_by_about_one_call_per_round_trip_while_used(limiter):
+    for _ in range(4):  # One round trip at a limit of 4
+        limiter.record(0.1, OK, in_flight=4)
+
+    assert limiter.capacity() == 4
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+
+
+def test_unused_limit_does_not_grow(limiter):
+    for _ in range(20):
+        limiter.record(0.1, OK, in_flight=1)
+
+    assert limiter.limit == 4
+
+
+def test_limit_stops_at_its_maximum(limiter):
+    for _ in range(200):
+        limiter.record(0.1, OK, in_flight=8)
+
+    assert limiter.limit == 8
+
+
+def test_dropped_call_cuts_the_limit(limiter):
+    limiter.record(0.0, DROPPED, in_flight=4)
+
+    assert limiter.limit == 4 * BACKOFF
+
+
+def test_a_burst_of_errors_is_one_decrease_per_round_trip(limiter):
+    limiter.record(5.0, OK, in_flight=1)  # Round trips take 5 s
+
+    for _ in range(10):
+        limiter.record(5.0, DROPPED, in_flight=4)
+
+    assert limiter.limit == 4 * BACKOFF
+
+
+def test_limit_stops_at_its_minimum(limiter):
+    for _ in range(50):
+        limiter.record(0.0, DROPPED, in_flight=4)
+
+    assert limiter.capacity() == 1
+
+
+def test_rising_latency_cuts_the_limit_once_per_round_trip(limiter):
+    limiter.record(0.1, OK, in_flight=4)
+
+    for _ in range(5):
+        limiter.record(1.0, OK, in_flight=4)
+
+    assert limiter.baseline_rtt == pytest.approx(0.1, abs=0.01)
+    assert limiter.recent_rtt > 1.5 * limiter.baseline_rtt
+    assert limiter.limit == pytest.approx((4 + 1 / 4) * LATENCY_BACKOFF)
+
+
+def test_calls_that_say_nothing_about_load_leave_the_limit_alone(limiter):
+    for _ in range(10):
+        limiter.record(0.01, IGNORED, in_flight=4)
+
+    assert limiter.limit == 4 and limiter.baseline_rtt is None
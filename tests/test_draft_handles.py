@@ -0,0 +1,87 @@
+import contextvars
+
+import pytest
+
+import draft_handles
+import telemetry
+
+FREELANCE = {"name": "Ana", "title": "Data engineer", "preferred_tone": "Professional"}
+PROSPECT = {"company": "Acme", "sector": "FinTech"}
+
+
+@pytest.fixture(autouse=True)
+def handles(monkeypatch):
+    monkeypatch.setattr(draft_handles, "_handles", draft_handles.OrderedDict())
+
+
+def in_session(session_id: str, fn, *args, **kwargs):
+    def run():
+        telemetry.set_context(session_id=session_id)
+        return fn(*args, **kwargs)
+    return contextvars.copy_context().run(run)
+
+
+def test_regeneration_sends_the_handle_and_only_what_changed():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT)
+    warmer = {**FREELANCE, "preferred_tone": "Warm"}
+
+    payload = in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", warmer, PROSPECT, "Hi Acme")
+
+    assert payload == {"draft_handle": "h-1", "sender_type": "freelancer",
+                       "changes": {"freelance": {"preferred_tone": "Warm"}, "prospect": {}}}
+
+
+def test_removed_fields_are_sent_as_none():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT)
+
+    payload = in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", FREELANCE, {"company": "Acme"},
+                         "Hi Acme")
+
+    assert payload["changes"]["prospect"] == {"sector": None}
+
+
+@pytest.mark.parametrize("session, card, sender_type, draft", [
+    ("s2", "card-1", "freelancer", "Hi Acme"),  # Another session showing the same text
+    ("s1", "card-2", "freelancer", "Hi Acme"),  # Another card of the same session
+    ("s1", "card-1", "company", "Hi Acme"),
+    ("s1", "card-1", "freelancer", "Hi Acme, edited"),
+])
+def test_handle_is_only_used_for_the_draft_it_produced(session, card, sender_type, draft):
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT)
+
+    assert in_session(session, draft_handles.compact_payload, card, sender_type, FREELANCE, PROSPECT, draft) is None
+
+
+def test_expired_handle_is_never_sent():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT, ttl_s=-1)
+
+    assert in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", FREELANCE, PROSPECT, "Hi Acme") is None
+
+
+def test_forgotten_handle_falls_back_to_the_full_payload():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT)
+    in_session("s1", draft_handles.forget, "card-1", "Hi Acme")
+
+    assert in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", FREELANCE, PROSPECT, "Hi Acme") is None
+
+
+def test_too_many_changes_send_the_full_payload():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", "h-1", "freelancer", FREELANCE, PROSPECT)
+    rewritten = {f"field_{i}": i for i in range(draft_handles.MAX_CHANGED_FIELDS)}
+
+    assert in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", rewritten, PROSPECT, "Hi Acme") is None
+
+
+def test_oldest_handles_are_dropped_past_the_cap(monkeypatch):
+    monkeypatch.setattr(draft_handles, "MAX_HANDLES", 2)
+    for i in range(3):
+        in_session("s1", draft_handles.remember, "card-1", f"draft {i}", f"h-{i}", "freelancer", FREELANCE, PROSPECT)
+
+    assert in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", FREELANCE, PROSPECT, "draft 0") is None
+    assert in_session("s1", draft_handles.compact_payload, "card-1", "freelancer", FREELANCE, PROSPECT, "draft 2")
+
+
+def test_drafts_without_a_handle_are_not_remembered():
+    in_session("s1", draft_handles.remember, "card-1", "Hi Acme", None, "freelancer", FREELANCE, PROSPECT)
+
+    assert not draft_handles._handles
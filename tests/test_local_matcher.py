@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import local_matcher
+from local_matcher import LocalIndex, LocalMatcher, build_index
+
+COMPANIES = [
+    {"company": "Ledgerly", "sector": "FinTech", "mission_statement": "Payments infrastructure for banks"},
+    {"company": "Carebase", "sector": "Healthcare", "mission_statement": "Patient records for clinics"},
+    {"company": "Shopwise", "sector": "E-commerce", "mission_statement": "Checkout and payments for online shops"},
+    {"company": "Fieldnote", "sector": "AgriTech", "mission_statement": "Crop data for farmers"},
+]
+
+
+@pytest.fixture(autouse=True)
+def no_bundled_corpus(monkeypatch, data_dir):
+    monkeypatch.setattr(local_matcher, "BUNDLED_CORPUS_DIR", str(data_dir / "bundled"))
+
+
+@pytest.fixture
+def folder(data_dir):
+    path = data_dir / "corpus"
+    path.mkdir()
+    return str(path)
+
+
+def names(results: list) -> list:
+    return [r.get("company") or r.get("name") for r in results]
+
+
+def test_documents_are_ranked_by_bm25_and_flagged_offline(folder):
+    index = LocalIndex(build_index("companies", COMPANIES, folder))
+
+    results = index.search("payments banks")
+
+    assert names(results) == ["Ledgerly", "Shopwise"]
+    assert all(r["offline_match"] for r in results)
+    assert results[0]["sector"] == "FinTech"
+
+
+def test_rare_terms_weigh_more_than_common_ones(folder):
+    index = LocalIndex(build_index("companies", COMPANIES, folder))
+
+    # "for" is in every document, "clinics" in one only
+    assert names(index.search("for for for clinics"))[0] == "Carebase"
+
+
+def test_shorter_document_wins_at_equal_term_frequency(folder):
+    docs = [{"company": "Long", "mission_statement": "python " + "words " * 30},
+            {"company": "Short", "mission_statement": "python"}]
+    index = LocalIndex(build_index("companies", docs, folder))
+
+    assert names(index.search("python")) == ["Short", "Long"]
+
+
+def test_query_without_known_terms_matches_nothing(folder):
+    index = LocalIndex(build_index("companies", COMPANIES, folder))
+
+    assert index.search("quantum blockchain") == []
+    assert index.search("") == []
+
+
+def test_top_k_limits_the_results(folder):
+    index = LocalIndex(build_index("companies", COMPANIES, folder))
+
+    assert len(index.search("for", top_k=2)) == 2
+
+
+def test_loaded_index_keeps_reading_its_generation_after_a_rebuild(folder, monkeypatch):
+    monkeypatch.setattr(local_matcher, "REBUILD_DEBOUNCE_S", 0)  # Old generations are removed at once
+    first = build_index("companies", COMPANIES, folder)
+    old = LocalIndex(first)
+
+    second = build_index("companies", [{"company": "Newco", "mission_statement": "Payments for banks"}] + COMPANIES, folder)
+
+    assert second != first and not os.path.exists(first)
+    assert local_matcher._current_generation("companies", folder) == second
+    assert names(old.search("payments banks")) == ["Ledgerly", "Shopwise"]  # Offsets of its own docs.jsonl
+    assert names(LocalIndex(second).search("newco")) == ["Newco"]
+
+
+def test_recent_generations_are_kept_for_other_processes(folder):
+    first = build_index("companies", COMPANIES, folder)
+    build_index("companies", COMPANIES[:2], folder)
+
+    assert os.path.isdir(first)
+
+
+def test_matcher_remembers_api_matches_once_and_answers_from_them(folder):
+    matcher = LocalMatcher(folder)
+    matcher._rebuild_scheduled = True  # No debounce timer: the test rebuilds itself
+    matcher.remember("freelancer", COMPANIES)
+    matcher.remember("freelancer", COMPANIES[:2] + [{"sector": "No key"}])
+    matcher.rebuild("companies")
+
+    with open(os.path.join(folder, "companies.jsonl"), encoding="utf-8") as f:
+        assert len(f.readlines()) == len(COMPANIES)
+    assert names(matcher.search("patient records", "freelancer")) == ["Carebase"]
+    assert matcher.search("patient records", "company") == []  # Companies search the freelancer corpus
+
+
+def test_new_matcher_loads_the_current_generation(folder):
+    first = LocalMatcher(folder)
+    first._rebuild_scheduled = True
+    first.remember("freelancer", COMPANIES)
+    first.rebuild("companies")
+
+    restarted = LocalMatcher(folder)
+
+    assert names(restarted.search("crop data", "freelancer")) == ["Fieldnote"]
+    assert restarted._indexes["companies"].folder == local_matcher._current_generation("companies", folder)
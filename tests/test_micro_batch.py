@@ -0,0 +1,125 @@
+import threading
+import time
+
+from micro_batch import MicroBatcher
+
+
+class Backend:
+    """A batch endpoint that answers each item with its upper-cased text."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, items, timeout):
+        self.calls.append(list(items))
+        if self.fail:
+            raise ConnectionError("batch endpoint down")
+        return [item.upper() for item in items]
+
+
+def submit_together(batcher: MicroBatcher, items: list, keys=None, timeout: float = 5) -> list:
+    """Submit `items` from one thread each, all in flight before any is submitted."""
+    keys = keys or [None] * len(items)
+    results = [None] * len(items)
+    ready = threading.Barrier(len(items))
+
+    def run(i):
+        with batcher.in_flight(keys[i]):
+            ready.wait()
+            results[i] = batcher.submit(items[i], timeout, key=keys[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_lone_request_is_sent_on_its_own_without_waiting_the_window():
+    backend = Backend()
+    batcher = MicroBatcher("test", backend, window_s=1.0, max_size=16)
+
+    started = time.monotonic()
+    with batcher.in_flight():
+        result = batcher.submit("a", 5)
+
+    assert result is None
+    assert time.monotonic() - started < 0.1
+    assert backend.calls == []
+
+
+def test_concurrent_requests_share_one_call():
+    backend = Backend()
+    batcher = MicroBatcher("test", backend, window_s=0.2, max_size=16)
+
+    results = submit_together(batcher, ["a", "b", "c", "d"])
+
+    assert results == ["A", "B", "C", "D"]
+    assert len(backend.calls) == 1 and sorted(backend.calls[0]) == ["a", "b", "c", "d"]
+
+
+def test_full_batch_is_sent_before_the_window_ends():
+    backend = Backend()
+    batcher = MicroBatcher("test", backend, window_s=10, max_size=3)
+
+    started = time.monotonic()
+    results = submit_together(batcher, ["a", "b", "c"])
+
+    assert results == ["A", "B", "C"]
+    assert time.monotonic() - started < 5
+
+
+def test_requests_only_share_a_batch_with_their_own_key():
+    backend = Backend()
+    batcher = MicroBatcher("test", backend, window_s=0.2, max_size=16)
+
+    results = submit_together(batcher, ["a", "b", "x", "y"], keys=["interactive", "interactive", "bulk", "bulk"])
+
+    assert results == ["A", "B", "X", "Y"]
+    assert sorted(map(sorted, backend.calls)) == [["a", "b"], ["x", "y"]]
+
+
+def test_failed_batch_sends_every_request_on_its_own():
+    batcher = MicroBatcher("test", Backend(fail=True), window_s=0.2, max_size=16)
+
+    assert submit_together(batcher, ["a", "b", "c"]) == [None, None, None]
+
+
+def test_batch_with_the_wrong_number_of_results_is_not_used():
+    batcher = MicroBatcher("test", lambda items, timeout: ["only one"], window_s=0.2, max_size=16)
+
+    assert submit_together(batcher, ["a", "b"]) == [None, None]
+
+
+def test_batch_is_sent_with_the_shortest_budget_of_its_requests():
+    budgets = []
+    batcher = MicroBatcher("test", lambda items, timeout: budgets.append(timeout) or list(items), window_s=0.2,
+                           max_size=2)
+
+    with batcher.in_flight(), batcher.in_flight():
+        opener = threading.Thread(target=lambda: batcher.submit("a", 30))
+        opener.start()
+        while not batcher._open:
+            time.sleep(0.001)
+        assert batcher.submit("b", 2) == "b"
+        opener.join()
+
+    assert 0 < budgets[0] <= 2
+
+
+def test_in_flight_counts_are_released():
+    batcher = MicroBatcher("test", Backend(), window_s=0.2, max_size=16)
+
+    submit_together(batcher, ["a", "b"])
+
+    assert batcher._in_flight == {}
+
+
+def test_batching_is_off_without_a_window():
+    backend = Backend()
+    batcher = MicroBatcher("test", backend, window_s=0, max_size=16)
+
+    assert submit_together(batcher, ["a", "b"]) == [None, None]
+    assert backend.calls == []
@@ -0,0 +1,136 @@
+import smtplib
+import sqlite3
+import time
+
+import pytest
+
+import outbox
+from outbox import FAILED, QUEUED, SENT, Outbox
+
+
+class FakeSMTP:
+    """Stands in for a pooled SMTP connection; `replies` decides the fate of each recipient."""
+    opened = []
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.sent = []
+        FakeSMTP.opened.append(self)
+
+    def send_message(self, message):
+        reply = self.replies.get(message["To"])
+        if reply is not None:
+            raise smtplib.SMTPRecipientsRefused({message["To"]: reply})
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    replies = {}
+    FakeSMTP.opened = []
+    monkeypatch.setattr(outbox, "_smtp_connection", lambda: FakeSMTP(replies))
+    return replies
+
+
+@pytest.fixture
+def path(data_dir):
+    return str(data_dir / "outbox.sqlite3")
+
+
+def sent_messages() -> list:
+    return [message["To"] for smtp in FakeSMTP.opened for message in smtp.sent]
+
+
+def wait_for(box: Outbox, message_id: str, status: str):
+    deadline = time.monotonic() + 5
+    while (row := box.status(message_id)) is None or row[0] != status:
+        assert time.monotonic() < deadline, row
+        time.sleep(0.01)
+    return row
+
+
+def test_queued_message_survives_a_restart_and_is_delivered_after_it(path, replies):
+    stopped = Outbox(path, pool_size=0)  # No sender: nothing leaves before the "restart"
+    message_id = stopped.enqueue("ana@corp.io", "Hello", "Body")
+    wait_for(stopped, message_id, QUEUED)
+    assert sent_messages() == []
+
+    restarted = Outbox(path, pool_size=1)
+
+    wait_for(restarted, message_id, SENT)
+    assert sent_messages() == ["ana@corp.io"]
+
+
+def test_a_message_id_is_sent_once(path, replies):
+    box = Outbox(path, pool_size=1)
+    box.enqueue("ana@corp.io", "Hello", "Body", message_id="job-1-row-1")
+    box.enqueue("ana@corp.io", "Hello", "Body", message_id="job-1-row-1")
+
+    wait_for(box, "job-1-row-1", SENT)
+    time.sleep(0.1)
+    assert sent_messages() == ["ana@corp.io"]
+
+
+def test_messages_of_a_batch_share_one_connection(path, replies):
+    box = Outbox(path, pool_size=1)
+    ids = [box.enqueue(f"user{i}@corp.io", "Hello", "Body") for i in range(5)]
+
+    for message_id in ids:
+        wait_for(box, message_id, SENT)
+    assert len(FakeSMTP.opened) == 1
+
+
+def test_permanent_refusal_fails_the_message_at_once(path, replies):
+    replies["gone@corp.io"] = (550, b"No such user")
+    box = Outbox(path, pool_size=1)
+
+    status, attempts, error = wait_for(box, box.enqueue("gone@corp.io", "Hello", "Body"), FAILED)
+
+    assert attempts == 1 and "No such user" in error
+
+
+def test_temporary_refusal_is_retried_later(path, replies, monkeypatch):
+    monkeypatch.setattr(outbox, "RETRY_BACKOFF_S", 60)
+    replies["busy@corp.io"] = (451, b"Try again later")
+    box = Outbox(path, pool_size=1)
+    message_id = box.enqueue("busy@corp.io", "Hello", "Body")
+
+    deadline = time.monotonic() + 5
+    while (row := box.status(message_id)) is None or row[1] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert row[0] == QUEUED and row[1] == 1
+    assert outbox.describe(row).startswith("📬 Delivery will be retried (attempt 2/")
+
+
+def test_rekey_files_messages_under_the_new_user(path, replies):
+    box = Outbox(path, pool_size=0)
+    message_id = box.enqueue("ana@corp.io", "Hello", "Body", user="session:abc")
+    box.rekey("session:abc", "me@corp.io")
+    wait_for(box, message_id, QUEUED)
+
+    deadline = time.monotonic() + 5
+    while True:
+        with sqlite3.connect(path) as connection:
+            user = connection.execute("SELECT user FROM messages WHERE id = ?", (message_id,)).fetchone()[0]
+        if user == "me@corp.io" or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+    assert user == "me@corp.io"
+
+
+@pytest.mark.parametrize("address", ["", None, "ana", "ana@corp", "info@example.com", "a@b.example",
+                                     "x@mail.example.org", "ana@corp.io\nBcc: all@corp.io"])
+def test_undeliverable_addresses_are_refused(path, address):
+    assert outbox.recipient(address) == ""
+    with pytest.raises(ValueError):
+        Outbox(path, pool_size=0).enqueue(address, "Hello", "Body")
+
+
+def test_subject_line_of_a_generated_email_becomes_the_subject():
+    assert outbox.split_subject("Subject: Data at Acme\n\nHi Bob,", "Default") == ("Data at Acme", "Hi Bob,")
+    assert outbox.split_subject("Hi Bob,\nBye", "Default") == ("Default", "Hi Bob,\nBye")
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+import requests
+
+import api_client
+from api_client import FREELANCE_FIELDS, GENERATE_ENDPOINTS, PROSPECT_FIELDS, project
+
+FREELANCE = {
+    "name": "Ana", "title": "Data engineer", "main_sector": "FinTech", "top3_skills": "Python, SQL, Spark",
+    "daily_rate": 600, "city": "Lyon", "remote": True, "mission_statement": "I build data platforms.",
+    "preferred_tone": "Warm", "preferred_style": "Direct",
+    "phone": "+33 6 00 00 00 00", "email": "ana@example.com", "income_target": 120_000, "history": ["..."] * 50,
+}
+PROSPECT = {"company": "Acme", "sector": "FinTech", "main_contact": "Bob", "email": "bob@acme.io",
+            "internal_notes": "met at a meetup", "score": 0.93}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """The (endpoint, payload) of every generation posted to the back-end, which answers with a fixed email."""
+    calls = []
+
+    def post_json(endpoint, payload, deadline):
+        calls.append((endpoint, payload))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"email": "Hello Acme"}).encode()
+        return response
+
+    monkeypatch.setattr(api_client, "_post_json", post_json)
+    monkeypatch.setattr(api_client.semantic_cache, "ENABLED", False)
+    return calls
+
+
+def test_project_keeps_only_the_listed_fields_that_are_present():
+    assert project({"a": 1, "b": 2, "c": None}, ("a", "c", "d")) == {"a": 1, "c": None}
+
+
+@pytest.mark.parametrize("sender_type", ["freelancer", "company"])
+def test_generation_payload_only_carries_the_fields_the_back_end_reads(sent, sender_type):
+    assert api_client.generate_mail(FREELANCE, PROSPECT, sender_type) == "Hello Acme"
+
+    (endpoint, payload), = sent
+    assert endpoint == GENERATE_ENDPOINTS[sender_type]
+    assert set(payload["freelance"]) == set(FREELANCE_FIELDS)
+    assert set(payload["prospect"]) == {"company", "sector", "main_contact", "email"}
+    assert payload["sender_type"] == sender_type and payload["previous_mail_content"] == ""
+
+
+def test_profile_data_the_back_end_does_not_read_stays_on_the_front_end(sent):
+    api_client.generate_mail(FREELANCE, PROSPECT, "freelancer", previous_mail_content="Hi Acme")
+
+    body = json.dumps(sent[0][1])
+    for private in ("+33 6", "ana@example.com", "120000", "meetup", "0.93"):
+        assert private not in body
+
+
+def test_every_generation_endpoint_has_its_fields():
+    for endpoint in GENERATE_ENDPOINTS.values():
+        assert api_client.PAYLOAD_FIELDS[endpoint] == {"freelance": FREELANCE_FIELDS, "prospect": PROSPECT_FIELDS}
+
+
+def test_unknown_sender_type_is_refused(sent):
+    with pytest.raises(ValueError):
+        api_client.generate_mail(FREELANCE, PROSPECT, "recruiter")
+    assert not sent
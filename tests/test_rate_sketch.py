@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import rate_sketch
+from rate_sketch import MIN_OBSERVATIONS, RateSketches, TDigest
+
+
+@pytest.fixture
+def rates():
+    return np.random.default_rng(7).lognormal(mean=6.3, sigma=0.4, size=100_000)
+
+
+def _rank(values, x):
+    return np.searchsorted(np.sort(values), x) / len(values)
+
+
+@pytest.mark.parametrize("q, tolerance", [(0.001, 0.0005), (0.01, 0.002), (0.1, 0.005), (0.5, 0.01), (0.9, 0.005),
+                                          (0.99, 0.002), (0.999, 0.0005)])
+def test_quantile_rank_error_is_bounded_and_tighter_at_the_tails(rates, q, tolerance):
+    digest = TDigest()
+    for rate in rates:
+        digest.add(rate)
+
+    assert abs(_rank(rates, digest.quantile(q)) - q) <= tolerance
+    assert abs(digest.cdf(np.quantile(rates, q)) - q) <= tolerance
+
+
+def test_centroids_stay_bounded(rates):
+    digest = TDigest()
+    for rate in rates:
+        digest.add(rate)
+
+    assert digest.count == len(rates)
+    assert len(digest.to_dict()["means"]) <= rate_sketch.COMPRESSION
+    assert digest.quantile(0) == rates.min() and digest.quantile(1) == rates.max()
+
+
+def test_merged_digests_answer_like_one_over_both_streams(rates):
+    left, right = TDigest(), TDigest()
+    for rate in rates[:30_000]:
+        left.add(rate)
+    for rate in rates[30_000:] * 1.2:
+        right.add(rate)
+    both = np.concatenate([rates[:30_000], rates[30_000:] * 1.2])
+
+    left.merge(right)
+
+    assert left.count == len(both)
+    for q in (0.05, 0.5, 0.95):
+        assert abs(_rank(both, left.quantile(q)) - q) <= 0.01
+
+
+def test_digest_survives_a_round_trip():
+    digest = TDigest()
+    for rate in range(1, 1001):
+        digest.add(rate)
+
+    restored = TDigest.from_dict(digest.to_dict())
+
+    assert restored.count == 1000
+    assert restored.quantile(0.5) == pytest.approx(digest.quantile(0.5), abs=0.01)
+
+
+def test_empty_digest_answers_nan():
+    assert np.isnan(TDigest().quantile(0.5))
+    assert np.isnan(TDigest().cdf(500))
+
+
+def test_a_freelancer_matched_again_is_counted_once(data_dir):
+    sketches = RateSketches(str(data_dir / "sketches.json"))
+    freelancer = {"id": "f1", "daily_rate": 500, "main_sector": "FinTech", "city": "Paris", "top3_skills": "Python"}
+
+    for _ in range(MIN_OBSERVATIONS):
+        sketches.observe([freelancer])
+
+    assert sketches.position(500) is None  # One observation is not enough to answer
+
+
+def test_position_uses_the_most_specific_scope_with_enough_rates(data_dir):
+    sketches = RateSketches(str(data_dir / "sketches.json"))
+    sketches.observe([{"id": f"f{i}", "daily_rate": 300 + 10 * i, "main_sector": "FinTech"} for i in range(40)])
+    sketches.observe([{"id": f"g{i}", "daily_rate": 900, "main_sector": "Retail"} for i in range(5)])
+
+    fintech = sketches.position(500, sector=" fintech ")
+    retail = sketches.position(500, sector="Retail")
+
+    assert (fintech.scope, fintech.name, fintech.observations) == ("sector", "fintech", 40)
+    assert 45 <= fintech.percentile <= 55
+    assert (retail.scope, retail.observations) == ("all", 45)  # Too few Retail rates: every rate answers
+
+
+def test_implausible_rates_are_ignored(data_dir):
+    sketches = RateSketches(str(data_dir / "sketches.json"))
+
+    sketches.observe([{"id": "a", "daily_rate": 0}, {"id": "b", "daily_rate": True}, {"id": "c", "daily_rate": "500"},
+                      {"id": "d", "daily_rate": 250_000}, "not a freelancer"])
+
+    assert len(sketches) == 0
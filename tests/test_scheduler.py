@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import scheduler
+import telemetry
+from scheduler import BULK, INTERACTIVE, FairScheduler
+
+
+class _Queue:
+    """Queues calls on a one-slot scheduler, one at a time, and records in which order they get the slot."""
+
+    def __init__(self):
+        self.scheduler = FairScheduler("test", lambda: 1)
+        self.granted = []
+        self._changed = threading.Condition()
+        assert self.scheduler.acquire(1)  # The slot is taken: every call below waits in line
+
+    def call(self, session: str, klass: str = INTERACTIVE):
+        queued = len(self.scheduler._waiting) + 1
+
+        def run():
+            telemetry.set_context(session_id=session)
+            with scheduler.traffic_class(klass):
+                assert self.scheduler.acquire(5)
+            with self._changed:
+                self.granted.append((session, klass))
+                self._changed.notify_all()
+
+        threading.Thread(target=run, daemon=True).start()
+        deadline = time.monotonic() + 5
+        while len(self.scheduler._waiting) < queued:  # In line before the next call arrives
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+
+    def drain(self) -> list:
+        """Free the slot once per queued call: the order in which they got it."""
+        for expected in range(1, len(self.scheduler._waiting) + 1):
+            with self._changed:
+                self.scheduler.release()
+                assert self._changed.wait_for(lambda: len(self.granted) == expected, timeout=5)
+        return self.granted
+
+
+def test_a_session_is_not_held_up_by_calls_another_one_queued_first():
+    line = _Queue()
+    for _ in range(6):
+        line.call("a")
+    line.call("b")
+    line.call("b")
+
+    order = [session for session, _ in line.drain()]
+
+    assert order == ["a", "b", "a", "b", "a", "a", "a", "a"]
+
+
+def test_interactive_call_overtakes_queued_bulk_calls_which_still_progress():
+    line = _Queue()
+    for _ in range(5):
+        line.call("a", BULK)
+    line.call("a", INTERACTIVE)
+
+    order = line.drain()
+
+    assert order[0] == ("a", INTERACTIVE)
+    assert order[1:] == [("a", BULK)] * 5
+
+
+def test_a_call_that_gave_up_waiting_does_not_take_a_slot():
+    fair = FairScheduler("test", lambda: 1)
+    assert fair.acquire(1)
+
+    assert not fair.acquire(0.01)
+    fair.release()
+
+    assert fair.in_flight == 0
+    assert fair.acquire(0)
+    assert fair.in_flight == 1
+
+
+def test_slots_follow_the_capacity():
+    capacity = [2]
+    fair = FairScheduler("test", lambda: capacity[0])
+
+    assert fair.acquire(0) and fair.acquire(0)
+    assert not fair.acquire(0)
+    capacity[0] = 3
+    assert fair.acquire(0)
+
+
+@pytest.mark.parametrize("klass", [BULK, scheduler.PREFETCH])
+def test_traffic_class_applies_to_its_block_only(klass):
+    with scheduler.traffic_class(klass):
+        assert scheduler.current_traffic_class() == klass
+    assert scheduler.current_traffic_class() == INTERACTIVE
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+import types
+
+import pytest
+
+import session_snapshot
+from session_snapshot import DIGESTS_KEY, TOKEN_KEY, SnapshotStore
+
+TOKEN = "x" * 22
+
+
+@pytest.fixture(autouse=True)
+def no_debounce(monkeypatch):
+    monkeypatch.setattr(session_snapshot, "DEBOUNCE_S", 0.01)
+
+
+@pytest.fixture
+def path(data_dir):
+    return str(data_dir / "snapshots.sqlite3")
+
+
+def wait_for(store: SnapshotStore, token: str, expected: dict) -> dict:
+    deadline = time.monotonic() + 5
+    while (snapshot := store.load(token)) != expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return snapshot
+
+
+def test_snapshot_survives_a_restart(path):
+    SnapshotStore(path).enqueue(TOKEN, {"page": b'"Home"', "company_matches": b'[{"company": "Acme"}]'})
+    expected = {"page": "Home", "company_matches": [{"company": "Acme"}]}
+    assert wait_for(SnapshotStore(path), TOKEN, expected) == expected
+
+    restarted = SnapshotStore(path)
+
+    assert restarted.load(TOKEN) == expected
+    assert restarted.load("y" * 22) == {}
+
+
+def test_only_the_last_version_of_a_part_is_kept_and_other_parts_stay(path):
+    store = SnapshotStore(path)
+    store.enqueue(TOKEN, {"page": b'"Home"', "user_type": b'"freelancer"'})
+    store.enqueue(TOKEN, {"page": b'"Dashboard"'})
+
+    expected = {"page": "Dashboard", "user_type": "freelancer"}
+    assert wait_for(store, TOKEN, expected) == expected
+
+
+def test_snapshots_past_their_ttl_are_not_restored(path):
+    store = SnapshotStore(path)
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO snapshot_parts VALUES (?, 'page', ?, ?)",
+                           (TOKEN, session_snapshot.zlib.compress(b'"Home"'), time.time() - session_snapshot.TTL_S - 1))
+
+    assert store.load(TOKEN) == {}
+
+
+def test_save_queues_only_the_parts_that_changed(monkeypatch):
+    state = {TOKEN_KEY: TOKEN, DIGESTS_KEY: {}, "page": "Home", "user_type": "company", "unrelated": 1}
+    queued = []
+    monkeypatch.setattr(session_snapshot, "st", types.SimpleNamespace(session_state=state))
+    monkeypatch.setattr(session_snapshot, "get_store",
+                        lambda: types.SimpleNamespace(enqueue=lambda token, parts: queued.append((token, parts))))
+
+    session_snapshot.save()
+    session_snapshot.save()
+    state["page"] = "Dashboard"
+    state["company_matches"] = [object()]  # Not JSON-friendly: skipped
+    session_snapshot.save()
+
+    assert [(token, sorted(parts)) for token, parts in queued] == [(TOKEN, ["page", "user_type"]), (TOKEN, ["page"])]
+
+
+def test_token_format_only_accepts_random_url_tokens():
+    assert session_snapshot._TOKEN.match(session_snapshot.secrets.token_urlsafe(16))
+    for forged in ("", "short", "x" * 21 + "'", "../" * 10):
+        assert not session_snapshot._TOKEN.match(forged)